@@ -39,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'pilotlog',
 ]
 
@@ -85,6 +86,15 @@ DATABASES = {
     }
 }
 
+# DB_ENGINE=sqlite runs the project on a local SQLite file instead, e.g. for benchmarks
+if os.getenv("DB_ENGINE") == "sqlite":
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv("DB_NAME") or os.path.join(PROJECT_ROOT, 'db.sqlite3'),
+        }
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -132,6 +142,54 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 BULK_INSERT_CHUNK_SIZE = 500
 
+# Insert backend used by the import: 'bulk_load' (django-bulk-load), 'copy'
+# (COPY into a staging table, merged with ON CONFLICT DO NOTHING) or 'orm'
+# (bulk_create, the only one working on SQLite)
+IMPORT_INSERT_BACKEND = os.getenv("IMPORT_INSERT_BACKEND",
+                                  "orm" if os.getenv("DB_ENGINE") == "sqlite" else "bulk_load")
+COPY_INSERT_CHUNK_SIZE = 5000
+
+# Import jobs: records read between two checkpoints, seconds without a
+# checkpoint before a running job is considered dead and queued again, and
+# seconds an idle import_worker waits before polling the queue again
+IMPORT_JOB_CHUNK_SIZE = 5000
+IMPORT_JOB_STALE_SECONDS = 600
+IMPORT_JOB_POLL_SECONDS = 2
+
+# Number of Flights an import keeps waiting for their Aircraft. Once reached,
+# the Aircraft read so far are written and the Flights whose Aircraft is still
+# not in the database fail, so orphan Flights do not grow the memory of a
+# streamed import
+PENDING_FLIGHTS_LIMIT = int(os.getenv("PENDING_FLIGHTS_LIMIT", 100000))
+
+# Number of failed records of an import logged as a sample, the others are
+# only counted and written to the dead-letter file
+DEAD_LETTER_SAMPLE_SIZE = 10
+
+# Number of rows deleted by a single statement when purging a logbook
+PURGE_BATCH_SIZE = 5000
+
+# Maximum number of records written by a request to the bulk endpoints
+BULK_WRITE_MAX_RECORDS = 5000
+
+# Number of rows fetched at a time by the server-side cursors of the export
+EXPORT_CHUNK_SIZE = 2000
+
+# Cache of the API list responses. The default locmem cache is private to each
+# process, so the imports run by the management commands cannot invalidate the
+# responses cached by the web server: with more than one process, set a shared
+# backend, e.g. CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+# with a CACHE_LOCATION directory.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        'LOCATION': os.getenv("CACHE_LOCATION", ""),
+    }
+}
+
+# Seconds a list response stays cached, 0 disables the cache
+API_CACHE_TIMEOUT = int(os.getenv("API_CACHE_TIMEOUT", 300))
+
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10  # Number of items per page
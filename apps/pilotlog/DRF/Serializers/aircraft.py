@@ -8,7 +8,7 @@ class AircraftListSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Aircraft
-        fields = ('guid', 'reference', 'make')
+        fields = ('guid', 'reference', 'make', 'flight_count', 'total_minutes', 'last_flown')
 
     def get_reference(self, obj):
         # Replace 'meta' with the actual attribute name if it's a JSONField
@@ -1,8 +1,38 @@
+from django.db.models.fields.json import KeyTransform
 from rest_framework import serializers
 from pilotlog.models.flight import Flight
 
 
+class ProjectedMetaField(serializers.Field):
+    """
+    Read-only meta holding only some keys, extracted by the database into
+    annotations (see meta_annotations) instead of loading the whole meta.
+    """
+
+    def __init__(self, meta_keys, **kwargs):
+        kwargs.update(source='*', read_only=True)
+        super().__init__(**kwargs)
+        self.meta_keys = meta_keys
+
+    @staticmethod
+    def meta_annotations(meta_keys):
+        # Meta keys are not always valid identifiers, e.g. [Text]CustomFieldName
+        return {f'meta_key_{i}': KeyTransform(key, 'meta') for i, key in enumerate(meta_keys)}
+
+    def to_representation(self, instance):
+        return {key: getattr(instance, f'meta_key_{i}') for i, key in enumerate(self.meta_keys)}
+
+
 class FlightSerializer(serializers.ModelSerializer):
     class Meta:
         model = Flight
         fields = '__all__'
+
+    def __init__(self, *args, fields=None, meta_keys=None, **kwargs):
+        # fields and meta_keys restrict the output to some fields and meta keys
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        if meta_keys is not None and 'meta' in self.fields:
+            self.fields['meta'] = ProjectedMetaField(meta_keys)
@@ -0,0 +1,13 @@
+from rest_framework import serializers
+from pilotlog.models.import_job import ImportJob
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    file = serializers.FileField(write_only=True)
+    progress = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = ImportJob
+        fields = ('id', 'file', 'status', 'progress', 'size', 'offset', 'records', 'tables', 'errors',
+                  'message', 'created_at', 'started_at', 'heartbeat_at', 'finished_at')
+        read_only_fields = tuple(name for name in fields if name not in ('file', 'progress'))
@@ -2,6 +2,10 @@ from rest_framework import viewsets
 from pilotlog.models.aircraft import Aircraft
 from ..Serializers.aircraft import AircraftListSerializer, AircraftDetailSerializer
 from rest_framework.pagination import PageNumberPagination
+from ..bulk import BulkWriteMixin
+from ..cache import CachedListMixin
+from ..filters import StableOrderingFilter
+from ..pagination import KeysetPagination, SelectablePaginationMixin
 
 
 class AircraftPagination(PageNumberPagination):
@@ -10,9 +14,20 @@ class AircraftPagination(PageNumberPagination):
     max_page_size = 100
 
 
-class AircraftViewSet(viewsets.ModelViewSet):
+class AircraftViewSet(BulkWriteMixin, CachedListMixin, SelectablePaginationMixin, viewsets.ModelViewSet):
     queryset = Aircraft.objects.all()
     pagination_class = AircraftPagination
+    cursor_pagination_class = KeysetPagination
+    bulk_table = 'Aircraft'
+    # ?ordering=-flight_count, applied to the page numbers pagination
+    filter_backends = [StableOrderingFilter]
+    ordering_fields = ['flight_count', 'total_minutes', 'last_flown']
+
+    def get_queryset(self):
+        user_id = self.get_user_id()
+        queryset = Aircraft.objects.all() if user_id is None else Aircraft.objects.for_user(user_id)
+        # Stable pages by default, in the order of the aircraft_modified index
+        return queryset.order_by('_modified', 'guid')
 
     def get_serializer_class(self):
         if self.action == 'list':
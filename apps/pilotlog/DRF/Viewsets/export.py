@@ -0,0 +1,37 @@
+import csv
+
+from django.http import StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.gzip import gzip_page
+from rest_framework.views import APIView
+
+from apps.pilotlog.helpers.import_export import iter_logbook_csv_rows
+
+
+class Echo:
+    """
+    Pseudo-buffer for csv.writer, returning each written line instead of
+    storing it.
+    """
+
+    def write(self, value):
+        return value
+
+
+@method_decorator(gzip_page, name='dispatch')
+class LogbookExportView(APIView):
+    """
+    Stream the logbook in the ForeFlight CSV format, of every user or of the
+    user_id in the URL.
+
+    Rows are converted while the querysets are read, so the response starts
+    right away and is compressed on the fly when the client accepts gzip.
+    """
+
+    def get(self, request, user_id=None):
+        filename = 'logbook.csv' if user_id is None else f'logbook-{user_id}.csv'
+        writer = csv.writer(Echo(), delimiter=',')
+        rows = iter_logbook_csv_rows(user_id=user_id)
+        response = StreamingHttpResponse((writer.writerow(row) for row in rows), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
@@ -1,7 +1,11 @@
 from rest_framework import viewsets
+from rest_framework.exceptions import ValidationError
 from pilotlog.models.flight import Flight
 
-from ..Serializers.flight import FlightSerializer
+from ..Serializers.flight import FlightSerializer, ProjectedMetaField
+from ..bulk import BulkWriteMixin
+from ..cache import CachedListMixin
+from ..pagination import KeysetPagination, SelectablePaginationMixin
 from rest_framework.pagination import PageNumberPagination
 
 
@@ -11,14 +15,75 @@ class FlightPagination(PageNumberPagination):
     max_page_size = 100
 
 
-class FlightViewSet(viewsets.ModelViewSet):
+class FlightDatePagination(KeysetPagination):
+    ordering = ('date', 'guid')
+
+
+class FlightViewSet(BulkWriteMixin, CachedListMixin, SelectablePaginationMixin, viewsets.ModelViewSet):
     queryset = Flight.objects.all()
     serializer_class = FlightSerializer
     pagination_class = FlightPagination
+    cursor_pagination_class = KeysetPagination
+    bulk_table = 'Flight'
 
     def get_queryset(self):
         # Filter based on the presence of airplane_guid in URL kwargs
         airplane_guid = self.kwargs.get('aircraft_guid')
         if airplane_guid:
-            return Flight.objects.filter(aircraft__guid=airplane_guid)
-        return Flight.objects.all()
\ No newline at end of file
+            queryset = Flight.objects.flight_by_airplane(airplane_guid)
+        else:
+            # Stable pages by default, in the order of the flight_modified index
+            queryset = Flight.objects.order_by('_modified', 'guid')
+        user_id = self.get_user_id()
+        if user_id is not None:
+            queryset = queryset.for_user(user_id)
+        return self.project_queryset(queryset)
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action in ('list', 'retrieve'):
+            kwargs['fields'], kwargs['meta_keys'] = self.get_projection()
+        return super().get_serializer(*args, **kwargs)
+
+    def get_projection(self):
+        """
+        Return the fields and meta keys requested with ?fields= and
+        ?meta_keys=, as comma separated lists. Each one is None when not given.
+        """
+        params = self.request.query_params
+        fields, meta_keys = (
+            None if params.get(name) is None else [item for item in params[name].split(',') if item]
+            for name in ('fields', 'meta_keys')
+        )
+        if fields is not None:
+            unknown = set(fields) - set(FlightSerializer().fields)
+            if unknown:
+                raise ValidationError({'fields': f"Unknown fields: {', '.join(sorted(unknown))}"})
+        return fields, meta_keys
+
+    def project_queryset(self, queryset):
+        """
+        Load only the requested fields, and only the requested meta keys,
+        extracted by the database instead of loading the whole meta.
+        """
+        if self.action not in ('list', 'retrieve'):
+            return queryset
+        fields, meta_keys = self.get_projection()
+        if meta_keys is not None:
+            queryset = queryset.annotate(**ProjectedMetaField.meta_annotations(meta_keys))
+        if fields is not None:
+            # The keyset pagination reads its ordering fields on the last row
+            loaded = {'guid', *fields, *getattr(self.paginator, 'ordering', ())}
+            if meta_keys is not None:
+                loaded.discard('meta')
+            queryset = queryset.only(*loaded)
+        elif meta_keys is not None:
+            queryset = queryset.defer('meta')
+        return queryset
+
+
+class AircraftFlightViewSet(FlightViewSet):
+    """
+    Flights of an aircraft by date, paginated by keyset on (date, guid).
+    """
+    cursor_pagination_class = FlightDatePagination
+    pagination_mode = 'cursor'
\ No newline at end of file
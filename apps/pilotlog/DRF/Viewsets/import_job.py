@@ -0,0 +1,31 @@
+import uuid
+
+from django.core.files.storage import default_storage
+from rest_framework import mixins, status, viewsets
+from rest_framework.parsers import FileUploadParser, MultiPartParser
+from rest_framework.response import Response
+from pilotlog.models.import_job import ImportJob
+
+from apps.pilotlog.helpers.import_jobs import create_import_job
+from ..Serializers.import_job import ImportJobSerializer
+
+
+class ImportJobViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.ListModelMixin,
+                       viewsets.GenericViewSet):
+    """
+    Upload a JSON logbook to import, and follow the progress of the import.
+
+    The upload is saved under MEDIA_ROOT/imports and queued as an ImportJob,
+    the response is returned right away and the job is run by the
+    import_worker command.
+    """
+    queryset = ImportJob.objects.order_by('-created_at', '-pk')
+    serializer_class = ImportJobSerializer
+    parser_classes = [MultiPartParser, FileUploadParser]
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        name = default_storage.save(f'imports/{uuid.uuid4().hex}.json', serializer.validated_data['file'])
+        job = create_import_job(default_storage.path(name))
+        return Response(self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED)
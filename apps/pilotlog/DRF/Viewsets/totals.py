@@ -0,0 +1,55 @@
+import datetime
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from pilotlog.models.flight import Flight
+from pilotlog.models.flight_totals import FlightTotals
+
+from pilotlog.managers.flight_totals import SUMMARY_GROUPS
+
+# Days of recent experience counted by the currency summary
+CURRENCY_DAYS = 90
+
+
+class LogbookTotalsView(APIView):
+    """
+    Flight time and landing totals of a user, read from the monthly rollup.
+
+    ?group_by= splits the totals by aircraft, type, year and/or month (comma
+    separated), ?from= and ?to= (YYYY-MM-DD) restrict them to the months
+    of those dates. The currency summary counts the last 90 days from the
+    flights themselves, since it does not follow month boundaries.
+    """
+
+    def get(self, request, user_id):
+        params = request.query_params
+        group_by = [name for name in params.get('group_by', '').split(',') if name]
+        unknown = set(group_by) - set(SUMMARY_GROUPS)
+        if unknown:
+            raise ValidationError({'group_by': f"Unknown groups: {', '.join(sorted(unknown))}"})
+        date_from, date_to = (self.get_date(name) for name in ('from', 'to'))
+
+        rollup = FlightTotals.objects.for_user(user_id).between(date_from, date_to)
+        data = {'totals': rollup.summary()}
+        if group_by:
+            data['groups'] = list(rollup.summary_by(*group_by))
+
+        since = datetime.date.today() - datetime.timedelta(days=CURRENCY_DAYS)
+        data['currency'] = {
+            'days': CURRENCY_DAYS,
+            **Flight.objects.for_user(user_id).filter(date__gte=since).totals(),
+        }
+        return Response(data)
+
+    def get_date(self, name):
+        """
+        Return the date of a query parameter, None when not given.
+        """
+        value = self.request.query_params.get(name)
+        if not value:
+            return None
+        try:
+            return datetime.date.fromisoformat(value)
+        except ValueError:
+            raise ValidationError({name: f"Invalid date, expected YYYY-MM-DD: {value}"})
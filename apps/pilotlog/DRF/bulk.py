@@ -0,0 +1,96 @@
+from django.db import transaction
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser
+from rest_framework.response import Response
+
+from apexive.settings import BULK_WRITE_MAX_RECORDS
+from apps.pilotlog.helpers.dead_letters import DeadLetters
+from apps.pilotlog.helpers.import_export import ImportPipeline, guid_key, refresh_imported_data
+from .parsers import NDJSONParser
+
+# Keys every record must have, as consumed by import_data
+RECORD_KEYS = ('guid', 'user_id', 'platform', '_modified', 'meta')
+
+
+class BulkWriteMixin:
+    """
+    Viewset mixin adding a bulk action writing many records in one request.
+
+    The body is a JSON array or NDJSON (application/x-ndjson) of records in
+    the shape consumed by import_data. They are written by an incremental
+    ImportPipeline in a single transaction: new records are created, records
+    with a newer _modified are updated and the others are left unchanged.
+    The response has the status of every record, in the order of the body,
+    and the error_type and error of those that failed.
+    """
+    bulk_table = None
+
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request, *args, **kwargs):
+        records = request.data
+        if not isinstance(records, list):
+            raise ValidationError({'records': "Expected a list of records."})
+        if len(records) > BULK_WRITE_MAX_RECORDS:
+            raise ValidationError({'records': f"At most {BULK_WRITE_MAX_RECORDS} records per request."})
+
+        results = [self.check_record(record) for record in records]
+        valid = [record for record, result in zip(records, results) if result is None]
+        # Every failure is kept in the sample, to match it with its record
+        pipeline = ImportPipeline(incremental=True, track_outcomes=True,
+                                  dead_letters=DeadLetters(sample_size=len(valid)))
+        with transaction.atomic():
+            pipeline.run(valid)
+            refresh_imported_data(pipeline)
+
+        # Records are matched by (user_id, guid), the guid alone may be shared by users
+        failed = {(entry['record']['user_id'], guid_key(entry['record']['guid'])): entry
+                  for entry in pipeline.dead_letters.sample}
+        for i, record in enumerate(records):
+            if results[i] is not None:
+                continue
+            key = (record['user_id'], guid_key(record['guid']))
+            outcome = pipeline.outcomes.get((self.bulk_table, *key))
+            if key in failed:
+                results[i] = {'guid': record['guid'], 'status': 'error',
+                              'error_type': failed[key]['error_type'], 'error': failed[key]['error']}
+            elif outcome is None:
+                results[i] = {'guid': record['guid'], 'status': 'error', 'error_type': None,
+                              'error': "The record could not be written."}
+            else:
+                results[i] = {'guid': record['guid'], 'status': outcome}
+
+        counts = {name: 0 for name in ('created', 'updated', 'unchanged', 'error')}
+        for result in results:
+            counts[result['status']] += 1
+        return Response({**counts, 'results': results}, status=status.HTTP_200_OK)
+
+    def check_record(self, record):
+        """
+        Check a record has the shape of the records of this endpoint.
+
+        :param record: a record of the request body
+        :return: None if the record is valid, its error result otherwise
+        """
+        if not isinstance(record, dict):
+            return {'guid': None, 'status': 'error', 'error_type': 'ValidationError', 'error': "Expected an object."}
+        record.setdefault('table', self.bulk_table)
+        error = None
+        missing = [key for key in RECORD_KEYS if key not in record]
+        if record['table'] != self.bulk_table:
+            error = f"Expected a {self.bulk_table} record."
+        elif missing:
+            error = f"Missing keys: {', '.join(missing)}."
+        elif not all(isinstance(record[key], int) for key in ('user_id', 'platform', '_modified')):
+            error = "user_id, platform and _modified must be integers."
+        elif not isinstance(record['meta'], dict):
+            error = "meta must be an object."
+        else:
+            try:
+                guid_key(record['guid'])
+            except ValueError:
+                error = "guid must be a GUID."
+        if error is None:
+            return None
+        return {'guid': record.get('guid'), 'status': 'error', 'error_type': 'ValidationError', 'error': error}
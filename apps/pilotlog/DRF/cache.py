@@ -0,0 +1,73 @@
+import hashlib
+
+from django.core.cache import cache
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from apexive.settings import API_CACHE_TIMEOUT
+from apps.pilotlog.helpers.cache import bump_generations, get_generation
+
+
+class CachedListMixin:
+    """
+    Viewset mixin caching the list responses and invalidating them on writes.
+
+    Responses are cached per authenticated user, path and query parameters,
+    under the generation of the data they show: the logbook of ?user_id= or
+    the whole database. Imports and the write methods bump the generations,
+    so a changed logbook is never served from the cache.
+
+    Every list response has an ETag derived from that key, and a request
+    whose If-None-Match matches it gets a 304 without any query.
+    Cache-Control: no-cache skips the cached response.
+    """
+    cache_timeout = API_CACHE_TIMEOUT
+
+    def get_user_id(self):
+        """
+        Return the logbook user_id the request is restricted to, if any.
+        """
+        user_id = self.request.query_params.get('user_id')
+        return int(user_id) if user_id and user_id.isdigit() else None
+
+    def get_list_cache_key(self, request):
+        query = sorted(request.query_params.lists())
+        identity = f'{request.user.pk}:{request.path}:{query}:{get_generation(self.get_user_id())}'
+        return f'pilotlog:list:{hashlib.sha256(identity.encode()).hexdigest()}'
+
+    def list(self, request, *args, **kwargs):
+        if not self.cache_timeout:
+            return super().list(request, *args, **kwargs)
+
+        key = self.get_list_cache_key(request)
+        etag = f'"{key.rsplit(":", 1)[1][:32]}"'
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        data = None
+        if 'no-cache' not in request.headers.get('Cache-Control', ''):
+            data = cache.get(key)
+        if data is None:
+            response = super().list(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            cache.set(key, response.data, self.cache_timeout)
+        else:
+            response = Response(data)
+        response['ETag'] = etag
+        return response
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        bump_generations([serializer.instance.user_id])
+
+    def perform_update(self, serializer):
+        user_id = serializer.instance.user_id
+        super().perform_update(serializer)
+        bump_generations([user_id, serializer.instance.user_id])
+
+    def perform_destroy(self, instance):
+        user_id = instance.user_id
+        super().perform_destroy(instance)
+        bump_generations([user_id])
@@ -0,0 +1,15 @@
+from rest_framework.filters import OrderingFilter
+
+
+class StableOrderingFilter(OrderingFilter):
+    """
+    Ordering filter breaking the ties on the primary key, in the direction of
+    the last ordering field, so pages of equal values do not overlap and a
+    (field, pk) index serves the ordering in both directions.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not ordering:
+            return ordering
+        return [*ordering, '-pk' if ordering[-1].startswith('-') else 'pk']
@@ -0,0 +1,130 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class SelectablePaginationMixin:
+    """
+    Viewset mixin choosing between pagination_class and cursor_pagination_class.
+
+    The keyset pagination is used when the viewset sets pagination_mode to
+    'cursor', when the request asks for it with ?pagination=cursor, or when it
+    passes a cursor. ?pagination=page selects the page numbers back.
+    """
+    cursor_pagination_class = None
+    pagination_mode = 'page'
+    mode_query_param = 'pagination'
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            query_params = self.request.query_params
+            mode = query_params.get(self.mode_query_param, self.pagination_mode)
+            if self.mode_query_param not in query_params and 'cursor' in query_params:
+                mode = 'cursor'
+            if mode == 'cursor' and self.cursor_pagination_class is not None:
+                self._paginator = self.cursor_pagination_class()
+            else:
+                self._paginator = self.pagination_class() if self.pagination_class else None
+        return self._paginator
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset pagination on an ordering field and a unique tiebreak field.
+
+    The next page starts right after the last row of the current one, found
+    with a range condition on the (ordering, tiebreak) index instead of an
+    OFFSET, so any page costs the same as the first one. The position is
+    passed as an opaque cursor.
+
+    When the ordering field is nullable, NULL values come last, and they are
+    read as a second range of the index once the non-NULL values run out, so
+    both ranges stay index scans in order.
+    """
+    ordering = ('_modified', 'guid')
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.fields = [queryset.model._meta.get_field(name) for name in self.ordering]
+        field, tiebreak = self.ordering
+        nullable = self.fields[0].null
+        limit = self.page_size + 1
+
+        values = queryset.order_by(field, tiebreak)
+        nulls = queryset.filter(**{f'{field}__isnull': True}).order_by(tiebreak)
+        if nullable:
+            values = values.filter(**{f'{field}__isnull': False})
+
+        position = self.decode_cursor(request)
+        if position is None:
+            rows = list(values[:limit])
+        elif position[0] is None:
+            rows = []
+            nulls = nulls.filter(**{f'{tiebreak}__gt': position[1]})
+        else:
+            value, key = position
+            rows = list(values.filter(**{f'{field}__gte': value})
+                        .exclude(**{field: value, f'{tiebreak}__lte': key})[:limit])
+        if nullable and len(rows) < limit:
+            rows += list(nulls[:limit - len(rows)])
+
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        position = [None if getattr(last, field.attname) is None else field.value_to_string(last)
+                    for field in self.fields]
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(position))
+
+    def encode_cursor(self, position):
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            value, key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return (None if value is None else self.fields[0].to_python(value),
+                    self.fields[1].to_python(key))
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound('Invalid cursor')
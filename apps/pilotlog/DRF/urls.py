@@ -1,16 +1,25 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .Viewsets.aircraft import AircraftViewSet
-from .Viewsets.flight import FlightViewSet
+from .Viewsets.export import LogbookExportView
+from .Viewsets.flight import AircraftFlightViewSet, FlightViewSet
+from .Viewsets.import_job import ImportJobViewSet
+from .Viewsets.totals import LogbookTotalsView
 
 
 router = DefaultRouter()
 
 router.register(r'aircraft', AircraftViewSet, basename='aircraft')
+router.register(r'imports', ImportJobViewSet, basename='imports')
 
 # Define the urlpatterns with nested routes
 urlpatterns = [
+    path('aircraft/export.csv', LogbookExportView.as_view(), name='logbook-export'),
+    path('users/<int:user_id>/export.csv', LogbookExportView.as_view(), name='user-logbook-export'),
+    path('users/<int:user_id>/totals/', LogbookTotalsView.as_view(), name='user-logbook-totals'),
     path('', include(router.urls)),
     path('flights/', FlightViewSet.as_view({'get': 'list'}), name='all-flights'),
-    path('aircraft/<uuid:aircraft_guid>/flights/', FlightViewSet.as_view({'get': 'list'}), name='aircraft-flights'),
+    path('flights/bulk/', FlightViewSet.as_view({'post': 'bulk'}, **FlightViewSet.bulk.kwargs), name='flights-bulk'),
+    path('aircraft/<uuid:aircraft_guid>/flights/', AircraftFlightViewSet.as_view({'get': 'list'}),
+         name='aircraft-flights'),
 ]
\ No newline at end of file
@@ -1,7 +1,9 @@
 from django.contrib import admin
 from .models.aircraft import Aircraft
 from .models.flight import Flight
+from .models.flight_totals import FlightTotals
 from .models.image_pic import ImagePic
+from .models.import_job import ImportJob
 from .models.my_query_build import MyQueryBuild
 from .models.my_query import MyQuery
 from .models.limit_rules import LimitRules
@@ -13,13 +15,20 @@ from .models.setting_config import SettingConfig
 class AircraftAdmin(admin.ModelAdmin):
     model = Aircraft
     list_display = ['guid', 'user_id', '_modified']
-    search_fields = ['user_id', 'guid', 'meta']
+    search_fields = ['user_id', 'guid', 'make', 'ref_search']
 
 
 class FlightAdmin(admin.ModelAdmin):
     model = Flight
     list_display = ['guid', 'aircraft__guid', 'user_id', '_modified']
-    search_fields = ['user_id', 'aircraft__guid', 'guid', 'meta']
+    search_fields = ['user_id', 'aircraft__guid', 'guid', 'aircraft__ref_search']
+    readonly_fields = ['aircraft']
+
+
+class FlightTotalsAdmin(admin.ModelAdmin):
+    model = FlightTotals
+    list_display = ['user_id', 'aircraft', 'month', 'flights', 'total_minutes']
+    search_fields = ['user_id', 'aircraft__guid']
     readonly_fields = ['aircraft']
 
 
@@ -29,6 +38,12 @@ class ImagePicAdmin(admin.ModelAdmin):
     search_fields = ['user_id', 'guid']
 
 
+class ImportJobAdmin(admin.ModelAdmin):
+    model = ImportJob
+    list_display = ['id', 'file_path', 'status', 'records', 'errors', 'created_at', 'finished_at']
+    list_filter = ['status']
+
+
 class LimitRulesAdmin(admin.ModelAdmin):
     model = LimitRules
     list_display = ['guid', 'user_id', '_modified']
@@ -67,7 +82,9 @@ class SettingConfigAdmin(admin.ModelAdmin):
 
 admin.site.register(Aircraft, AircraftAdmin)
 admin.site.register(Flight, FlightAdmin)
+admin.site.register(FlightTotals, FlightTotalsAdmin)
 admin.site.register(ImagePic, ImagePicAdmin)
+admin.site.register(ImportJob, ImportJobAdmin)
 admin.site.register(LimitRules, LimitRulesAdmin)
 admin.site.register(MyQuery, MyQueryAdmin)
 admin.site.register(MyQueryBuild, MyQueryBuildAdmin)
@@ -0,0 +1,160 @@
+"""
+Microbenchmark of the conversion of records into CSV rows.
+
+Compares converting every cell with a copy of the convert_types if-chain
+the export used before, to the row converters used by the export, which also
+convert the Number, hhmm, Date and Packed Detail columns the if-chain left as
+they were: a compiled one for the aircraft and a plain loop for the flights,
+whose columns are mostly converted. It only needs the helpers, not a database:
+
+    python -m apps.pilotlog.benchmarks.convert_rows --rows 100000
+"""
+import argparse
+import random
+import time
+from decimal import Decimal, InvalidOperation
+
+from ..helpers.mappings import (get_aircraft_mapping, get_aircraft_row_converter, get_flights_mapping,
+                                get_flights_row_converter)
+from ..helpers.utils import timestamp_to_year
+
+
+def baseline_convert_types(value, type_expected):
+    """
+    Copy of convert_types before the converters were compiled, the baseline
+    of the benchmark.
+    """
+    if type_expected == 'YYYY':
+        value = timestamp_to_year(value)
+    elif type_expected == 'Boolean':
+        value = 'x' if value else ''
+    elif type_expected == 'Decimal':
+        try:
+            value = Decimal(value)
+        except (ValueError, InvalidOperation):
+            pass
+    return value
+
+
+def make_aircraft_meta(i):
+    """
+    Build the meta of a synthetic aircraft.
+
+    :param i: the number of the aircraft
+    :return: a dictionary like the meta of an imported Aircraft
+    """
+    return {
+        'RefSearch': f'PH{i:04d}',
+        'Make': random.choice(['Cessna', 'Piper', 'Diamond']),
+        'Model': 'C150',
+        'Category': 1,
+        'Class': 5,
+        'Tailwheel': False,
+        'Power': 1,
+        'Complex': random.random() < 0.2,
+        'HighPerf': random.random() < 0.1,
+        'Kg5700': False,
+        'Aerobatic': False,
+        'Record_Modified': 1616320991 + i,
+    }
+
+
+def make_flight_meta(i):
+    """
+    Build the meta of a synthetic flight.
+
+    :param i: the number of the flight
+    :return: a dictionary like the meta of an imported Flight
+    """
+    minutes = random.randint(30, 600)
+    return {
+        'DateUTC': f'{1990 + i % 30}-{1 + i % 12:02d}-{1 + i % 28:02d}',
+        'AircraftCode': f'00000000-0000-0000-0000-{i % 100:012d}',
+        'DepCode': '00000000-0000-0000-0000-000000009693',
+        'ArrCode': '00000000-0000-0000-0000-000000009693',
+        'Route': '',
+        'DepTimeUTC': random.randint(0, 1439),
+        'ArrTimeUTC': random.randint(0, 1439),
+        'LdgTimeUTC': random.randint(0, 1439),
+        'DepOffset': 120,
+        'ArrOffset': 120,
+        'minPIC': minutes,
+        'minCOP': 0,
+        'minNIGHT': 0,
+        'minSFR': 0,
+        'minXC': minutes,
+        'minAIR': 0,
+        'LdgNight': 0,
+        'HobbsIn': 0,
+        'HobbsOut': 0,
+        'Holding': 0,
+        'Training': '',
+        'Record_Modified': 1616320991 + i,
+    }
+
+
+def convert_per_cell(heads, mapping, metas):
+    """
+    Convert records the way the export did before, one baseline_convert_types
+    call per cell.
+    """
+    columns = list(zip(heads, mapping.values()))
+    for meta in metas:
+        [baseline_convert_types(meta.get(field, ''), head) for head, field in columns]
+
+
+def convert_rows(convert_row, metas):
+    """
+    Convert records with a row converter of the export.
+    """
+    for meta in metas:
+        convert_row(meta)
+
+
+def measure(func, *args):
+    """
+    Time a conversion.
+
+    :return: the number of seconds it took
+    """
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def run(rows=100000, seed=0):
+    """
+    Run the benchmark on synthetic aircraft and flights.
+
+    :param rows: the number of records of each table
+    :param seed: the seed of the synthetic records
+    :return: a dictionary of rows per second by table and method
+    """
+    random.seed(seed)
+    aircraft = [make_aircraft_meta(i) for i in range(rows)]
+    flights = [make_flight_meta(i) for i in range(rows)]
+    results = {}
+
+    for table, metas, (heads, mapping), convert_row in (
+            ('aircraft', aircraft, get_aircraft_mapping(), get_aircraft_row_converter()),
+            ('flights', flights, get_flights_mapping(), get_flights_row_converter())):
+        results[table] = {
+            'baseline': rows / measure(convert_per_cell, heads, mapping, metas),
+            'export': rows / measure(convert_rows, convert_row, metas),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000, help='Number of records of each table')
+    args = parser.parse_args()
+
+    for table, result in run(args.rows).items():
+        gain = result['export'] / result['baseline']
+        print(f"{table}: baseline {result['baseline']:,.0f} rows/s, "
+              f"export {result['export']:,.0f} rows/s ({gain:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
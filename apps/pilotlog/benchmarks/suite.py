@@ -0,0 +1,209 @@
+import os
+import resource
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+from rest_framework.test import APIRequestFactory
+from pilotlog.models.aircraft import Aircraft
+from pilotlog.models.flight import Flight
+
+from ..DRF.Viewsets.aircraft import AircraftViewSet
+from ..DRF.Viewsets.flight import AircraftFlightViewSet, FlightViewSet
+from ..DRF.Viewsets.totals import LogbookTotalsView
+from ..DRF.pagination import KeysetPagination
+from ..helpers.import_export import export_to_csv, import_data
+
+'''
+    Throughput and latency benchmarks of the import, the export and the API.
+    Every benchmark returns a dictionary of measures that can be saved as JSON
+    and compared with compare_results.
+'''
+
+# Measures where a lower value is better, the others are better higher
+LOWER_IS_BETTER = ('seconds', 'queries', 'ms', 'rss')
+
+# Sizes of the run rather than measures, they are not compared
+COUNTS = ('records', 'rows', 'requests', 'bytes')
+
+# Headers of the timed requests, skipping the response cache of the list endpoints
+NO_CACHE = {'Cache-Control': 'no-cache'}
+
+
+def peak_rss_mb():
+    """
+    Return the peak resident memory of this process and its finished workers.
+
+    :return: the peak RSS in megabytes
+    """
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return round(peak / scale, 1)
+
+
+@contextmanager
+def count_queries():
+    """
+    Count the queries run on the default connection inside the block.
+
+    :return: a list whose length is the number of queries
+    """
+    queries = []
+
+    def wrapper(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(wrapper):
+        yield queries
+
+
+def bench_import(file_path, workers=1, backend=None, validate=False):
+    """
+    Time the streaming import of a file.
+
+    Queries run by worker processes are reported by the import statistics.
+    With validate, a model instance is built and checked for every record,
+    instead of the raw rows of the backends that have a row path.
+    """
+    start = time.perf_counter()
+    stats = import_data(file_path, stream=True, workers=workers, backend=backend, validate=validate)
+    seconds = time.perf_counter() - start
+    return {
+        'records': stats['records'],
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(stats['records'] / seconds),
+        'queries': stats['queries'],
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def bench_export(file_path):
+    """
+    Time the CSV export of the whole logbook into a file.
+    """
+    rows = Aircraft.objects.count() + Flight.objects.count()
+    with count_queries() as queries:
+        start = time.perf_counter()
+        export_to_csv(file_path)
+        seconds = time.perf_counter() - start
+    return {
+        'rows': rows,
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(rows / seconds),
+        'queries': len(queries),
+        'bytes': os.path.getsize(file_path),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def bench_endpoint(view, path, requests=20, headers=NO_CACHE, status=200, **kwargs):
+    """
+    Time the requests of a list endpoint.
+
+    :param view: the view function of the endpoint
+    :param path: the path requested, with its query string
+    :param requests: the number of requests to time
+    :param headers: the request headers, by default skipping the response cache
+    :param status: the expected status code of the responses
+    :param kwargs: the URL keyword arguments of the view
+    """
+    factory = APIRequestFactory()
+    durations = []
+    with count_queries() as queries:
+        for _ in range(requests):
+            request = factory.get(path, headers=headers)
+            start = time.perf_counter()
+            response = view(request, **kwargs)
+            response.render()
+            durations.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == status, response.content
+
+    durations.sort()
+    return {
+        'requests': requests,
+        'mean_ms': round(statistics.mean(durations), 2),
+        'p50_ms': round(durations[len(durations) // 2], 2),
+        'p95_ms': round(durations[min(len(durations) - 1, int(len(durations) * 0.95))], 2),
+        'queries_per_request': round(len(queries) / requests, 1),
+        'bytes': len(response.content),
+    }
+
+
+def bench_api(requests=20):
+    """
+    Time the first and the last page of the aircraft and flights list
+    endpoints, a page of flights projected on a few fields and meta keys, the
+    last page of flights by cursor, the flights of one aircraft and the flight
+    totals of one user.
+    The first page of flights is also timed from the response cache, and
+    revalidated with its ETag.
+    """
+    aircraft_list = AircraftViewSet.as_view({'get': 'list'})
+    flight_list = FlightViewSet.as_view({'get': 'list'})
+    page_size = 100
+    last_aircraft = max(1, -(-Aircraft.objects.count() // page_size))
+    last_flight = max(1, -(-Flight.objects.count() // page_size))
+    results = {
+        'aircraft_first_page': bench_endpoint(aircraft_list, f'/aircraft/?page_size={page_size}', requests),
+        'aircraft_last_page': bench_endpoint(
+            aircraft_list, f'/aircraft/?page_size={page_size}&page={last_aircraft}', requests),
+        'flights_first_page': bench_endpoint(flight_list, f'/flights/?page_size={page_size}', requests),
+        'flights_last_page': bench_endpoint(
+            flight_list, f'/flights/?page_size={page_size}&page={last_flight}', requests),
+    }
+    results['flights_cached_page'] = bench_endpoint(
+        flight_list, f'/flights/?page_size={page_size}', requests, headers={})
+    etag = flight_list(APIRequestFactory().get(f'/flights/?page_size={page_size}'))['ETag']
+    results['flights_not_modified'] = bench_endpoint(
+        flight_list, f'/flights/?page_size={page_size}', requests, headers={'If-None-Match': etag}, status=304)
+    results['flights_projected_page'] = bench_endpoint(
+        flight_list, f'/flights/?page_size={page_size}&fields=guid,date,aircraft,meta&meta_keys=DepCode,ArrCode',
+        requests)
+
+    # Cursor of the last page of flights, the position right before it
+    flight_count = Flight.objects.count()
+    position = Flight.objects.order_by('_modified', 'guid').values_list('_modified', 'guid')[
+        max(0, flight_count - page_size - 1)] if flight_count else None
+    if position:
+        cursor = KeysetPagination().encode_cursor([str(value) for value in position])
+        results['flights_cursor_last_page'] = bench_endpoint(
+            flight_list, f'/flights/?page_size={page_size}&cursor={cursor}', requests)
+
+    user_id = Flight.objects.values_list('user_id', flat=True).first()
+    if user_id is not None:
+        results['user_totals'] = bench_endpoint(
+            LogbookTotalsView.as_view(), f'/users/{user_id}/totals/?group_by=aircraft,year', requests,
+            user_id=user_id)
+
+    aircraft_guid = Flight.objects.values_list('aircraft_id', flat=True).first()
+    if aircraft_guid:
+        results['aircraft_flights'] = bench_endpoint(
+            AircraftFlightViewSet.as_view({'get': 'list'}), f'/aircraft/{aircraft_guid}/flights/?page_size={page_size}', requests,
+            aircraft_guid=aircraft_guid)
+    return results
+
+
+def compare_results(results, baseline, path=()):
+    """
+    Compare the measures of a run with the ones of a baseline run.
+
+    :param results: the results of the run
+    :param baseline: the results of the baseline run
+    :param path: the keys leading to the compared dictionaries
+    :return: a generator of (measure path, baseline value, value, change in
+        percent, whether it is an improvement) tuples
+    """
+    for key, value in results.items():
+        if key not in baseline or key in COUNTS:
+            continue
+        if isinstance(value, dict):
+            yield from compare_results(value, baseline[key], path + (key,))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and baseline[key]:
+            change = (value - baseline[key]) * 100 / baseline[key]
+            lower_is_better = any(word in key for word in LOWER_IS_BETTER)
+            better = change < 0 if lower_is_better else change > 0
+            yield '.'.join(path + (key,)), baseline[key], value, round(change, 1), better
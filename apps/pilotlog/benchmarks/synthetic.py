@@ -0,0 +1,140 @@
+import copy
+import json
+import os
+import random
+import uuid
+
+from apexive.settings import PROJECT_ROOT
+from ..helpers.json_stream import iter_records
+
+'''
+    Synthetic logbook generator for the benchmarks.
+    Records are copies of the sample records of Data/data.json, one per table,
+    with new guids, users and a few varied meta values, so any number of
+    records can be generated with the shape of a real export.
+'''
+
+SAMPLE_FILE = os.path.join(PROJECT_ROOT, 'Data', 'data.json')
+
+# Share of the generated records of each table
+TABLE_WEIGHTS = {
+    'Flight': 60,
+    'Aircraft': 5,
+    'imagepic': 5,
+    'LimitRules': 5,
+    'myQuery': 5,
+    'myQueryBuild': 5,
+    'SettingConfig': 5,
+    'Qualification': 5,
+    'Pilot': 5,
+}
+
+# Meta key holding the guid of the record, by table
+CODE_FIELDS = {
+    'Flight': 'FlightCode',
+    'Aircraft': 'AircraftCode',
+    'imagepic': 'ImgCode',
+    'LimitRules': 'LimitCode',
+    'myQuery': 'mQCode',
+    'myQueryBuild': 'mQBCode',
+    'SettingConfig': 'ConfigCode',
+    'Qualification': 'QCode',
+    'Pilot': 'PilotCode',
+}
+
+MAKES = ['Cessna', 'Piper', 'Diamond', 'Cirrus', 'Beechcraft', 'Mooney']
+
+
+def load_templates(file_path=SAMPLE_FILE):
+    """
+    Load one sample record per table.
+
+    :param file_path: the JSON file with the sample records
+    :return: a dictionary of sample records by table name
+    """
+    templates = {}
+    for record in iter_records(file_path):
+        templates.setdefault(record['table'], record)
+    return templates
+
+
+def make_guid(n):
+    """
+    Return the n-th synthetic guid.
+    """
+    return str(uuid.UUID(int=n))
+
+
+def generate_records(count, users=None, seed=0, templates=None):
+    """
+    Generate synthetic records shaped like the sample records.
+
+    Every user gets an aircraft before its first flight, and flights are
+    spread over the aircraft of their user.
+
+    :param count: the number of records to generate
+    :param users: the number of users owning the records, defaults to one
+        per 1000 records
+    :param seed: the seed of the random values
+    :param templates: the sample records by table, see load_templates
+    :return: a generator of records
+    """
+    rng = random.Random(seed)
+    templates = templates or load_templates()
+    users = users or max(1, count // 1000)
+    tables = list(TABLE_WEIGHTS)
+    weights = list(TABLE_WEIGHTS.values())
+    aircraft = {}
+
+    for n in range(1, count + 1):
+        user_id = 100000 + rng.randrange(users)
+        table = rng.choices(tables, weights)[0]
+        if table == 'Flight' and user_id not in aircraft:
+            table = 'Aircraft'
+
+        record = copy.deepcopy(templates[table])
+        guid = str(n) if table == 'SettingConfig' else make_guid(n)
+        modified = record['_modified'] + rng.randrange(10 ** 6)
+        meta = record['meta']
+        meta[CODE_FIELDS[table]] = n if table == 'SettingConfig' else guid
+        meta['Record_Modified'] = modified
+
+        if table == 'Aircraft':
+            aircraft.setdefault(user_id, []).append(guid)
+            meta['Make'] = rng.choice(MAKES)
+            meta['RefSearch'] = meta['Reference'] = f'PH{n:06d}'
+            meta['Active'] = rng.random() < 0.8
+            meta['Complex'] = rng.random() < 0.2
+            meta['HighPerf'] = rng.random() < 0.1
+        elif table == 'Flight':
+            minutes = rng.randrange(20, 600)
+            meta['AircraftCode'] = rng.choice(aircraft[user_id])
+            meta['DateUTC'] = meta['DateLOCAL'] = (f'{rng.randrange(1990, 2025)}-'
+                                                   f'{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}')
+            meta['minTOTAL'] = meta['minPIC'] = minutes
+            meta['minNIGHT'] = rng.choice([0, 0, 0, minutes // 2])
+            meta['DepTimeUTC'] = rng.randrange(1440)
+            meta['ArrTimeUTC'] = (meta['DepTimeUTC'] + minutes) % 1440
+
+        record.update(user_id=user_id, guid=guid, _modified=modified)
+        yield record
+
+
+def write_records(file_path, records):
+    """
+    Write records to a JSON array file, one record per line.
+
+    :param file_path: the file path to write the records to
+    :param records: an iterable of records
+    :return: the number of records written
+    """
+    written = 0
+    with open(file_path, 'w') as f:
+        f.write('[\n')
+        for record in records:
+            if written:
+                f.write(',\n')
+            f.write(json.dumps(record))
+            written += 1
+        f.write('\n]\n')
+    return written
@@ -0,0 +1,45 @@
+import time
+
+from django.core.cache import cache
+
+'''
+    Generation counters of the cached API responses.
+    Every logbook user has a generation counter, and so has the whole
+    database. Cached responses are keyed by the generation of the data they
+    show, so bumping a counter invalidates all of them at once: the old
+    entries are never read again and simply expire.
+'''
+
+GENERATION_KEY = 'pilotlog:generation:{}'
+ALL_USERS = 'all'
+
+
+def get_generation(user_id=None):
+    """
+    Return the generation of the data of a user, or of all the users.
+
+    :param user_id: the user_id of the logbook, None for all the users
+    :return: the current generation
+    """
+    key = GENERATION_KEY.format(ALL_USERS if user_id is None else user_id)
+    generation = cache.get(key)
+    if generation is None:
+        # Start from the clock, so a counter lost by the cache never goes back
+        # to a generation that was already used
+        cache.add(key, time.time_ns(), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generations(user_ids):
+    """
+    Invalidate the cached responses of some users and of all the users.
+
+    :param user_ids: the user_ids whose data changed
+    """
+    for user_id in {*user_ids, None}:
+        key = GENERATION_KEY.format(ALL_USERS if user_id is None else user_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), timeout=None)
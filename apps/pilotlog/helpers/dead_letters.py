@@ -0,0 +1,140 @@
+import json
+import logging
+import os
+import shutil
+from collections import Counter
+
+from apexive.settings import DEAD_LETTER_SAMPLE_SIZE
+
+'''
+    Dead-letter sink of the records an import failed to write.
+    Failed records are streamed to an NDJSON file, one
+    {"table", "error_type", "error", "record"} object per line, instead of
+    being kept in memory. Only the counters by table and error type and a
+    small sample are kept for the report. The file can be imported again
+    with iter_dead_letters, e.g. with `import --replay`.
+'''
+
+logger = logging.getLogger(__name__)
+
+
+class DeadLetters:
+    """
+    Collect the records an import failed to write.
+
+    Every failure is counted by (table, error type) and the first
+    sample_size failures are kept in sample. With a path, every failure is
+    also appended to that NDJSON file, which is only created once a record
+    fails.
+    """
+
+    def __init__(self, path=None, mode='w', sample_size=DEAD_LETTER_SAMPLE_SIZE):
+        self.path = path
+        self.mode = mode
+        self.sample_size = sample_size
+        self.file = None
+        self.count = 0
+        # (table, error type) -> number of failed records
+        self.counts = Counter()
+        self.sample = []
+
+    def add(self, table, d, error):
+        """
+        Record a failed record.
+
+        :param table: the source table name of the record
+        :param d: a dictionary representing the record, without its table
+        :param error: the exception raised by the record
+        """
+        entry = {
+            'table': table,
+            'error_type': type(error).__name__,
+            'error': str(error),
+            'record': {'table': table, **d} if table is not None else d,
+        }
+        self.count += 1
+        self.counts[table, entry['error_type']] += 1
+        if len(self.sample) < self.sample_size:
+            self.sample.append(entry)
+        if self.path:
+            if self.file is None:
+                self.file = open(self.path, self.mode, encoding='utf-8')
+            self.file.write(json.dumps(entry, default=str) + '\n')
+
+    def merge(self, count, counts, sample):
+        """
+        Merge the counters and sample of another sink, e.g. of a worker process.
+
+        :param count: the number of records failed in the other sink
+        :param counts: its failed records by (table, error type)
+        :param sample: its sample of failures
+        """
+        self.count += count
+        self.counts.update(counts)
+        self.sample.extend(sample[:self.sample_size - len(self.sample)])
+
+    def append_file(self, path):
+        """
+        Move the failures written to another dead-letter file into this one.
+
+        :param path: the path of the other dead-letter file
+        """
+        if not os.path.exists(path):
+            return
+        if self.file is None:
+            self.file = open(self.path, self.mode, encoding='utf-8')
+        self.file.flush()
+        with open(path, encoding='utf-8') as f:
+            shutil.copyfileobj(f, self.file)
+        os.remove(path)
+
+    def flush(self):
+        """
+        Write the buffered failures to the file, e.g. before a checkpoint.
+        """
+        if self.file is not None:
+            self.file.flush()
+
+    def clear(self):
+        """
+        Reset the counters and the sample, the file keeps growing.
+        """
+        self.count = 0
+        self.counts.clear()
+        self.sample.clear()
+
+    def report(self):
+        """
+        Log the failed records by table and error type, and the sample.
+        """
+        for (table, error_type), count in sorted(self.counts.items(), key=lambda item: -item[1]):
+            logger.error(f"{count} {table} records failed with {error_type}")
+        for entry in self.sample:
+            logger.error(f"Failed {entry['table']} record ({entry['error_type']}: {entry['error']}): "
+                         f"{json.dumps(entry['record'], default=str)[:500]}")
+        if self.file is not None:
+            logger.error(f"Failed records written to {self.path}")
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def iter_dead_letters(file_path):
+    """
+    Iterate over the records of a dead-letter file, to import them again.
+
+    :param file_path: the path of the NDJSON dead-letter file
+    :return: a generator of records
+    """
+    with open(file_path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)['record']
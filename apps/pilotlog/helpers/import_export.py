@@ -1,10 +1,14 @@
 import os
-import json
 import csv
 import logging
-from django_bulk_load import bulk_insert_models
+import time
+import uuid
+from collections import Counter, defaultdict
+from contextlib import nullcontext
+from django.db import connection, transaction
 from pilotlog.models.aircraft import Aircraft
 from pilotlog.models.flight import Flight
+from pilotlog.models.flight_totals import FlightTotals
 from pilotlog.models.image_pic import ImagePic
 from pilotlog.models.limit_rules import LimitRules
 from pilotlog.models.my_query import MyQuery
@@ -13,9 +17,16 @@ from pilotlog.models.pilot import Pilot
 from pilotlog.models.qualification import Qualification
 from pilotlog.models.setting_config import SettingConfig
 
-from .mappings import get_aircraft_mapping, get_flights_mapping
-from .utils import convert_types, write_csv_row
-from apexive.settings import BULK_INSERT_CHUNK_SIZE
+from .dead_letters import DeadLetters, iter_dead_letters
+from .json_stream import RejectFile, iter_records
+from .loaders import RowLayout, get_insert_backend
+from .parallel_import import ParallelImport
+from .purge import purge_user
+from .mappings import (get_aircraft_mapping, get_aircraft_row_converter, get_flights_mapping,
+                       get_flights_row_converter)
+from .cache import bump_generations
+from .utils import iter_csv_table
+from apexive.settings import EXPORT_CHUNK_SIZE, PENDING_FLIGHTS_LIMIT
 
 '''
     Import and Export ForeFlight and Logbook
@@ -27,282 +38,779 @@ from apexive.settings import BULK_INSERT_CHUNK_SIZE
 logger = logging.getLogger(__name__)
 
 
-def load_data(file_path) -> json:
+def load_data(file_path, on_reject=None) -> list:
     """
-    Load data from a file path into a JSON object.
+    Load the records of a file path into a list.
+
+    The records are decoded one by one with iter_records, in a single pass
+    over the file, so the broken ones are skipped without failing the others
+    and files that are not valid JSON as a whole, e.g. with escaped double
+    quotes, are not parsed twice.
 
     :param file_path: the file path to load the data from
-    :return: the JSON object loaded from the file
-    :raises json.JSONDecodeError: if the file path does not contain a valid JSON object
+    :param on_reject: called with the byte offset, the text and the error of
+        every fragment skipped
+    :return: the list of records loaded from the file
     """
-    with open(file_path, 'r') as f:
-        # Load as string
-        data = f.read()
-        try:
-            data = json.loads(data)
-        except json.JSONDecodeError:
-            try:
-                # Remove double quotes
-                data = json.loads(data.replace('\\"', '"'))
-            except Exception as e:
-                logger.error(f"Error loading data: {e}")
-                return None
-        return data
+    return list(iter_records(file_path, on_reject=on_reject))
+
 
+# Source table name -> model class the records are imported into
+TABLE_MODELS = {
+    'Aircraft': Aircraft,
+    'Flight': Flight,
+    'imagepic': ImagePic,
+    'LimitRules': LimitRules,
+    'myQuery': MyQuery,
+    'myQueryBuild': MyQueryBuild,
+    'SettingConfig': SettingConfig,
+    'Qualification': Qualification,
+    'Pilot': Pilot,
+}
 
-def import_data(file_path):
+# Fields identifying a record in the database. The user_id is part of the key
+# even when the guid is the primary key, so the upserts of a table partitioned
+# by user_id only look into the partitions of the users of the batch.
+RECORD_KEY_FIELDS = ('user_id', 'guid')
+
+
+def guid_key(value):
     """
-    Import data from a file path into the database.
+    Normalize a GUID so the same value always gives the same key.
 
-    The function takes a file path as parameter, loads the data from it, and
-    imports it into the database using bulk inserts. If any errors occur during
-    the import, it logs the errors and continues with the next records.
+    :param value: a GUID as a string or UUID
+    :return: the canonical string form of the GUID
+    :raises ValueError: if the value is not a valid GUID
+    """
+    return str(uuid.UUID(str(value)))
 
-    :param file_path: the file path to load the data from
-    :return: None
-    :raises Exception: if any error occurs during the import
+
+class ImportPipeline:
     """
-    data = load_data(file_path)
-    if not data:
-        return
-
-    batch_size = BULK_INSERT_CHUNK_SIZE
-    errors = []
-
-    # Dictionary to hold objects for each table
-    objects_map = {
-        'Aircraft': [],
-        'Flight': [],
-        'ImagePic': [],
-        'LimitRules': [],
-        'MyQuery': [],
-        'MyQueryBuild': [],
-        'SettingConfig': [],
-        'Qualification': [],
-        'Pilot': [],
-    }
-
-    def insert_batch(model_name, objects):
-        """
-        Helper function to bulk insert objects and reset the list.
+    Single-pass import of logbook records into the database.
+
+    Records are fed one at a time and grouped in per-table batches that are
+    bulk inserted as they fill up. Flights need their Aircraft to exist first,
+    so a Flight whose Aircraft has not been inserted yet is held back and
+    released once the Aircraft batch is flushed.
+
+    Aircraft references are resolved through an in-memory index of the guids
+    known to be in the database, seeded from every Aircraft batch inserted.
+    Guids that are not in the index are looked up in bulk, one query per batch
+    of waiting Flights, and Flights are built with aircraft_id so no Aircraft
+    is ever loaded. Flights still waiting at the end are reported as
+    unresolved. At most pending_limit Flights wait at a time: once reached,
+    the Aircraft batch is inserted, the waiting Flights are looked up, and
+    those whose Aircraft is still missing fail without waiting for the end.
+
+    Batches are inserted by an insert backend (see loaders.py), and the batch
+    size defaults to the chunk size of that backend. With a backend that has a
+    row path, records are turned straight into raw rows by a RowLayout of
+    their model, without instantiating it. With validate, or a backend
+    without a row path, model instances are built instead; validate also
+    checks their fields, so an invalid record fails alone instead of failing
+    the insert of its whole batch.
+
+    Every batch is written in its own transaction. When a batch fails, e.g.
+    on a conflict with a stored record, its records are written again one at
+    a time, so only the records that fail alone go to the dead letters.
+
+    In incremental mode, the (guid, _modified) pairs already stored for the
+    user_ids of a batch are loaded with one query when the batch is flushed.
+    Records that did not change are skipped and records with a newer
+    _modified are upserted, so a re-import costs time proportional to the
+    number of changes.
+
+    With track_outcomes, the outcome of every record written or skipped by an
+    incremental import is kept in outcomes, by (table, user_id, guid): 'created',
+    'updated' or 'unchanged'.
+
+    With refresh_unchanged, the flight totals and Aircraft counters of
+    unchanged Flights are refreshed too, for imports replaying records that
+    may have been written without their derived data being refreshed.
+    """
+
+    def __init__(self, batch_size=None, backend=None, incremental=False, track_outcomes=False,
+                 refresh_unchanged=False, dead_letters=None, validate=False,
+                 pending_limit=PENDING_FLIGHTS_LIMIT):
+        self.backend = get_insert_backend(backend)
+        self.batch_size = batch_size or self.backend.chunk_size
+        self.incremental = incremental
+        self.validate = validate
+        self.models = {model.__name__: model for model in TABLE_MODELS.values()}
+        # Model name -> source table name, for the dead letters
+        self.tables = {model.__name__: table for table, model in TABLE_MODELS.items()}
+        # Model name -> RowLayout, None when model instances are built instead
+        self.layouts = None
+        if self.backend.row_path and not validate:
+            self.layouts = {name: RowLayout(model) for name, model in self.models.items()}
+        self.outcomes = {} if track_outcomes else None
+        self.refresh_unchanged = refresh_unchanged
+        # Records that failed, see DeadLetters
+        self.dead_letters = DeadLetters() if dead_letters is None else dead_letters
+        self.stats = Counter()
+        # Records written or found unchanged, by table
+        self.table_records = Counter()
+        self.user_ids = set()
+        # (user_id, month) buckets of the flight totals and guids of the
+        # Aircraft whose flights were changed by the import
+        self.flight_months = set()
+        self.flight_aircraft = set()
+
+        # Dictionary to hold objects for each table, and their records
+        self.objects_map = {name: [] for name in self.models}
+        self.batch_records = {name: [] for name in self.models}
+
+        # Aircraft guids known to be in the database and in the current batch
+        self.aircraft_index = set()
+        self.batched_aircraft = set()
+
+        # Flights waiting for their Aircraft, by aircraft guid, and the guids
+        # of those not looked up in the database yet
+        self.pending_flights = defaultdict(list)
+        self.pending_count = 0
+        self.pending_limit = pending_limit
+        self.unchecked_aircraft = set()
+        self.unchecked_flights = 0
+
+    def run(self, records):
+        """
+        Import all the records and flush what is left at the end.
+
+        :param records: an iterable of dictionaries representing the records
+        :return: the pipeline itself
+        """
+        with connection.execute_wrapper(self.count_query):
+            for d in records:
+                self.feed(d)
+            self.finish()
+        return self
+
+    def feed(self, d):
+        """
+        Feed a single record to the pipeline.
+
+        :param d: a dictionary representing the record
+        """
+        self.stats['records'] += 1
+        self.user_ids.add(d.get('user_id'))
+        self.process(d)
+
+    def count_query(self, execute, sql, params, many, context):
+        """
+        Database execute wrapper counting the queries issued by the import.
+        """
+        self.stats['queries'] += 1
+        return execute(sql, params, many, context)
+
+    def process(self, d):
+        """
+        Process a single record from the loaded data.
+
+        :param d: a dictionary representing the record
+        """
+        table = None
+        try:
+            table = d.pop('table')
+            if table == 'Aircraft':
+                self.process_aircraft(d)
+            elif table == 'Flight':
+                self.process_flight(d)
+            elif table in TABLE_MODELS:
+                self.process_generic(TABLE_MODELS[table], d)
+        except Exception as e:
+            logger.debug(f"Exception loading: {d} - {e}")
+            self.dead_letters.add(table, d, e)
+
+    def build(self, model_class, d, **values):
+        """
+        Build the object inserting a record, a raw row or a model instance.
+
+        :param model_class: the model class of the record
+        :param d: a dictionary representing the record
+        :param values: values of fields that are not in the record, by attname
+        :return: the row or model instance
+        """
+        if self.layouts is not None:
+            return self.layouts[model_class.__name__].row(d, **values)
+        obj = model_class(**values, **d)
+        obj.sync_hot_meta()
+        if self.validate:
+            # The meta is always valid JSON, and may be empty, so may the hot
+            # meta columns copied from it
+            obj.clean_fields(exclude=['meta', *(name for name in obj.hot_meta if getattr(obj, name) is None)])
+        return obj
+
+    def item_value(self, model_name, obj, attname):
+        """
+        Read the value of a field from an object built by build().
+
+        :param model_name: the name of the model of the object
+        :param obj: the row or model instance
+        :param attname: the attname of the field
+        :return: the value of the field
+        """
+        if self.layouts is not None:
+            return self.layouts[model_name].value(obj, attname)
+        return getattr(obj, attname)
+
+    def add_object(self, model_name, obj, d):
+        """
+        Add an object to its table batch, inserting the batch once full.
+
+        :param model_name: the name of the model of the object
+        :param obj: the row or model instance to insert
+        :param d: the dictionary of the record of the object, dead-lettered
+            if the object cannot be written
+        """
+        self.objects_map[model_name].append(obj)
+        self.batch_records[model_name].append(d)
+        if len(self.objects_map[model_name]) >= self.batch_size:
+            self.insert_batch(model_name)
+
+    def insert_batch(self, model_name):
+        """
+        Bulk insert the objects of a table and reset its batch.
+
+        If the batch fails, its objects are written one at a time and the
+        records of those failing alone are dead-lettered.
 
         :param model_name: the name of the model to insert
-        :param objects: the list of objects to insert
         """
-        if objects:
-            bulk_insert_models(models=objects, ignore_conflicts=model_name != 'Aircraft')
-            objects_map[model_name] = []  # Reset the list
+        objects = self.objects_map[model_name]
+        if not objects:
+            return
+        records = self.batch_records[model_name]
+        # Reset the lists
+        self.objects_map[model_name] = []
+        self.batch_records[model_name] = []
+
+        batched = set()
+        if model_name == 'Aircraft':
+            batched, self.batched_aircraft = self.batched_aircraft, set()
+        try:
+            self.write_batch(model_name, objects)
+        except Exception as e:
+            logger.warning(f"Failed to write a batch of {len(objects)} {model_name} records ({e}), "
+                           f"writing them one at a time.")
+            written, failed = set(), set()
+            for obj, d in zip(objects, records):
+                try:
+                    self.write_batch(model_name, [obj])
+                except Exception as e:
+                    logger.debug(f"Exception loading {model_name}: {d} - {e}")
+                    self.dead_letters.add(self.tables[model_name], d, e)
+                    failed.add(d.get('guid'))
+                else:
+                    written.add(d.get('guid'))
+            if model_name == 'Aircraft':
+                # Flights waiting for the Aircraft not written must now be looked up
+                lost = {guid_key(guid) for guid in failed} - {guid_key(guid) for guid in written}
+                batched -= lost
+                self.unchecked_aircraft.update(guid for guid in lost if guid in self.pending_flights)
+        self.release_flights(batched)
+
+    def write_batch(self, model_name, batch):
+        """
+        Write a batch of objects in one transaction and account for it.
+
+        :param model_name: the name of the model of the batch
+        :param batch: the list of rows or model instances to write
+        :raises Exception: if the batch cannot be written, nothing of it is
+        """
+        new, changed = batch, []
+        with transaction.atomic():
+            if self.incremental:
+                new, changed = self.split_changes(model_name, batch)
+                if model_name == 'Flight':
+                    self.track_flights(changed, stored=True)
+                self.upsert_objects(model_name, changed)
+                self.insert_objects(model_name, new, ignore_conflicts=True)
+            else:
+                self.insert_objects(model_name, new, ignore_conflicts=model_name != 'Aircraft')
+
+        if model_name == 'Flight':
+            self.track_flights(batch if self.incremental and self.refresh_unchanged else new + changed)
+        if self.incremental:
+            self.stats['unchanged'] += len(batch) - len(new) - len(changed)
+            self.stats['upserted'] += len(changed)
+            if self.outcomes is not None:
+                self.track_outcomes(model_name, batch, new, changed)
+        self.stats['insert_rows'] += len(new) + len(changed)
+        self.table_records[model_name] += len(batch)
+
+    def track_flights(self, flights, stored=False):
+        """
+        Record the months of the flight totals and the Aircraft changed by a
+        batch of Flights.
+
+        :param flights: the list of Flight rows or instances
+        :param stored: record the stored version of the Flights, before they
+            are upserted, since their date and Aircraft may change
+        """
+        if not flights:
+            return
+        if stored:
+            rows = Flight.objects.filter(
+                user_id__in={self.item_value('Flight', obj, 'user_id') for obj in flights},
+                guid__in=[self.item_value('Flight', obj, 'guid') for obj in flights],
+            ).values_list('user_id', 'date', 'aircraft_id')
+        else:
+            rows = [
+                tuple(self.item_value('Flight', obj, attname) for attname in ('user_id', 'date', 'aircraft_id'))
+                for obj in flights
+            ]
+        for user_id, date, aircraft_id in rows:
+            self.flight_months.add((user_id, date and date.replace(day=1)))
+            self.flight_aircraft.add(guid_key(aircraft_id))
+
+    def track_outcomes(self, model_name, batch, new, changed):
+        """
+        Record the outcome of the records of a batch written incrementally.
+
+        :param model_name: the name of the model of the batch
+        :param batch: the list of rows or model instances of the batch
+        :param new: the objects inserted
+        :param changed: the objects upserted, the others were unchanged
+        """
+        for objects, outcome in ((batch, 'unchanged'), (changed, 'updated'), (new, 'created')):
+            for obj in objects:
+                self.outcomes[model_name, self.item_value(model_name, obj, 'user_id'),
+                              guid_key(self.item_value(model_name, obj, 'guid'))] = outcome
+
+    def split_changes(self, model_name, objects):
+        """
+        Compare a batch with the stored records of its user_ids.
+
+        Duplicated records in the batch are reduced to the most recent one.
+
+        :param model_name: the name of the model of the batch
+        :param objects: the list of rows or model instances of the batch
+        :return: a tuple of two lists, the new objects and the objects with a
+            newer _modified than the stored record; unchanged objects are dropped
+        """
+        model_class = self.models[model_name]
+        guid_field = model_class._meta.get_field('guid')
+        latest = {}
+        for obj in objects:
+            key = (self.item_value(model_name, obj, 'user_id'),
+                   guid_field.to_python(self.item_value(model_name, obj, 'guid')))
+            _modified = self.item_value(model_name, obj, '_modified')
+            if key not in latest or latest[key][0] < _modified:
+                latest[key] = (_modified, obj)
+
+        stored = model_class.objects.filter(
+            user_id__in={user_id for user_id, _ in latest},
+            guid__in=[guid for _, guid in latest],
+        ).values_list('user_id', 'guid', '_modified')
+        modified = {(user_id, guid): _modified for user_id, guid, _modified in stored}
+
+        new, changed = [], []
+        for key, (_modified, obj) in latest.items():
+            if key not in modified:
+                new.append(obj)
+            elif modified[key] < _modified:
+                changed.append(obj)
+        return new, changed
+
+    def insert_objects(self, model_name, objects, ignore_conflicts):
+        """
+        Insert objects with the insert backend, timing the insert.
 
-    def process_aircraft(d):
+        :param model_name: the name of the model of the objects
+        :param objects: the list of rows or model instances to insert
+        :param ignore_conflicts: skip the rows conflicting with existing ones
+        """
+        if not objects:
+            return
+        start = time.monotonic()
+        if self.layouts is not None:
+            self.backend.insert_rows(self.layouts[model_name], objects, ignore_conflicts=ignore_conflicts)
+        else:
+            self.backend.insert(objects, ignore_conflicts=ignore_conflicts)
+        self.stats['insert_seconds'] += time.monotonic() - start
+
+    def upsert_objects(self, model_name, objects):
+        """
+        Upsert objects with the insert backend, timing the upsert.
+
+        :param model_name: the name of the model of the objects
+        :param objects: the list of rows or model instances to upsert
+        """
+        if not objects:
+            return
+        start = time.monotonic()
+        if self.layouts is not None:
+            self.backend.upsert_rows(self.layouts[model_name], objects, key_fields=RECORD_KEY_FIELDS)
+        else:
+            self.backend.upsert(objects, key_fields=RECORD_KEY_FIELDS)
+        self.stats['insert_seconds'] += time.monotonic() - start
+
+    def release_flights(self, aircraft_guids):
+        """
+        Mark Aircraft as present in the database and process their waiting Flights.
+
+        :param aircraft_guids: the guids of the Aircraft now in the database
+        """
+        self.aircraft_index.update(aircraft_guids)
+        for aircraft_guid in aircraft_guids:
+            flights = self.pending_flights.pop(aircraft_guid, ())
+            self.pending_count -= len(flights)
+            for d in flights:
+                try:
+                    self.process_flight(d)
+                except Exception as e:
+                    logger.debug(f"Exception loading Flight: {d} - {e}")
+                    self.dead_letters.add('Flight', d, e)
+
+    def process_aircraft(self, d):
         """
         Process an Aircraft record from the loaded data.
 
         :param d: a dictionary representing the Aircraft record
         """
-        aircraft = d.copy()
-        aircraft.pop('table')
-        objects_map['Aircraft'].append(Aircraft(**aircraft))
-        if len(objects_map['Aircraft']) >= batch_size:
-            insert_batch('Aircraft', objects_map['Aircraft'])
+        obj = self.build(Aircraft, d)
+        self.batched_aircraft.add(guid_key(d['guid']))
+        self.add_object('Aircraft', obj, d)
 
-    def process_flight(d):
+    def process_flight(self, d):
         """
         Process a Flight record from the loaded data.
 
         :param d: a dictionary representing the Flight record
         """
-        d.pop('table')
-        try:
-            aircraft = Aircraft.objects.get(guid=d['meta']['AircraftCode'])
-            objects_map['Flight'].append(Flight(aircraft=aircraft, **d))
-            if len(objects_map['Flight']) >= batch_size:
-                insert_batch('Flight', objects_map['Flight'])
-        except Aircraft.DoesNotExist as e:
-            logger.error(f"Aircraft not found for Flight: {d['meta']['AircraftCode']} - {e}")
-            errors.append(d)
-
-    def process_generic(table_name, model_class, d):
+        aircraft_guid = guid_key(d['meta']['AircraftCode'])
+        if aircraft_guid in self.aircraft_index:
+            self.add_object('Flight', self.build(Flight, d, aircraft_id=aircraft_guid), d)
+            return
+
+        if aircraft_guid not in self.pending_flights and aircraft_guid not in self.batched_aircraft:
+            self.unchecked_aircraft.add(aircraft_guid)
+        self.pending_flights[aircraft_guid].append(d)
+        self.pending_count += 1
+        if self.pending_count >= self.pending_limit:
+            self.insert_batch('Aircraft')
+            self.lookup_aircraft()
+            self.reject_pending()
+        elif aircraft_guid in self.unchecked_aircraft:
+            self.unchecked_flights += 1
+            if self.unchecked_flights >= self.batch_size:
+                self.lookup_aircraft()
+
+    def process_generic(self, model_class, d):
         """
         Process a generic record from the loaded data.
         Generic records are any record that is not an Aircraft or Flight.
 
-        :param table_name: the name of the table to insert into
         :param model_class: the model class to use for the insert
         :param d: a dictionary representing the record
         """
-        d.pop('table')
-        objects_map[table_name].append(model_class(**d))
-        if len(objects_map[table_name]) >= batch_size:
-            insert_batch(table_name, objects_map[table_name])
-
-    processing_map = {
-        'Aircraft': process_aircraft,
-        'Flight': process_flight,
-        'imagepic': lambda d: process_generic('ImagePic', ImagePic, d),
-        'LimitRules': lambda d: process_generic('LimitRules', LimitRules, d),
-        'myQuery': lambda d: process_generic('MyQuery', MyQuery, d),
-        'myQueryBuild': lambda d: process_generic('MyQueryBuild', MyQueryBuild, d),
-        'SettingConfig': lambda d: process_generic('SettingConfig', SettingConfig, d),
-        'Qualification': lambda d: process_generic('Qualification', Qualification, d),
-        'Pilot': lambda d: process_generic('Pilot', Pilot, d),
-    }
-
-    # Process Aircrafts first
-    for d in data:
-        try:
-            if d['table'] == 'Aircraft':
-                processing_map['Aircraft'](d)
-        except Exception as e:
-            logger.error(f"Exception loading Aircraft: {d} - {e}")
-            errors.append(d)
+        self.add_object(model_class.__name__, self.build(model_class, d), d)
 
-    # Insert remaining Aircrafts if any
-    insert_batch('Aircraft', objects_map['Aircraft'])
+    def lookup_aircraft(self):
+        """
+        Look up in bulk the Aircraft of the waiting Flights not checked yet,
+        and release the Flights whose Aircraft is already in the database.
+        """
+        aircraft_guids = list(self.unchecked_aircraft)
+        self.unchecked_aircraft.clear()
+        self.unchecked_flights = 0
+        for i in range(0, len(aircraft_guids), self.batch_size):
+            existing = Aircraft.objects.filter(
+                guid__in=aircraft_guids[i:i + self.batch_size]
+            ).values_list('guid', flat=True)
+            self.release_flights([guid_key(guid) for guid in existing])
+
+    def flush(self):
+        """
+        Insert the remaining batches. Flights whose Aircraft is not in the
+        database yet keep waiting for it.
+        """
+        # Insert remaining Aircrafts first, so their Flights are released
+        self.insert_batch('Aircraft')
+        self.lookup_aircraft()
 
-    # Process the rest (Flights, ImagePics, LimitRules, MyQueries)
-    for d in data:
-        try:
-            table = d['table']
-            if table != 'Aircraft' and table in processing_map:
-                processing_map[table](d)
-        except Exception as e:
-            logger.error(f"Exception loading: {d} - {e}")
-            errors.append(d)
+        # Insert remaining data
+        for model_name in self.objects_map:
+            self.insert_batch(model_name)
 
-    # Insert remaining data
-    for table, objs in objects_map.items():
-        insert_batch(table, objs)
+    def finish(self):
+        """
+        Insert the remaining batches and report the unresolved Flights.
+        """
+        self.flush()
+        self.reject_pending()
 
-    logger.info(f"Finished importing with {len(errors)} failed records.")
+    def reject_pending(self):
+        """
+        Fail the Flights still waiting for their Aircraft.
+        """
+        for aircraft_guid, flights in self.pending_flights.items():
+            logger.error(f"Aircraft not found for {len(flights)} Flights: {aircraft_guid}")
+            for d in flights:
+                self.dead_letters.add('Flight', d, Aircraft.DoesNotExist(f"Aircraft not found: {aircraft_guid}"))
+        self.pending_flights.clear()
+        self.pending_count = 0
+
+    def report(self):
+        """
+        Log the outcome of the import.
+        """
+        log_import_report(self.stats, self.dead_letters)
 
-    if errors:
-        logger.error(f"Failed records: {errors}")
 
+def queries_per_1k(stats):
+    """
+    Return the number of queries issued per 1000 imported records.
 
-def prepare_aircraft_data_to_csv(aircraft_data):
+    :param stats: the import statistics
+    :return: the number of queries per 1000 records
     """
-    Prepare aircraft data for export to CSV.
+    if not stats['records']:
+        return 0.0
+    return stats['queries'] * 1000 / stats['records']
 
-    :param aircraft_data: a list of DynamicTable objects with table='Aircraft'
-    :return: a tuple of three elements:
-        1. a list of strings, which are the headers for the CSV file
-        2. a list of dictionaries, where each dictionary represents a row in the CSV file
-        3. a dictionary mapping each aircraft GUID to its RefSearch value
+
+def rows_per_second(stats):
     """
-    aircraft_heads, aircraft_mapping  = get_aircraft_mapping()
-    fields_aircraft_data = []
-    aircraft_codes = {}
+    Return the number of rows inserted per second spent in the insert backend.
 
-    for data in aircraft_data:
-        aircraft = {}
-        for key, field in aircraft_mapping.items():
-            value = convert_types(data.meta.get(field, ''), key)
-            aircraft[key] = value
-        fields_aircraft_data.append(aircraft)
-        aircraft_codes[data.guid] = data.meta.get('RefSearch', '')
+    :param stats: the import statistics
+    :return: the number of rows per second
+    """
+    if not stats['insert_seconds']:
+        return 0.0
+    return stats['insert_rows'] / stats['insert_seconds']
 
-    return aircraft_heads, fields_aircraft_data, aircraft_codes
 
+def log_import_report(stats, dead_letters):
+    """
+    Log the statistics and failed records of an import.
 
-def export_to_csv(file_path, aircraft_queryset=None, flight_queryset=None):
+    :param stats: the import statistics
+    :param dead_letters: the DeadLetters of the failed records
     """
-    Export data from the database to a CSV file.
+    logger.info(f"Finished importing with {dead_letters.count} failed records.")
+    logger.info(f"Import issued {stats['queries']} queries for {stats['records']} "
+                f"records ({queries_per_1k(stats):.1f} per 1k records).")
+    logger.info(f"Inserted {stats['insert_rows']} rows in {stats['insert_seconds']:.2f}s "
+                f"({rows_per_second(stats):.0f} rows/s).")
+    if stats['unchanged'] or stats['upserted']:
+        logger.info(f"Skipped {stats['unchanged']} unchanged records and upserted {stats['upserted']}.")
+    dead_letters.report()
+
+
+def import_data(file_path, stream=False, workers=1, backend=None, incremental=False, reject_path=None,
+                dead_letter_path=None, replay=False, validate=False, replace=False):
+    """
+    Import data from a file path into the database.
 
-    :param flight_queryset:
-    :param aircraft_queryset:
-    :param file_path: the file path to write the data to
-    :raises Exception: if there is any error during export
+    The function takes a file path as parameter, loads the data from it, and
+    imports it into the database using bulk inserts in a single pass. If any
+    errors occur during the import, it counts the failed records, writes them
+    to the dead_letter_path NDJSON file and continues with the next records,
+    see DeadLetters. A dead-letter file can be imported again with replay.
+
+    In streaming mode the file is never loaded whole: records are parsed one at
+    a time and fed into the per-table batches, so memory stays bounded no
+    matter how big the file is.
+
+    With more than one worker, the records are sharded by table and user_id
+    and imported by a pool of processes, see ParallelImport.
+
+    The data derived from the imported records is refreshed, see
+    refresh_imported_data.
+
+    Broken records of an invalid file are skipped and, with reject_path,
+    written to an NDJSON reject file with their byte offsets, see RejectFile.
+
+    With replace, the logbooks of the users in the file are purged first, see
+    purge_user, and the purge and the import run in a single transaction:
+    the old logbooks stay visible until the new ones are committed, and are
+    kept if the import fails. In streaming mode the file is read twice, to
+    find its users first.
+
+    :param file_path: the file path to load the data from
+    :param stream: parse the file incrementally instead of loading it at once
+    :param workers: the number of processes importing the records
+    :param backend: the name of the insert backend, defaults to the
+        IMPORT_INSERT_BACKEND setting
+    :param incremental: skip the records that did not change since the last
+        import and upsert the ones with a newer _modified
+    :param reject_path: the file path the broken records are written to
+    :param dead_letter_path: the file path the failed records are written to
+    :param replay: the file is a dead-letter file to import again
+    :param validate: build and check a model instance for every record,
+        instead of inserting raw rows
+    :param replace: replace the logbooks of the users in the file
+    :return: the import statistics, or None if the file has no records
+    :raises ValueError: if replace is combined with replay, or with workers
+        that cannot share the transaction
+    :raises Exception: if any error occurs during the import
+    """
+    if replace and (replay or workers > 1):
+        raise ValueError("A logbook can only be replaced by a whole file imported by a single process")
+
+    with transaction.atomic() if replace else nullcontext(), \
+            RejectFile(reject_path) if reject_path else nullcontext() as rejects, \
+            DeadLetters(dead_letter_path) as dead_letters:
+        if replay:
+            records = iter_dead_letters(file_path)
+        elif stream:
+            records = iter_records(file_path, on_reject=rejects)
+        else:
+            records = load_data(file_path, on_reject=rejects)
+            if not records:
+                return None
+
+        if replace:
+            user_ids = {d.get('user_id') for d in (iter_records(file_path) if stream else records)}
+            for user_id in sorted(user_ids - {None}):
+                purge_user(user_id)
+
+        if workers > 1:
+            pipeline = ParallelImport(workers, backend=backend, incremental=incremental,
+                                      dead_letters=dead_letters, validate=validate)
+        else:
+            pipeline = ImportPipeline(backend=backend, incremental=incremental, dead_letters=dead_letters,
+                                      validate=validate)
+        try:
+            pipeline.run(records)
+        except Exception:
+            # Even a failed import may have changed the logbooks it went
+            # through, unless they are rolled back with the replace
+            if not replace:
+                try:
+                    refresh_imported_data(pipeline)
+                except Exception:
+                    logger.exception("Failed to refresh the data derived from the failed import.")
+            raise
+        refresh_imported_data(pipeline)
+        if rejects is not None and rejects.count:
+            pipeline.stats['rejected'] = rejects.count
+            logger.warning(f"Wrote {rejects.count} broken records to {reject_path}.")
+        pipeline.stats['failed'] = dead_letters.count
+        pipeline.report()
+    return pipeline.stats
+
+
+def refresh_imported_data(pipeline):
+    """
+    Refresh the data derived from the records written by an import.
+
+    The flight totals of the changed months and the flight counters of the
+    changed Aircraft are refreshed, and the cached API responses of the
+    imported users are invalidated once the transaction, if any, commits.
+
+    :param pipeline: the ImportPipeline or ParallelImport that ran
     """
+    FlightTotals.objects.refresh(pipeline.flight_months)
+    Aircraft.objects.refresh_flight_counters(pipeline.flight_aircraft)
+    user_ids = pipeline.user_ids - {None}
+    transaction.on_commit(lambda: bump_generations(user_ids))
 
-    (aircraft_heads, fields_aircraft_data,
-     flights_heads, fields_flights_data ) = prepare_logbook_data_to_csv(aircraft_queryset, flight_queryset)
 
-    generate_csv_file(aircraft_heads,
-                      fields_aircraft_data,
-                      flights_heads,
-                      fields_flights_data,
-                      file_path)
+def iter_aircraft_csv_rows(aircraft_queryset, aircraft_codes):
+    """
+    Generate the CSV rows of the aircraft, one at a time.
+
+    The queryset is read with a server-side cursor and only the guid and meta
+    columns are fetched.
+
+    :param aircraft_queryset: a queryset of Aircraft
+    :param aircraft_codes: a dictionary filled with each aircraft GUID and its
+        RefSearch value, used by the flights
+    :return: a generator of lists, where each list is a row in the CSV file
+    """
+    convert_row = get_aircraft_row_converter()
+    rows = aircraft_queryset.values_list('guid', 'meta').iterator(chunk_size=EXPORT_CHUNK_SIZE)
 
+    for guid, meta in rows:
+        yield convert_row(meta)
+        aircraft_codes[str(guid)] = meta.get('RefSearch', '')
 
 
-def prepare_flights_data_to_csv(flight_data, aircraft_codes):
+def iter_flight_csv_rows(flight_queryset, aircraft_codes):
     """
-    Prepare flight data for export to CSV.
+    Generate the CSV rows of the flights, one at a time.
 
-    :param flight_data: a list of DynamicTable objects with table='Flight'
+    The queryset is read with a server-side cursor and only the meta column is
+    fetched.
+
+    :param flight_queryset: a queryset of Flight
     :param aircraft_codes: a dictionary mapping aircraft GUID to RefSearch
-    :return: a tuple of two elements:
-        1. a list of strings, which are the headers for the CSV file
-        2. a list of dictionaries, where each dictionary represents a row in the CSV file
+    :return: a generator of lists, where each list is a row in the CSV file
     """
-    flights_heads, flights_mapping = get_flights_mapping()
-    fields_flights_data = []
+    _, flights_mapping = get_flights_mapping()
+    convert_row = get_flights_row_converter()
+    aircraft_column = list(flights_mapping).index('AircraftID')
+    rows = flight_queryset.values_list('meta', flat=True).iterator(chunk_size=EXPORT_CHUNK_SIZE)
 
-    for data in flight_data:
-        flight = {}
-        for key, field in flights_mapping.items():
-            value = convert_types(data.meta.get(field, ''), key)
-            flight[key] = value
-        flight['AircraftID'] = aircraft_codes.get(flight['AircraftID'], '')
-        fields_flights_data.append(flight)
+    for meta in rows:
+        flight = convert_row(meta)
+        flight[aircraft_column] = aircraft_codes.get(str(flight[aircraft_column]).lower(), '')
+        yield flight
 
-    return flights_heads, fields_flights_data
 
-def prepare_logbook_data_to_csv(aircraft_queryset=None, flight_queryset=None):
+def iter_logbook_csv_rows(aircraft_queryset=None, flight_queryset=None, user_id=None):
     """
-    Prepare aircraft and flight data for export to CSV.
-
-    :param aircraft_queryset: a queryset of DynamicTable objects with table='Aircraft'
-    :param flight_queryset: a queryset of DynamicTable objects with table='Flight'
-    :return: a tuple of four elements:
-        1. a list of strings, which are the headers for the aircraft CSV file
-        2. a list of dictionaries, where each dictionary represents a row in the aircraft CSV file
-        3. a list of strings, which are the headers for the flights CSV file
-        4. a list of dictionaries, where each dictionary represents a row in the flights CSV file
+    Generate the rows of the ForeFlight logbook CSV file, one at a time.
+
+    Rows are converted while the querysets are read, so memory stays flat
+    whatever the number of flights.
+
+    :param aircraft_queryset: a queryset of Aircraft, defaults to all of them
+    :param flight_queryset: a queryset of Flight, defaults to all of them
+    :param user_id: restrict the export to the logbook of a user, only
+        reading its partition of the partitioned tables
+    :return: a generator of lists, where each list is a row in the CSV file
     """
     if aircraft_queryset is None:
-        aircraft_queryset = DynamicTable.objects.filter(table='Aircraft')
+        aircraft_queryset = Aircraft.objects.all()
 
     if flight_queryset is None:
-        flight_queryset = DynamicTable.objects.filter(table='Flight')
+        flight_queryset = Flight.objects.all()
 
-    aircraft_heads, fields_aircraft_data, aircraft_codes = prepare_aircraft_data_to_csv(aircraft_queryset)
-    flights_heads, fields_flights_data = prepare_flights_data_to_csv(flight_queryset, aircraft_codes)
+    if user_id is not None:
+        aircraft_queryset = aircraft_queryset.for_user(user_id)
+        flight_queryset = flight_queryset.for_user(user_id)
 
-    return aircraft_heads, fields_aircraft_data, flights_heads, fields_flights_data
+    aircraft_heads, aircraft_mapping = get_aircraft_mapping()
+    flights_heads, flights_mapping = get_flights_mapping()
+    aircraft_codes = {}
+
+    yield ['ForeFlight Logbook Import']
+    yield [""]
+
+    yield ['Aircraft Table']
+    yield from iter_csv_table(aircraft_heads, list(aircraft_mapping),
+                              iter_aircraft_csv_rows(aircraft_queryset, aircraft_codes))
 
+    yield [""]
+    yield ['Flights Table']
+    yield from iter_csv_table(flights_heads, list(flights_mapping),
+                              iter_flight_csv_rows(flight_queryset, aircraft_codes))
 
-def generate_csv_file(aircraft_heads,
-                      fields_aircraft_data,
-                      flights_heads,
-                      fields_flights_data,
-                      file_path):
+
+def export_to_csv(file_path, aircraft_queryset=None, flight_queryset=None, user_id=None):
     """
-    Write aircraft and flight data to a CSV file.
+    Export data from the database to a CSV file.
 
-    This function takes the data prepared by prepare_logbook_data_to_csv and
-    writes it to a CSV file.
+    Each row is written as soon as it is converted, see iter_logbook_csv_rows.
 
-    :param aircraft_heads: a list of strings, which are the headers for the aircraft CSV file
-    :param fields_aircraft_data: a list of dictionaries, where each dictionary represents a row in the aircraft CSV file
-    :param flights_heads: a list of strings, which are the headers for the flights CSV file
-    :param fields_flights_data: a list of dictionaries, where each dictionary represents a row in the flights CSV file
     :param file_path: the file path to write the data to
+    :param aircraft_queryset: a queryset of Aircraft, defaults to all of them
+    :param flight_queryset: a queryset of Flight, defaults to all of them
+    :param user_id: restrict the export to the logbook of a user
     """
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    directory = os.path.dirname(file_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
 
     try:
         with open(file_path, 'w', newline='') as csvfile:
             writer = csv.writer(csvfile, delimiter=',')
-            writer.writerow(['ForeFlight Logbook Import'])
-            writer.writerow([""])
-
-            writer.writerow(['Aircraft Table'])
-            write_csv_row(writer, aircraft_heads, fields_aircraft_data)
-
-            writer.writerow([""])
-            writer.writerow(['Flights Table'])
-            write_csv_row(writer, flights_heads, fields_flights_data)
+            writer.writerows(iter_logbook_csv_rows(aircraft_queryset, flight_queryset, user_id))
 
         logger.info(f"CSV export complete: {file_path}")
     except (OSError, IOError) as e:
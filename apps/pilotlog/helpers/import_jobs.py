@@ -0,0 +1,151 @@
+import logging
+import os
+
+from django.db import connection, transaction
+from django.utils import timezone
+from pilotlog.models.import_job import ImportJob
+
+from .dead_letters import DeadLetters
+from .import_export import ImportPipeline, refresh_imported_data
+from .json_stream import RejectFile, iter_offset_records
+from apexive.settings import IMPORT_JOB_CHUNK_SIZE
+
+'''
+    Resumable import jobs.
+    A job streams its file with iter_offset_records into an incremental
+    ImportPipeline, and records a checkpoint in the database after every
+    chunk of records: the batches still open are flushed, then the derived
+    data is refreshed and the offset of the first record not committed yet is
+    saved with the counters, in one transaction. Batches commit on their own
+    as they fill up, so records may be committed after the last checkpoint of
+    a job: a resumed job starts reading from that offset, and since the import
+    is incremental, those records are skipped as unchanged and only their
+    derived data is refreshed again.
+'''
+
+logger = logging.getLogger(__name__)
+
+
+class JobLost(Exception):
+    """
+    The job was taken over by another worker, e.g. after a missed heartbeat.
+    """
+
+
+def create_import_job(file_path, backend=None):
+    """
+    Queue the import of a JSON file.
+
+    :param file_path: the file path to load the data from
+    :param backend: the name of the insert backend, defaults to the
+        IMPORT_INSERT_BACKEND setting
+    :return: the queued ImportJob
+    """
+    file_path = os.path.abspath(file_path)
+    return ImportJob.objects.create(file_path=file_path, size=os.path.getsize(file_path),
+                                    backend=backend or '')
+
+
+def save_checkpoint(job, pipeline, fed, next_offset):
+    """
+    Commit everything fed to the pipeline and record the checkpoint of a job.
+
+    The batches are flushed first, each one committing on its own; the
+    derived data is then refreshed and the checkpoint saved in one
+    transaction.
+
+    :param job: the running ImportJob
+    :param pipeline: the ImportPipeline of the job
+    :param fed: a dictionary of the records fed since the last checkpoint,
+        id(record) -> (byte offset, record); the records still waiting for
+        their Aircraft are kept in it
+    :param next_offset: the byte offset of the next record to read
+    :raises JobLost: if the job is not running on this worker anymore
+    """
+    pipeline.flush()
+    waiting = {id(d) for flights in pipeline.pending_flights.values() for d in flights}
+    committed = len(fed) - len(waiting)
+    for key in [key for key in fed if key not in waiting]:
+        del fed[key]
+
+    tables = dict(job.tables)
+    for table, rows in pipeline.table_records.items():
+        tables[table] = tables.get(table, 0) + rows
+    changes = {
+        # Waiting Flights are read again on resume
+        'offset': min((offset for offset, _ in fed.values()), default=next_offset),
+        'records': job.records + committed,
+        'tables': tables,
+        'errors': job.errors + pipeline.dead_letters.count + pipeline.stats.pop('rejected', 0),
+        'heartbeat_at': timezone.now(),
+    }
+    pipeline.dead_letters.flush()
+    with transaction.atomic():
+        refresh_imported_data(pipeline)
+        updated = ImportJob.objects.filter(
+            pk=job.pk, status=ImportJob.RUNNING, worker=job.worker
+        ).update(**changes)
+        if not updated:
+            raise JobLost(f"Import job {job.pk} is not running on {job.worker} anymore")
+
+    for name, value in changes.items():
+        setattr(job, name, value)
+    pipeline.table_records.clear()
+    pipeline.dead_letters.clear()
+    pipeline.user_ids.clear()
+    pipeline.flight_months.clear()
+    pipeline.flight_aircraft.clear()
+
+
+def run_import_job(job, chunk_size=IMPORT_JOB_CHUNK_SIZE):
+    """
+    Run a claimed import job from its last checkpoint to the end of its file.
+
+    :param job: the ImportJob, claimed by this worker
+    :param chunk_size: the number of records read between two checkpoints
+    :return: the job, done or failed
+    """
+    logger.info(f"Running import job {job.pk} from byte {job.offset} of {job.file_path}")
+    # A resumed job replays records that its previous worker may have written
+    # after the checkpoint without refreshing their flight totals
+    dead_letters = DeadLetters(job.dead_letter_path, mode='a')
+    pipeline = ImportPipeline(backend=job.backend or None, incremental=True,
+                              refresh_unchanged=job.attempts > 1, dead_letters=dead_letters)
+    fed = {}
+    read = 0
+
+    def reject(offset, fragment, error):
+        """
+        Write a broken record to the reject file, counting it as an error.
+        """
+        rejects(offset, fragment, error)
+        pipeline.stats['rejected'] += 1
+
+    try:
+        # A resumed job appends to the files of its previous workers
+        with RejectFile(job.reject_path, mode='a') as rejects, dead_letters, \
+                connection.execute_wrapper(pipeline.count_query):
+            for offset, record in iter_offset_records(job.file_path, start_offset=job.offset,
+                                                      on_reject=reject):
+                if read >= chunk_size:
+                    save_checkpoint(job, pipeline, fed, offset)
+                    read = 0
+                fed[id(record)] = (offset, record)
+                read += 1
+                pipeline.feed(record)
+            pipeline.finish()
+            save_checkpoint(job, pipeline, fed, job.size)
+    except JobLost as e:
+        logger.warning(str(e))
+        return job
+    except Exception as e:
+        logger.exception(f"Import job {job.pk} failed")
+        job.status, job.message = ImportJob.FAILED, f"{type(e).__name__}: {e}"
+    else:
+        job.status = ImportJob.DONE
+    job.finished_at = timezone.now()
+    ImportJob.objects.filter(pk=job.pk, worker=job.worker).update(
+        status=job.status, message=job.message, finished_at=job.finished_at,
+    )
+    logger.info(f"Import job {job.pk} {job.status}: {job.records} records, {job.errors} errors")
+    return job
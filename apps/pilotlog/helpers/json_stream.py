@@ -0,0 +1,273 @@
+import io
+import json
+import logging
+import re
+
+'''
+    Incremental reader for JSON logbook exports.
+    The export is a single top-level array of records; instead of loading the
+    whole file, the array is parsed one record at a time so memory stays bounded
+    by the size of a single record and the read buffer.
+    A broken record only costs that record: the reader resynchronizes at the
+    start of the next record and hands the broken fragment, with its byte
+    offset, to a reject callback such as RejectFile.
+'''
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK_SIZE = 1024 * 1024
+# Size in characters above which an incomplete record is rejected instead of
+# buffering the rest of the file, e.g. when its closing brace is missing
+MAX_RECORD_SIZE = 16 * 1024 * 1024
+
+_SEPARATORS = re.compile(r'[\s,]*')
+_WHITESPACE = re.compile(r'\s*')
+_STRUCTURAL = re.compile(r'[{}"\\]')
+# Opening brace of a record following the end of the previous one or the start of the array
+_RESYNC = re.compile(r'[\[\],}]\s*(\{)')
+_decoder = json.JSONDecoder()
+
+
+def _byte_len(text):
+    """
+    Return the size of a piece of text once encoded as UTF-8.
+
+    :param text: the text to measure
+    :return: the number of bytes the text takes in the file
+    """
+    return len(text) if text.isascii() else len(text.encode('utf-8'))
+
+
+def _find_object_end(text, start):
+    """
+    Find the end of the JSON object starting at text[start].
+
+    Braces inside strings are ignored. Strings delimited by escaped quotes
+    (\\") are also recognised, so exports with escaped quotes can still be
+    split into records before they are decoded.
+
+    :param text: the buffered text
+    :param start: the index of the opening brace
+    :return: the index just after the closing brace, or None if the object
+        is not complete in the buffer
+    """
+    depth = 0
+    quote = None
+    i = start
+    n = len(text)
+    while True:
+        match = _STRUCTURAL.search(text, i)
+        if match is None:
+            return None
+        i = match.start()
+        char = text[i]
+        if char == '\\':
+            if i + 1 >= n:
+                return None
+            if text[i + 1] == '"':
+                if quote is None:
+                    quote = '\\"'
+                elif quote == '\\"':
+                    quote = None
+            i += 2
+            continue
+        if quote is not None:
+            if char == '"' and quote == '"':
+                quote = None
+        elif char == '"':
+            quote = '"'
+        elif char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+
+
+def _resync(text, start, end=None):
+    """
+    Find where the next record may start after a broken one.
+
+    :param text: the buffered text
+    :param start: the index of the opening brace of the broken record
+    :param end: the index where the broken record seems to end, if known
+    :return: the index of the next opening brace following a record
+        separator, or end (the end of the buffer if unknown) if there is none
+    """
+    end = len(text) if end is None else end
+    match = _RESYNC.search(text, start + 1, end)
+    return end if match is None else match.start(1)
+
+
+class RejectFile:
+    """
+    Reject callback writing the fragments that could not be decoded to an
+    NDJSON file, one {"offset", "size", "error", "fragment"} object per line,
+    where offset and size are in bytes of the source file. The file is only
+    created once a fragment is rejected.
+    """
+
+    def __init__(self, path, mode='w'):
+        self.path = path
+        self.mode = mode
+        self.file = None
+        self.count = 0
+
+    def __call__(self, offset, fragment, error):
+        if self.file is None:
+            # Line buffered, so the rejects survive a killed import job
+            self.file = open(self.path, self.mode, encoding='utf-8', buffering=1)
+        self.file.write(json.dumps({'offset': offset, 'size': _byte_len(fragment), 'error': error,
+                                    'fragment': fragment}) + '\n')
+        self.count += 1
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def decode_record(fragment):
+    """
+    Decode a single record, falling back to unescaping double quotes.
+
+    :param fragment: the JSON text of one record
+    :return: the decoded record
+    :raises json.JSONDecodeError: if the fragment is not valid JSON, even
+        after removing the escaped double quotes
+    """
+    try:
+        return json.loads(fragment)
+    except json.JSONDecodeError:
+        # Remove double quotes
+        return json.loads(fragment.replace('\\"', '"'))
+
+
+def iter_offset_records(file_path, start_offset=0, chunk_size=READ_CHUNK_SIZE,
+                        max_record_size=MAX_RECORD_SIZE, on_reject=None):
+    """
+    Iterate over the records of a JSON array file without loading it whole.
+
+    Records are decoded one at a time. Separators between records are
+    skipped, so stray commas do not break the import, and a closing bracket
+    only ends the array when nothing but whitespace follows it. Records that cannot be
+    decoded are logged and skipped: reading resumes at the next opening
+    brace following a record separator, so a truncated record does not
+    swallow the records after it.
+
+    :param file_path: the file path to load the data from
+    :param start_offset: the byte offset to start reading from, it must point
+        to the start of the file or between two records
+    :param chunk_size: the number of characters read from the file at a time
+    :param max_record_size: the size in characters above which an incomplete
+        record is rejected
+    :param on_reject: called with the byte offset, the text and the error of
+        every skipped fragment
+    :return: a generator of (byte offset, record) tuples
+    """
+    with open(file_path, 'rb') as raw:
+        raw.seek(start_offset)
+        f = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+        buffer = ''
+        pos = 0
+        offset = start_offset
+        eof = False
+        array_started = start_offset > 0
+
+        def reject(end, error):
+            """
+            Skip the text up to end, reporting it as rejected.
+            """
+            nonlocal pos, offset
+            fragment = buffer[pos:end]
+            logger.error(f"Skipping {error} at byte {offset}: {fragment[:80]!r}")
+            if on_reject is not None:
+                on_reject(offset, fragment, error)
+            offset += _byte_len(fragment)
+            pos = end
+
+        def read_more():
+            """
+            Drop the consumed text from the buffer and read the next chunk.
+            """
+            nonlocal buffer, pos, eof
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+
+        while True:
+            end = _SEPARATORS.match(buffer, pos).end()
+            offset += _byte_len(buffer[pos:end])
+            pos = end
+            if pos == len(buffer):
+                if eof:
+                    break
+                read_more()
+                continue
+
+            char = buffer[pos]
+            if char == '[' and not array_started:
+                array_started = True
+                offset += 1
+                pos += 1
+                continue
+            if char == ']':
+                # The end of the array, unless more than whitespace follows
+                end = _WHITESPACE.match(buffer, pos + 1).end()
+                if end == len(buffer):
+                    if eof:
+                        break
+                    read_more()
+                    continue
+            if char != '{':
+                # Skip anything that cannot start a record
+                end = buffer.find('{', pos)
+                reject(len(buffer) if end == -1 else end, 'unexpected data')
+                continue
+
+            try:
+                record, end = _decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                end = _find_object_end(buffer, pos)
+                if end is None and not eof and len(buffer) - pos <= max_record_size:
+                    # The record continues in the next chunk
+                    read_more()
+                    continue
+                record = None
+                if end is None:
+                    error = 'incomplete record' if eof else f'record larger than {max_record_size} characters'
+                else:
+                    try:
+                        record = decode_record(buffer[pos:end])
+                    except json.JSONDecodeError as e:
+                        error = f'invalid record ({e})'
+                if record is None:
+                    # Resynchronize at the next record
+                    reject(_resync(buffer, pos, end), error)
+                    continue
+
+            yield offset, record
+            offset += _byte_len(buffer[pos:end])
+            pos = end
+
+
+def iter_records(file_path, chunk_size=READ_CHUNK_SIZE, on_reject=None):
+    """
+    Iterate over the records of a JSON array file without loading it whole.
+
+    :param file_path: the file path to load the data from
+    :param chunk_size: the number of characters read from the file at a time
+    :param on_reject: called with the byte offset, the text and the error of
+        every skipped fragment
+    :return: a generator of records
+    """
+    for _, record in iter_offset_records(file_path, chunk_size=chunk_size, on_reject=on_reject):
+        yield record
@@ -0,0 +1,488 @@
+import io
+import json
+import logging
+
+from django.db import connections, models, router, transaction
+from django_bulk_load import bulk_insert_models, bulk_upsert_models
+from psycopg2 import sql
+from psycopg2.extras import Json
+
+from apexive.settings import BULK_INSERT_CHUNK_SIZE, COPY_INSERT_CHUNK_SIZE, IMPORT_INSERT_BACKEND
+
+'''
+    Insert backends used by the import.
+    Every backend inserts a batch of model instances of the same model, either
+    ignoring the rows that conflict with existing ones or failing on them, and
+    upserts batches matched on a list of key fields.
+    Backends with row_path also insert and upsert batches of raw rows, tuples
+    of database values built by a RowLayout without instantiating the model.
+    Upserts only overwrite the upsert_fields of the existing rows.
+'''
+
+logger = logging.getLogger(__name__)
+
+
+def copy_fields(model_meta):
+    """
+    Return the fields of a model written by the insert backends.
+
+    :param model_meta: the _meta options of the model
+    :return: the list of concrete fields, without auto fields
+    """
+    return [
+        field for field in model_meta.concrete_fields
+        if not isinstance(field, models.AutoField)
+    ]
+
+
+def upsert_fields(model_meta):
+    """
+    Return the fields of a model overwritten when an upsert updates a row.
+
+    Fields that are not editable, other than the primary key, are derived
+    from other tables (e.g. the flight counters of an Aircraft) and keep
+    their stored value.
+
+    :param model_meta: the _meta options of the model
+    :return: the list of copy fields updated by the upserts
+    """
+    return [field for field in copy_fields(model_meta) if field.editable or field.primary_key]
+
+
+class RowLayout:
+    """
+    Precomputed column order of a model, turning records into raw rows.
+
+    A row is a tuple with the database value of every copy field of the
+    model, in order. Record keys are converted by their field, hot meta keys
+    are read from the meta like BaseModel.sync_hot_meta, the meta is
+    serialized to JSON text once, and the other fields take their default.
+    """
+
+    def __init__(self, model_class):
+        self.model_class = model_class
+        self.db_name = router.db_for_write(model_class)
+        self.connection = connections[self.db_name]
+        self.fields = copy_fields(model_class._meta)
+        self.index = {field.attname: i for i, field in enumerate(self.fields)}
+        hot_meta = getattr(model_class, 'hot_meta', {})
+        # Keys a record may have, as accepted by the model constructor
+        self.record_keys = {field.attname for field in self.fields} | {field.name for field in self.fields}
+        # (field, hot meta key, default database value) of every column
+        self.sources = [
+            (field, hot_meta.get(field.name), field.get_db_prep_save(field.get_default(), self.connection))
+            for field in self.fields
+        ]
+
+    def row(self, d, **values):
+        """
+        Build the row of a record.
+
+        :param d: a dictionary representing the record
+        :param values: values of fields that are not in the record, by attname
+        :return: the tuple of database values
+        :raises TypeError: if the record has keys that are not fields
+        :raises Exception: if a value cannot be converted by its field
+        """
+        if not d.keys() <= self.record_keys:
+            unexpected = ', '.join(sorted(d.keys() - self.record_keys))
+            raise TypeError(f"{self.model_class.__name__}() got unexpected keyword arguments: {unexpected}")
+        meta = d['meta']
+        row = []
+        for field, hot_key, default in self.sources:
+            if field.attname == 'meta':
+                row.append(json.dumps(meta))
+            elif hot_key is not None:
+                value = self.model_class.hot_meta_value(field, meta.get(hot_key))
+                row.append(field.get_db_prep_save(value, self.connection))
+            elif field.attname in values:
+                row.append(field.get_db_prep_save(values[field.attname], self.connection))
+            elif field.attname in d:
+                row.append(field.get_db_prep_save(d[field.attname], self.connection))
+            else:
+                row.append(default)
+        return tuple(row)
+
+    def value(self, row, attname):
+        """
+        Read the Python value of a field from a row.
+
+        :param row: the tuple of database values
+        :param attname: the attname of the field
+        :return: the value converted by the field
+        """
+        i = self.index[attname]
+        return self.fields[i].to_python(row[i])
+
+
+class BulkLoadBackend:
+    """
+    Insert through django_bulk_load, which copies every batch into a new
+    temporary table and inserts it from there. It needs model instances.
+    """
+    name = 'bulk_load'
+    chunk_size = BULK_INSERT_CHUNK_SIZE
+    row_path = False
+
+    def insert(self, objects, ignore_conflicts):
+        """
+        Insert a batch of model instances.
+
+        :param objects: the list of model instances to insert
+        :param ignore_conflicts: skip the rows conflicting with existing ones
+            instead of failing
+        """
+        bulk_insert_models(models=objects, ignore_conflicts=ignore_conflicts)
+
+    def upsert(self, objects, key_fields):
+        """
+        Update the existing rows of a batch and insert the new ones.
+
+        :param objects: the list of model instances to upsert
+        :param key_fields: the names of the fields matching existing rows
+        """
+        model_meta = objects[0]._meta
+        updated = set(upsert_fields(model_meta))
+        bulk_upsert_models(models=objects, pk_field_names=key_fields, insert_only_field_names=[
+            field.name for field in copy_fields(model_meta) if field not in updated
+        ])
+
+
+class OrmBackend:
+    """
+    Insert through the Django ORM with bulk_create, for databases other than
+    PostgreSQL such as SQLite. Raw rows are inserted with executemany.
+    """
+    name = 'orm'
+    chunk_size = BULK_INSERT_CHUNK_SIZE
+    row_path = True
+
+    def insert(self, objects, ignore_conflicts):
+        """
+        Insert a batch of model instances.
+
+        :param objects: the list of model instances to insert
+        :param ignore_conflicts: skip the rows conflicting with existing ones
+            instead of failing
+        """
+        model_class = objects[0].__class__
+        with transaction.atomic(using=router.db_for_write(model_class)):
+            model_class.objects.bulk_create(objects, ignore_conflicts=ignore_conflicts)
+
+    def upsert(self, objects, key_fields):
+        """
+        Update the existing rows of a batch and insert the new ones.
+
+        :param objects: the list of model instances to upsert
+        :param key_fields: the names of the fields matching existing rows
+        """
+        model_class = objects[0].__class__
+        model_meta = model_class._meta
+        key_columns = [model_meta.get_field(name) for name in key_fields]
+        # Keys as the database returns them, e.g. UUID objects instead of strings
+        keys = [tuple(field.to_python(getattr(obj, field.attname)) for field in key_columns) for obj in objects]
+        existing = model_class.objects.filter(**{
+            f'{name}__in': {key[i] for key in keys} for i, name in enumerate(key_fields)
+        }).values_list(*key_fields, 'pk')
+        pks = {tuple(row[:-1]): row[-1] for row in existing}
+
+        changed, new = [], []
+        for obj, key in zip(objects, keys):
+            pk = pks.get(key)
+            if pk is None:
+                new.append(obj)
+            else:
+                obj.pk = pk
+                changed.append(obj)
+
+        fields = [field.name for field in upsert_fields(model_meta) if not field.primary_key]
+        with transaction.atomic(using=router.db_for_write(model_class)):
+            if changed:
+                model_class.objects.bulk_update(changed, fields)
+            if new:
+                model_class.objects.bulk_create(new)
+
+    def insert_rows(self, layout, rows, ignore_conflicts):
+        """
+        Insert a batch of raw rows.
+
+        :param layout: the RowLayout of the rows
+        :param rows: the list of rows to insert
+        :param ignore_conflicts: skip the rows conflicting with existing ones
+            instead of failing
+        """
+        with transaction.atomic(using=layout.db_name), layout.connection.cursor() as cursor:
+            cursor.executemany(self.insert_query(layout, ignore_conflicts), rows)
+
+    def upsert_rows(self, layout, rows, key_fields):
+        """
+        Update the existing rows of a batch and insert the new ones.
+
+        :param layout: the RowLayout of the rows
+        :param rows: the list of rows to upsert
+        :param key_fields: the names of the fields matching existing rows
+        """
+        keys = [tuple(layout.value(row, name) for name in key_fields) for row in rows]
+        existing = set(layout.model_class.objects.using(layout.db_name).filter(**{
+            f'{name}__in': {key[i] for key in keys} for i, name in enumerate(key_fields)
+        }).values_list(*key_fields))
+
+        quote = layout.connection.ops.quote_name
+        key_indexes = [layout.index[name] for name in key_fields]
+        set_indexes = [layout.index[field.attname] for field in upsert_fields(layout.model_class._meta)
+                       if layout.index[field.attname] not in key_indexes]
+        update = 'UPDATE {} SET {} WHERE {}'.format(
+            quote(layout.model_class._meta.db_table),
+            ', '.join(f'{quote(layout.fields[i].column)} = %s' for i in set_indexes),
+            ' AND '.join(f'{quote(layout.fields[i].column)} = %s' for i in key_indexes),
+        )
+        changed = [[row[i] for i in set_indexes + key_indexes] for row, key in zip(rows, keys) if key in existing]
+        new = [row for row, key in zip(rows, keys) if key not in existing]
+        with transaction.atomic(using=layout.db_name), layout.connection.cursor() as cursor:
+            if changed:
+                cursor.executemany(update, changed)
+            if new:
+                cursor.executemany(self.insert_query(layout, ignore_conflicts=False), new)
+
+    def insert_query(self, layout, ignore_conflicts):
+        """
+        Return the INSERT query of the raw rows of a layout.
+
+        :param layout: the RowLayout of the rows
+        :param ignore_conflicts: skip the rows conflicting with existing ones
+        :return: the query, with one placeholder per column
+        """
+        quote = layout.connection.ops.quote_name
+        query = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            quote(layout.model_class._meta.db_table),
+            ', '.join(quote(field.column) for field in layout.fields),
+            ', '.join(['%s'] * len(layout.fields)),
+        )
+        return query + ' ON CONFLICT DO NOTHING' if ignore_conflicts else query
+
+
+class RowStream(io.RawIOBase):
+    """
+    Read-only file object over an iterator of encoded lines, so COPY can
+    consume the rows as they are generated instead of from a full buffer.
+    """
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.pending = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.pending:
+            try:
+                self.pending = next(self.lines)
+            except StopIteration:
+                return 0
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+
+def copy_text(value):
+    """
+    Format a database value for the COPY text format.
+
+    :param value: the value prepared for the database
+    :return: the escaped text of the value
+    """
+    if value is None:
+        return '\\N'
+    if isinstance(value, Json):
+        value = value.dumps(value.adapted)
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+class CopyBackend:
+    """
+    Stream the rows through COPY into a staging table and merge them into the
+    real table with a single INSERT ... SELECT.
+
+    The staging table is a temporary table kept for the whole session and
+    truncated for every batch, and rows are encoded while COPY reads them, so
+    batches can be much larger than with bulk_load. Conflicting rows are
+    skipped with ON CONFLICT DO NOTHING, except when conflicts must fail.
+    Upserts update the matching rows from the staging table and insert the
+    others, so they do not need a unique constraint on the key fields.
+    """
+    name = 'copy'
+    chunk_size = COPY_INSERT_CHUNK_SIZE
+    row_path = True
+
+    def insert(self, objects, ignore_conflicts):
+        """
+        Insert a batch of model instances.
+
+        :param objects: the list of model instances to insert
+        :param ignore_conflicts: skip the rows conflicting with existing ones
+            instead of failing
+        """
+        model_meta = objects[0]._meta
+        self.load(model_meta, self.object_lines(objects), self.insert_queries(model_meta, ignore_conflicts))
+
+    def upsert(self, objects, key_fields):
+        """
+        Update the existing rows of a batch and insert the new ones.
+
+        :param objects: the list of model instances to upsert
+        :param key_fields: the names of the fields matching existing rows
+        """
+        model_meta = objects[0]._meta
+        self.load(model_meta, self.object_lines(objects), self.upsert_queries(model_meta, key_fields))
+
+    def insert_rows(self, layout, rows, ignore_conflicts):
+        """
+        Insert a batch of raw rows.
+
+        :param layout: the RowLayout of the rows
+        :param rows: the list of rows to insert
+        :param ignore_conflicts: skip the rows conflicting with existing ones
+            instead of failing
+        """
+        model_meta = layout.model_class._meta
+        self.load(model_meta, self.row_lines(rows), self.insert_queries(model_meta, ignore_conflicts))
+
+    def upsert_rows(self, layout, rows, key_fields):
+        """
+        Update the existing rows of a batch and insert the new ones.
+
+        :param layout: the RowLayout of the rows
+        :param rows: the list of rows to upsert
+        :param key_fields: the names of the fields matching existing rows
+        """
+        model_meta = layout.model_class._meta
+        self.load(model_meta, self.row_lines(rows), self.upsert_queries(model_meta, key_fields))
+
+    def insert_queries(self, model_meta, ignore_conflicts):
+        """
+        Return the query merging the staging table with an insert.
+
+        :param model_meta: the _meta options of the model
+        :param ignore_conflicts: skip the rows conflicting with existing ones
+        :return: the list of merge queries
+        """
+        merge = sql.SQL('INSERT INTO {table} ({columns}) SELECT {columns} FROM {staging}').format(
+            **self.names(model_meta))
+        if ignore_conflicts:
+            merge += sql.SQL(' ON CONFLICT DO NOTHING')
+        return [merge]
+
+    def upsert_queries(self, model_meta, key_fields):
+        """
+        Return the queries merging the staging table with an upsert.
+
+        :param model_meta: the _meta options of the model
+        :param key_fields: the names of the fields matching existing rows
+        :return: the list of merge queries, the update then the insert
+        """
+        names = self.names(model_meta)
+        match = sql.SQL(' AND ').join(
+            sql.SQL('t.{column} = s.{column}').format(column=sql.Identifier(model_meta.get_field(name).column))
+            for name in key_fields
+        )
+        updated = upsert_fields(model_meta)
+        update = sql.SQL('UPDATE {table} t SET ({updated}) = ROW({staged}) FROM {staging} s WHERE ').format(
+            updated=sql.SQL(', ').join(sql.Identifier(field.column) for field in updated),
+            staged=sql.SQL(', ').join(
+                sql.SQL('s.{column}').format(column=sql.Identifier(field.column))
+                for field in updated
+            ),
+            **names,
+        ) + match
+        insert = sql.SQL(
+            'INSERT INTO {table} ({columns}) SELECT {columns} FROM {staging} s '
+            'WHERE NOT EXISTS (SELECT 1 FROM {table} t WHERE '
+        ).format(**names) + match + sql.SQL(')')
+        return [update, insert]
+
+    def names(self, model_meta):
+        """
+        Return the SQL names used to load a model through the staging table.
+
+        :param model_meta: the _meta options of the model
+        :return: a dictionary with the table, staging and columns names
+        """
+        return {
+            'table': sql.Identifier(model_meta.db_table),
+            'staging': sql.Identifier(f'{model_meta.db_table}_staging'),
+            'columns': sql.SQL(', ').join(
+                sql.Identifier(field.column) for field in copy_fields(model_meta)
+            ),
+        }
+
+    def object_lines(self, objects):
+        """
+        Encode model instances as lines of the COPY text format.
+
+        :param objects: the list of model instances
+        :return: a generator of encoded lines
+        """
+        connection = connections[router.db_for_write(objects[0].__class__)]
+        fields = copy_fields(objects[0]._meta)
+        for obj in objects:
+            values = (field.get_db_prep_save(field.pre_save(obj, True), connection) for field in fields)
+            yield ('\t'.join(copy_text(value) for value in values) + '\n').encode('utf-8')
+
+    def row_lines(self, rows):
+        """
+        Encode raw rows as lines of the COPY text format.
+
+        :param rows: the list of rows
+        :return: a generator of encoded lines
+        """
+        for row in rows:
+            yield ('\t'.join(copy_text(value) for value in row) + '\n').encode('utf-8')
+
+    def load(self, model_meta, lines, queries):
+        """
+        COPY encoded lines into the staging table of a model and merge it.
+
+        The merge queries run in the same transaction as the COPY.
+
+        :param model_meta: the _meta options of the model
+        :param lines: an iterator of encoded lines, in the order of copy_fields
+        :param queries: the list of queries merging the staging table
+        """
+        names = self.names(model_meta)
+        db_name = router.db_for_write(model_meta.model)
+        connection = connections[db_name]
+        with transaction.atomic(using=db_name), connection.cursor() as cursor:
+            cursor.execute(sql.SQL(
+                'CREATE TEMPORARY TABLE IF NOT EXISTS {staging} AS '
+                'SELECT {columns} FROM {table} WITH NO DATA'
+            ).format(**names))
+            cursor.execute(sql.SQL('TRUNCATE {staging}').format(**names))
+            cursor.copy_expert(sql.SQL('COPY {staging} ({columns}) FROM STDIN').format(**names),
+                               RowStream(lines))
+            for query in queries:
+                cursor.execute(query)
+
+
+# Backend name -> insert backend class
+INSERT_BACKENDS = {
+    BulkLoadBackend.name: BulkLoadBackend,
+    CopyBackend.name: CopyBackend,
+    OrmBackend.name: OrmBackend,
+}
+
+
+def get_insert_backend(name=None):
+    """
+    Create the insert backend with the given name.
+
+    :param name: the name of the backend, defaults to IMPORT_INSERT_BACKEND
+    :return: a new insert backend
+    :raises ValueError: if there is no backend with that name
+    """
+    name = name or IMPORT_INSERT_BACKEND
+    if name not in INSERT_BACKENDS:
+        raise ValueError(f"Unknown insert backend: {name}")
+    return INSERT_BACKENDS[name]()
@@ -1,3 +1,8 @@
+from functools import lru_cache
+
+from .utils import compile_row_converter, row_converter
+
+
 def get_aircraft_mapping() -> (list, list):
     """
     Returns the mapping between the aircraft heads and the column names in the
@@ -111,4 +116,25 @@ def get_flights_mapping():
         '[Hours]CustomFieldName': '[Hours]CustomFieldName'
     }
     assert len(flights_heads) == len(flight_mapping)
-    return flights_heads, flight_mapping
\ No newline at end of file
+    return flights_heads, flight_mapping
+
+
+@lru_cache(maxsize=None)
+def get_aircraft_row_converter():
+    """
+    Returns the compiled converter of the aircraft CSV rows, built once.
+    """
+    aircraft_heads, aircraft_mapping = get_aircraft_mapping()
+    return compile_row_converter(aircraft_heads, aircraft_mapping.values())
+
+
+@lru_cache(maxsize=None)
+def get_flights_row_converter():
+    """
+    Returns the converter of the flight CSV rows, built once.
+
+    Most flight columns are converted, so the converters take most of the
+    time and a compiled row is barely faster (see benchmarks/convert_rows.py).
+    """
+    flights_heads, flights_mapping = get_flights_mapping()
+    return row_converter(flights_heads, flights_mapping.values())
@@ -0,0 +1,217 @@
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import ExitStack
+
+'''
+    Parallel import of logbook records.
+    Records are sharded by table and user_id and every full shard batch is
+    imported by one of a set of worker processes, each one with its own
+    database connection.
+    This module does not import the models at load time, so the worker entry
+    points can be loaded by a freshly started process before Django is set up.
+'''
+
+logger = logging.getLogger(__name__)
+
+
+def init_worker():
+    """
+    Prepare a worker process to use the database.
+
+    Django is set up when the process was spawned instead of forked; the
+    database connection is opened lazily by the first query of the worker.
+    """
+    import django
+    django.setup()
+
+
+def import_shard(records, batch_size, backend, incremental, dead_letter_path, validate):
+    """
+    Import a batch of records of a single shard in a worker process.
+
+    Failed records are appended to a dead-letter file of the worker process,
+    next to dead_letter_path, and moved to it once the import is over.
+
+    :param records: a list of dictionaries representing the records
+    :param batch_size: the number of records per bulk insert
+    :param backend: the name of the insert backend
+    :param incremental: skip unchanged records and upsert the newer ones
+    :param dead_letter_path: the path of the dead-letter file of the import
+    :param validate: build and check model instances instead of raw rows
+    :return: a tuple with the import statistics, the dead-letter counters
+        and file, the changed months of the flight totals and the changed
+        Aircraft
+    """
+    from .dead_letters import DeadLetters
+    from .import_export import ImportPipeline
+
+    part_path = f'{dead_letter_path}.{os.getpid()}' if dead_letter_path else None
+    with DeadLetters(part_path, mode='a') as dead_letters:
+        pipeline = ImportPipeline(batch_size, backend, incremental, dead_letters=dead_letters,
+                                  validate=validate).run(records)
+    failed = (dead_letters.count, dead_letters.counts, dead_letters.sample, part_path)
+    return pipeline.stats, failed, pipeline.flight_months, pipeline.flight_aircraft
+
+
+class ParallelImport:
+    """
+    Import logbook records with a pool of worker processes.
+
+    Records are grouped in shards by table and user_id (modulo the number of
+    workers, so batches stay full even with many small users). Every full shard
+    batch is sent to the worker of its user_id bucket, and each worker batches
+    and inserts it with an ImportPipeline. The batches of a bucket thus run one
+    after the other, in the order of the file: two batches holding the same
+    record never race, so the newest version of a record is always the one kept.
+    Flights depend on their Aircraft, so Flight batches are spooled to a
+    temporary file and only sent once every Aircraft batch has been committed.
+    """
+
+    def __init__(self, workers, batch_size=None, backend=None, incremental=False, dead_letters=None,
+                 validate=False):
+        from .dead_letters import DeadLetters
+        from .loaders import get_insert_backend
+
+        insert_backend = get_insert_backend(backend)
+        self.workers = workers
+        self.backend = insert_backend.name
+        self.batch_size = batch_size or insert_backend.chunk_size
+        self.incremental = incremental
+        self.validate = validate
+        self.dead_letters = DeadLetters() if dead_letters is None else dead_letters
+        # Dead-letter files of the worker processes
+        self.dead_letter_parts = set()
+        self.stats = Counter()
+        self.user_ids = set()
+        self.flight_months = set()
+        self.flight_aircraft = set()
+        self.shards = {}
+        self.aircraft_futures = []
+        self.futures = set()
+
+    def run(self, records):
+        """
+        Shard all the records, import them and wait for the workers.
+
+        :param records: an iterable of dictionaries representing the records
+        :return: the parallel import itself
+        """
+        from django.db import connections
+
+        # Workers must open their own connection instead of sharing this one
+        connections.close_all()
+        context = multiprocessing.get_context()
+        with ExitStack() as stack:
+            # One single-process executor per user_id bucket, running its batches in order
+            self.executors = [
+                stack.enter_context(ProcessPoolExecutor(1, mp_context=context, initializer=init_worker))
+                for _ in range(self.workers)
+            ]
+            self.flight_spool = flight_spool = stack.enter_context(tempfile.TemporaryFile('w+'))
+
+            for d in records:
+                try:
+                    self.add_record(d)
+                except Exception as e:
+                    logger.debug(f"Exception loading: {d} - {e}")
+                    self.stats['records'] += 1
+                    self.dead_letters.add(d.get('table'), d, e)
+
+            for key in list(self.shards):
+                self.flush_shard(key)
+
+            # Flights can only start once all the Aircraft are committed
+            for future in self.aircraft_futures:
+                self.collect(future)
+            self.futures.difference_update(self.aircraft_futures)
+
+            flight_spool.seek(0)
+            for line in flight_spool:
+                self.submit(json.loads(line))
+
+            while self.futures:
+                self.collect(self.futures.pop())
+
+        for path in sorted(self.dead_letter_parts):
+            self.dead_letters.append_file(path)
+        return self
+
+    def add_record(self, d):
+        """
+        Add a record to its shard, sending the shard once full.
+
+        :param d: a dictionary representing the record
+        """
+        self.user_ids.add(d['user_id'])
+        key = (d['table'], d['user_id'] % self.workers)
+        shard = self.shards.setdefault(key, [])
+        shard.append(d)
+        if len(shard) >= self.batch_size:
+            self.flush_shard(key)
+
+    def flush_shard(self, key):
+        """
+        Send the records of a shard to the pool, or spool them if they are Flights.
+
+        :param key: the (table, user_id bucket) key of the shard
+        """
+        records = self.shards.pop(key, None)
+        if not records:
+            return
+        if key[0] == 'Flight':
+            self.flight_spool.write(json.dumps(records) + '\n')
+            return
+
+        future = self.submit(records)
+        if key[0] == 'Aircraft':
+            self.aircraft_futures.append(future)
+
+    def submit(self, records):
+        """
+        Send a batch of records of a shard to the worker of its user_id
+        bucket, waiting while too many are queued.
+
+        :param records: a list of dictionaries representing the records
+        :return: the future of the batch
+        """
+        while len(self.futures) >= self.workers * 2:
+            done, _ = wait(self.futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                self.futures.discard(future)
+                if future not in self.aircraft_futures:
+                    self.collect(future)
+
+        executor = self.executors[records[0]['user_id'] % self.workers]
+        future = executor.submit(import_shard, records, self.batch_size, self.backend,
+                                 self.incremental, self.dead_letters.path, self.validate)
+        self.futures.add(future)
+        return future
+
+    def collect(self, future):
+        """
+        Wait for a batch and merge its statistics, failed records, changed
+        months of the flight totals and changed Aircraft.
+
+        :param future: the future of the batch
+        """
+        stats, (count, counts, sample, part_path), flight_months, flight_aircraft = future.result()
+        self.stats.update(stats)
+        self.dead_letters.merge(count, counts, sample)
+        if part_path:
+            self.dead_letter_parts.add(part_path)
+        self.flight_months.update(flight_months)
+        self.flight_aircraft.update(flight_aircraft)
+
+    def report(self):
+        """
+        Log the outcome of the import.
+        """
+        from .import_export import log_import_report
+
+        logger.info(f"Imported with {self.workers} workers.")
+        log_import_report(self.stats, self.dead_letters)
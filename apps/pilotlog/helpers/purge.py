@@ -0,0 +1,97 @@
+import logging
+from collections import Counter
+
+from django.db import models, transaction
+from pilotlog.models.aircraft import Aircraft
+from pilotlog.models.flight import Flight
+from pilotlog.models.flight_totals import FlightTotals
+from pilotlog.models.image_pic import ImagePic
+from pilotlog.models.limit_rules import LimitRules
+from pilotlog.models.my_query import MyQuery
+from pilotlog.models.my_query_build import MyQueryBuild
+from pilotlog.models.pilot import Pilot
+from pilotlog.models.qualification import Qualification
+from pilotlog.models.setting_config import SettingConfig
+
+from .cache import bump_generations
+from apexive.settings import PURGE_BATCH_SIZE
+
+'''
+    Purge of the logbook of a user.
+    The tables are emptied in dependency order with DELETE statements of at
+    most PURGE_BATCH_SIZE rows, so only primary keys are loaded and, outside a
+    transaction, every batch commits on its own and only holds its locks
+    briefly.
+'''
+
+logger = logging.getLogger(__name__)
+
+# Models no other table refers to, purged once the Flights and Aircraft are gone
+LOGBOOK_MODELS = [ImagePic, LimitRules, MyQuery, MyQueryBuild, Pilot, Qualification, SettingConfig]
+
+
+def delete_in_batches(queryset, batch_size=PURGE_BATCH_SIZE):
+    """
+    Delete the rows of a queryset, batch_size rows at a time.
+
+    The primary keys of a batch are selected, then the batch is deleted with
+    the plain QuerySet.delete: the deletes of the model querysets refreshing
+    derived data, e.g. FlightQuerySet.delete, are skipped. Rows no other table
+    refers to are deleted without being loaded; the others are only loaded
+    by primary key, to follow the cascades of their foreign keys.
+
+    :param queryset: the queryset of the rows to delete
+    :param batch_size: the number of rows deleted by a single statement
+    :return: the number of rows deleted
+    """
+    queryset = queryset.order_by()
+    label = queryset.model._meta.label
+    deleted = 0
+    while True:
+        pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if pks:
+            # DELETE ... WHERE <filters> AND pk IN (<batch>): the filters of the
+            # statement itself let a partitioned table only be read in the
+            # partitions they select
+            _, counts = models.QuerySet.delete(queryset.filter(pk__in=pks).only('pk'))
+            deleted += counts.get(label, 0)
+        if len(pks) < batch_size:
+            return deleted
+
+
+def purge_user(user_id, batch_size=PURGE_BATCH_SIZE):
+    """
+    Delete the logbook of a user from every table.
+
+    The flight totals and the Flights go first, then the Aircraft and the
+    other tables. Like the CASCADE of Flight.aircraft, the Flights of other
+    users flying an Aircraft of the user are deleted with it. The cached API
+    responses of the users whose data was deleted are invalidated once the
+    transaction, if any, commits.
+
+    :param user_id: the user_id of the logbook
+    :param batch_size: the number of rows deleted by a single statement
+    :return: a Counter of the rows deleted by model name
+    """
+    aircraft = Aircraft.objects.for_user(user_id).values('pk')
+    # Kept apart from the Flights of the user, which only read its partition
+    # when the table is partitioned by user_id
+    other_flights = Flight.objects.filter(aircraft__in=aircraft).exclude(user_id=user_id)
+    other_user_ids = set(other_flights.values_list('user_id', flat=True).distinct())
+    if other_user_ids:
+        logger.warning(f"Deleting the flights of users {sorted(other_user_ids)} on the Aircraft of {user_id}")
+
+    deleted = Counter()
+    deleted[FlightTotals.__name__] = delete_in_batches(FlightTotals.objects.for_user(user_id), batch_size)
+    deleted[Flight.__name__] = delete_in_batches(Flight.objects.for_user(user_id), batch_size)
+    if other_user_ids:
+        deleted[FlightTotals.__name__] += delete_in_batches(
+            FlightTotals.objects.filter(aircraft__in=aircraft), batch_size)
+        deleted[Flight.__name__] += delete_in_batches(other_flights, batch_size)
+    deleted[Aircraft.__name__] = delete_in_batches(Aircraft.objects.for_user(user_id), batch_size)
+    for model_class in LOGBOOK_MODELS:
+        deleted[model_class.__name__] = delete_in_batches(model_class.objects.filter(user_id=user_id), batch_size)
+
+    logger.info(f"Purged {sum(deleted.values())} rows of user {user_id}.")
+    transaction.on_commit(lambda: bump_generations({user_id, *other_user_ids}))
+    return deleted
@@ -1,6 +1,7 @@
 import logging
 import datetime
 import json
+import time
 from decimal import Decimal, InvalidOperation
 
 logger = logging.getLogger(__name__)
@@ -36,6 +37,103 @@ def timestamp_to_year(time_string):
         return None
 
 
+def to_year(value):
+    """
+    Converts a timestamp to a year, without building a datetime object.
+
+    Args:
+        value (object): a timestamp in seconds since the epoch
+
+    Returns:
+        int: the year of the timestamp, or None if the value is invalid.
+    """
+    try:
+        timestamp = float(value)
+        if timestamp >= 0:
+            return time.localtime(timestamp).tm_year
+    except (ValueError, TypeError, OverflowError, OSError):
+        pass
+    # Slow path, logging why the value is invalid
+    return timestamp_to_year(value)
+
+
+def to_boolean(value):
+    """
+    Converts a value to a boolean, represented as 'x' or ''.
+    """
+    return 'x' if value else ''
+
+
+def to_decimal(value):
+    """
+    Converts a value to a Decimal, or leaves it as is if it can't be converted.
+    """
+    if value == '' or value is None:
+        return value
+    try:
+        return Decimal(value)
+    except (ValueError, TypeError, InvalidOperation):
+        return value
+
+
+def to_number(value):
+    """
+    Converts a whole number to an int, or leaves it as is if it can't be converted.
+    """
+    if value == '' or value is None or isinstance(value, bool):
+        return value
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        return value
+
+
+def to_hhmm(value):
+    """
+    Converts a number of minutes since midnight to the hhmm format.
+
+    Empty values and values that are not positive whole numbers are left as is.
+    """
+    if isinstance(value, str) and value.isdigit():
+        value = int(value)
+    # type() rather than isinstance(), booleans are not minutes
+    if type(value) is not int or value < 0:
+        return value
+    return f'{value // 60:02d}{value % 60:02d}'
+
+
+def to_date(value):
+    """
+    Converts a timestamp to a YYYY-MM-DD date; dates as text are left as is.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0:
+        return datetime.date.fromtimestamp(value).isoformat()
+    return value
+
+
+def to_packed_detail(value):
+    """
+    Converts a list of details to the semicolon separated packed format.
+    """
+    if isinstance(value, (list, tuple)):
+        return ';'.join('' if detail is None else str(detail) for detail in value)
+    if isinstance(value, dict):
+        return to_packed_detail(tuple(value.values()))
+    return value
+
+
+# CSV head type -> converter, 'Text' values are written as they are
+TYPE_CONVERTERS = {
+    'YYYY': to_year,
+    'Boolean': to_boolean,
+    'Decimal': to_decimal,
+    'Number': to_number,
+    'hhmm': to_hhmm,
+    'Date': to_date,
+    'Packed Detail': to_packed_detail,
+}
+
+
 def convert_types(value, type_expected):
     """
     Converts a value to a specific type.
@@ -46,44 +144,100 @@ def convert_types(value, type_expected):
             - 'YYYY': converts a timestamp to a year
             - 'Boolean': converts the value to a boolean, represented as 'x' or ''
             - 'Decimal': converts the value to a Decimal, or leaves it as is if it can't be converted
+            - 'Number': converts the value to an int, or leaves it as is if it can't be converted
+            - 'hhmm': converts minutes since midnight to hhmm
+            - 'Date': converts a timestamp to YYYY-MM-DD
+            - 'Packed Detail': joins a list of details with semicolons
 
     Returns:
         object: the converted value
     """
-    if type_expected == 'YYYY':
-        value = timestamp_to_year(value)
-    elif type_expected == 'Boolean':
-        value = 'x' if value else ''
-    elif type_expected == 'Decimal':
-        try:
-            value = Decimal(value)
-        except (ValueError, InvalidOperation):
-            pass
-    return value
+    converter = TYPE_CONVERTERS.get(type_expected)
+    return value if converter is None else converter(value)
 
 
-def write_csv_row(writer, headers, data):
+def compile_row_converter(heads, fields):
     """
-    Utility function to write headers and corresponding data rows to CSV.
+    Compiles the conversion of a record meta into a CSV row.
+
+    The converter of every column is looked up once and a function building
+    the whole row in a single list display is generated, so converting a row
+    makes no type comparison and no call for the columns written as they are.
+    It pays off when most columns are written as they are; see row_converter
+    otherwise.
+
+    Args:
+        heads (list): the head type of every column
+        fields (iterable): the meta key of every column
+
+    Returns:
+        function: a function taking the meta dictionary of a record and
+            returning the list of converted values of the row
+    """
+    namespace = {}
+    cells = []
+    for i, (head, field) in enumerate(zip(heads, fields)):
+        cell = f"get({field!r}, '')"
+        converter = TYPE_CONVERTERS.get(head)
+        if converter is not None:
+            namespace[f'convert_{i}'] = converter
+            cell = f'convert_{i}({cell})'
+        cells.append(cell)
+
+    source = f"def convert_row(meta):\n    get = meta.get\n    return [{', '.join(cells)}]\n"
+    exec(source, namespace)
+    return namespace['convert_row']
+
+
+def row_converter(heads, fields):
+    """
+    Builds the conversion of a record meta into a CSV row with a plain loop.
+
+    The converter of every column is looked up once. When most columns are
+    converted, the converters take most of the time and this is about as fast
+    as compile_row_converter.
+
+    Args:
+        heads (list): the head type of every column
+        fields (iterable): the meta key of every column
+
+    Returns:
+        function: a function taking the meta dictionary of a record and
+            returning the list of converted values of the row
+    """
+    columns = [(field, TYPE_CONVERTERS.get(head)) for head, field in zip(heads, fields)]
+
+    def convert_row(meta):
+        get = meta.get
+        return [get(field, '') if converter is None else converter(get(field, '')) for field, converter in columns]
+
+    return convert_row
+
+
+def iter_csv_table(headers, names, rows):
+    """
+    Utility generator yielding a table of a CSV file, row by row.
+
+    Nothing is yielded when there are no rows.
 
     Args:
-        writer (csv.writer): a CSV writer object
         headers (list): a list of strings, which are the headers for the CSV file
-        data (list): a list of dictionaries, where each dictionary represents a row in the CSV file
+        names (list): a list of strings, which are the column names
+        rows (iterable): an iterable of lists, where each list represents a row in the CSV file
+
+    Yields:
+        list: the headers, the column names and then each data row
     """
-    if not data:
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
         logger.warning("No data to write.")
         return
 
-    # Write the headers
-    writer.writerow(headers)
-
-    # Write the header names
-    writer.writerow(key for key in data[0].keys())
-
-    # Write the data rows
-    for row in data:
-        writer.writerow(row.values())
+    yield headers
+    yield names
+    yield first
+    yield from rows
 
 
 def load_mappings(mapping_file):
@@ -0,0 +1,106 @@
+import json
+import os
+import platform
+import tempfile
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from apps.pilotlog.benchmarks.suite import bench_api, bench_export, bench_import, compare_results
+from apps.pilotlog.benchmarks.synthetic import generate_records, write_records
+from apps.pilotlog.helpers.loaders import INSERT_BACKENDS, get_insert_backend
+
+
+class Command(BaseCommand):
+    help = ("Benchmark the import, the export and the list endpoints on synthetic logbooks, "
+            "in a throwaway test database")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--records", type=int, nargs="+", default=[10000],
+                            help="Number of synthetic records of each run, e.g. 10000 100000 1000000")
+        parser.add_argument("--users", type=int,
+                            help="Number of users owning the records, defaults to one per 1000 records")
+        parser.add_argument("--workers", type=int, default=1,
+                            help="Number of processes importing the records")
+        parser.add_argument("--backend", choices=sorted(INSERT_BACKENDS),
+                            help="Insert backend, defaults to the IMPORT_INSERT_BACKEND setting")
+        parser.add_argument("--requests", type=int, default=20,
+                            help="Number of requests timed per endpoint")
+        parser.add_argument("--output", type=str, help="JSON file to save the results to")
+        parser.add_argument("--baseline", type=str, help="JSON results of a previous run to compare with")
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options["baseline"]:
+            try:
+                with open(options["baseline"]) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read the baseline: {e}")
+
+        results = {
+            "database": connection.vendor,
+            "backend": get_insert_backend(options["backend"]).name,
+            "workers": options["workers"],
+            "python": platform.python_version(),
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "runs": {},
+        }
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                for count in options["records"]:
+                    results["runs"][str(count)] = self.run(count, directory, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"Results saved to {options['output']}")
+
+        if baseline:
+            self.compare(results, baseline)
+
+    def run(self, count, directory, options):
+        """
+        Benchmark a synthetic logbook of a number of records on an empty database.
+        """
+        call_command("flush", interactive=False, verbosity=0)
+        data_file = os.path.join(directory, f"data-{count}.json")
+        write_records(data_file, generate_records(count, users=options["users"]))
+
+        self.stdout.write(f"{count} records")
+        # Model instances first, the database is emptied again for the raw rows
+        run = {"import_validated": bench_import(data_file, options["workers"], options["backend"], validate=True)}
+        call_command("flush", interactive=False, verbosity=0)
+        run["import"] = bench_import(data_file, options["workers"], options["backend"])
+        self.stdout.write(f"  import: {run['import']['rows_per_second']} rows/s, "
+                          f"{run['import']['queries']} queries, peak RSS {run['import']['peak_rss_mb']} MB")
+        speedup = run['import']['rows_per_second'] / run['import_validated']['rows_per_second']
+        self.stdout.write(f"  import --validate: {run['import_validated']['rows_per_second']} rows/s "
+                          f"(raw rows import {speedup:.2f}x as many records per second)")
+
+        run["export"] = bench_export(os.path.join(directory, f"export-{count}.csv"))
+        self.stdout.write(f"  export: {run['export']['rows_per_second']} rows/s, "
+                          f"{run['export']['queries']} queries, peak RSS {run['export']['peak_rss_mb']} MB")
+
+        run["api"] = bench_api(options["requests"])
+        for name, endpoint in run["api"].items():
+            self.stdout.write(f"  {name}: p50 {endpoint['p50_ms']} ms, p95 {endpoint['p95_ms']} ms, "
+                              f"{endpoint['queries_per_request']} queries/request")
+        return run
+
+    def compare(self, results, baseline):
+        """
+        Print how every measure changed since the baseline.
+        """
+        self.stdout.write(f"Compared with the baseline of {baseline.get('date', 'unknown date')}:")
+        for name, old, new, change, better in compare_results(results["runs"], baseline.get("runs", {})):
+            style = self.style.SUCCESS if better else self.style.WARNING
+            self.stdout.write(style(f"  {name}: {old} -> {new} ({change:+.1f}%)"))
@@ -7,9 +7,10 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument("file", type=str, help="Path to CSV file for export")
+        parser.add_argument("--user-id", type=int, help="Only export the logbook of this user_id")
 
     def handle(self, *args, **options):
         self.stdout.write("Exporting data...")
-        export_to_csv(options["file"])
+        export_to_csv(options["file"], user_id=options["user_id"])
         self.stdout.write(f"Done! Check the exported CSV file in "
-                          f"{options["file"]}")
+                          f"{options['file']}")
@@ -1,5 +1,7 @@
 from django.core.management.base import BaseCommand, CommandError
-from apps.pilotlog.helpers.import_export import import_data
+from apps.pilotlog.helpers.import_export import import_data, queries_per_1k, rows_per_second
+from apps.pilotlog.helpers.import_jobs import create_import_job
+from apps.pilotlog.helpers.loaders import INSERT_BACKENDS, get_insert_backend
 
 
 class Command(BaseCommand):
@@ -7,9 +9,69 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument("file", type=str, help="JSON file for importing")
+        parser.add_argument("--replay", action="store_true",
+                            help="The file is a dead-letter file of a previous import, import its records again")
+        parser.add_argument("--stream", action="store_true",
+                            help="Parse the file incrementally to keep memory bounded")
+        parser.add_argument("--workers", type=int, default=1,
+                            help="Number of processes importing the records, sharded by table and user_id")
+        parser.add_argument("--backend", choices=sorted(INSERT_BACKENDS),
+                            help="Insert backend, defaults to the IMPORT_INSERT_BACKEND setting")
+        parser.add_argument("--incremental", action="store_true",
+                            help="Skip unchanged records and upsert the ones with a newer _modified")
+        parser.add_argument("--replace", action="store_true",
+                            help="Replace the logbooks of the users in the file, purging them in the same "
+                                 "transaction as the import")
+        parser.add_argument("--validate", action="store_true",
+                            help="Build and check a model instance for every record instead of inserting raw rows")
+        parser.add_argument("--reject-file",
+                            help="NDJSON file the broken records are written to, with their byte offsets")
+        parser.add_argument("--dead-letter-file",
+                            help="NDJSON file the records that failed are written to, defaults to "
+                                 "<file>.dead.ndjson")
+        parser.add_argument("--queue", action="store_true",
+                            help="Queue a resumable import job for the import_worker command instead")
 
     def handle(self, *args, **options):
+        if options["queue"]:
+            # Import jobs always stream their file incrementally, with a single process
+            ignored = [option for option, value in (
+                ("--stream", options["stream"]), ("--incremental", options["incremental"]),
+                ("--workers", options["workers"] != 1), ("--validate", options["validate"]),
+                ("--replace", options["replace"]), ("--replay", options["replay"]),
+                ("--reject-file", options["reject_file"]), ("--dead-letter-file", options["dead_letter_file"]),
+            ) if value]
+            if ignored:
+                raise CommandError(f"--queue cannot be combined with {', '.join(ignored)}")
+            job = create_import_job(options["file"], backend=options["backend"])
+            self.stdout.write(f"Queued import job {job.pk}")
+            return
+
+        if options["replace"] and (options["replay"] or options["workers"] > 1):
+            raise CommandError("--replace cannot be combined with --replay or several --workers")
+
+        dead_letter_path = options["dead_letter_file"] or f'{options["file"]}.dead.ndjson'
+        if dead_letter_path == options["file"]:
+            raise CommandError("The dead-letter file must not be the imported file")
+
         self.stdout.write("Starting import data")
-        import_data(options["file"])
+        stats = import_data(options["file"], stream=options["stream"],
+                            workers=options["workers"], backend=options["backend"],
+                            incremental=options["incremental"], reject_path=options["reject_file"],
+                            dead_letter_path=dead_letter_path, replay=options["replay"],
+                            validate=options["validate"], replace=options["replace"])
 
         self.stdout.write("Finished import data")
+        if stats and stats["records"]:
+            self.stdout.write(f"{stats['records']} records, {stats['queries']} queries "
+                              f"({queries_per_1k(stats):.1f} per 1k records)")
+            self.stdout.write(f"{get_insert_backend(options['backend']).name} backend: "
+                              f"{stats['insert_rows']} rows in {stats['insert_seconds']:.2f}s "
+                              f"({rows_per_second(stats):.0f} rows/s)")
+            if options["incremental"]:
+                self.stdout.write(f"{stats['unchanged']} unchanged records skipped, "
+                                  f"{stats['upserted']} upserted")
+            if stats["failed"]:
+                self.stdout.write(f"{stats['failed']} failed records written to {dead_letter_path}")
+            if stats["rejected"]:
+                self.stdout.write(f"{stats['rejected']} broken records written to {options['reject_file']}")
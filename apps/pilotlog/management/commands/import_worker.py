@@ -0,0 +1,42 @@
+import datetime
+import os
+import socket
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from pilotlog.models.import_job import ImportJob
+
+from apps.pilotlog.helpers.import_jobs import run_import_job
+from apexive.settings import IMPORT_JOB_POLL_SECONDS, IMPORT_JOB_STALE_SECONDS
+
+
+class Command(BaseCommand):
+    help = "Run the queued import jobs, resuming the ones whose worker died"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true",
+                            help="Exit once the queue is empty instead of polling it")
+        parser.add_argument("--poll", type=float, default=IMPORT_JOB_POLL_SECONDS,
+                            help="Seconds to wait before polling an empty queue again")
+        parser.add_argument("--stale", type=int, default=IMPORT_JOB_STALE_SECONDS,
+                            help="Seconds without a checkpoint before a running job is queued again")
+
+    def handle(self, *args, **options):
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        self.stdout.write(f"Import worker {worker} started")
+        while True:
+            stale_before = timezone.now() - datetime.timedelta(seconds=options["stale"])
+            requeued = ImportJob.objects.requeue_stale(stale_before)
+            if requeued:
+                self.stdout.write(f"Queued {requeued} stale jobs again")
+
+            job = ImportJob.objects.claim_next(worker)
+            if job is not None:
+                job = run_import_job(job)
+                self.stdout.write(f"Import job {job.pk} {job.status}: {job.records} records, "
+                                  f"{job.errors} errors")
+            elif options["once"]:
+                break
+            else:
+                time.sleep(options["poll"])
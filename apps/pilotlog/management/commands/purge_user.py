@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from apps.pilotlog.helpers.purge import purge_user
+from apexive.settings import PURGE_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "Delete the logbooks of users from every table"
+
+    def add_arguments(self, parser):
+        parser.add_argument("user_ids", type=int, nargs="+", help="user_id of the logbooks to delete")
+        parser.add_argument("--batch-size", type=int, default=PURGE_BATCH_SIZE,
+                            help="Number of rows deleted by a single statement")
+
+    def handle(self, *args, **options):
+        for user_id in options["user_ids"]:
+            deleted = purge_user(user_id, batch_size=options["batch_size"])
+            counts = ", ".join(f"{count} {name}" for name, count in deleted.items() if count)
+            self.stdout.write(f"Purged user {user_id}: {counts or 'nothing to delete'}")
@@ -1,25 +1,45 @@
 from django.db import models
+from django.db.models.functions import Coalesce
+from .meta import MetaNumber, MetaQuerySet
 
+# Number of aircraft whose flight counters are refreshed by a single query
+REFRESH_CHUNK_SIZE = 500
 
-class AircraftQuerySet(models.QuerySet):
+
+class AircraftQuerySet(MetaQuerySet):
     def active(self):
-        return self.filter(meta__Active=True)
+        return self.filter(active=True)
 
     def by_make(self, make):
-        return self.filter(meta__Make=make)
+        return self.filter(make=make)
 
     def high_performance_complex(self):
-        return self.filter(
-            meta__HighPerf=True,
-            meta__Complex=True,
-            meta__Active=True
-        ).order_by('-meta__Make')
+        return self.meta_contains(
+            HighPerf=True,
+            Complex=True
+        ).filter(active=True).order_by('-make')
+
+    def refresh_flight_counters(self):
+        # One UPDATE computing the counters from the flights of each aircraft,
+        # each subquery is a range of the flight_aircraft_date index
+        flight_model = self.model._meta.get_field('flights').related_model
+        flights = flight_model.objects.filter(aircraft=models.OuterRef('pk')).order_by().values('aircraft')
+        return self.update(
+            flight_count=Coalesce(models.Subquery(flights.annotate(count=models.Count('pk')).values('count')), 0),
+            total_minutes=Coalesce(
+                models.Subquery(flights.annotate(minutes=models.Sum(MetaNumber('minTOTAL'))).values('minutes')), 0
+            ),
+            last_flown=models.Subquery(flights.annotate(last=models.Max('date')).values('last')),
+        )
 
 
 class AircraftManager(models.Manager):
     def get_queryset(self):
         return AircraftQuerySet(self.model, using=self._db)
 
+    def for_user(self, user_id):
+        return self.get_queryset().for_user(user_id)
+
     def active_aircraft(self):
         return self.get_queryset().active()
 
@@ -27,4 +47,12 @@ class AircraftManager(models.Manager):
         return self.get_queryset().by_make(make)
 
     def high_performance_complex_aircraft(self):
-        return self.get_queryset().high_performance_complex()
\ No newline at end of file
+        return self.get_queryset().high_performance_complex()
+
+    def meta_contains(self, **values):
+        return self.get_queryset().meta_contains(**values)
+
+    def refresh_flight_counters(self, aircraft_guids, chunk_size=REFRESH_CHUNK_SIZE):
+        aircraft_guids = list(aircraft_guids)
+        for i in range(0, len(aircraft_guids), chunk_size):
+            self.get_queryset().filter(guid__in=aircraft_guids[i:i + chunk_size]).refresh_flight_counters()
\ No newline at end of file
@@ -1,18 +1,76 @@
 from django.db import models
+from django.db.models.functions import Coalesce, TruncMonth
+from .meta import MetaNumber, MetaQuerySet
 
+# Flight totals summed from the meta: total name -> meta key
+FLIGHT_TOTALS = {
+    'total_minutes': 'minTOTAL',
+    'pic_minutes': 'minPIC',
+    'night_minutes': 'minNIGHT',
+    'xc_minutes': 'minXC',
+    'ifr_minutes': 'minIFR',
+    'day_landings': 'LdgDay',
+    'night_landings': 'LdgNight',
+}
 
-class FlightQuerySet(models.QuerySet):
+
+class FlightQuerySet(MetaQuerySet):
     def by_airplane(self, airplane_guid):
+        # Range scan of the (aircraft, date, guid) index, no join nor sort
         return self.filter(
-            airplane__guid=airplane_guid
-        ).order_by('airplane_guid')
+            aircraft_id=airplane_guid
+        ).order_by('date', 'guid')
+
+    def totals_expressions(self):
+        return {
+            'flights': models.Count('pk'),
+            **{name: Coalesce(models.Sum(MetaNumber(key)), 0) for name, key in FLIGHT_TOTALS.items()},
+        }
+
+    def totals(self):
+        return self.aggregate(**self.totals_expressions())
+
+    def totals_by(self, *group_by):
+        return self.values(*group_by).annotate(**self.totals_expressions()).order_by(*group_by)
+
+    def delete(self):
+        # Bulk deletes, e.g. the delete action of the admin, refresh the
+        # flight counters of their aircraft and the flight totals of their
+        # months like Flight.delete
+        flights = set(self.order_by().annotate(month=TruncMonth('date')).values_list(
+            'aircraft_id', 'user_id', 'month'
+        ).distinct())
+        result = super().delete()
+        self.model.objects.refresh_derived(flights)
+        return result
 
 
 class FlightManager(models.Manager):
     def get_queryset(self):
         return FlightQuerySet(self.model, using=self._db)
 
+    def for_user(self, user_id):
+        return self.get_queryset().for_user(user_id)
+
     def flight_by_airplane(self, airplane):
         return self.get_queryset().by_airplane(airplane)
 
+    def meta_contains(self, **values):
+        return self.get_queryset().meta_contains(**values)
+
+    def totals(self):
+        return self.get_queryset().totals()
+
+    def totals_by(self, *group_by):
+        return self.get_queryset().totals_by(*group_by)
+
+    def refresh_derived(self, flights):
+        # Refresh the flight counters of the aircraft and the flight totals of
+        # the months of changed flights, given as (aircraft_id, user_id, date)
+        aircraft_model = self.model._meta.get_field('aircraft').related_model
+        totals_model = aircraft_model._meta.get_field('totals').related_model
+        flights = list(flights)
+        aircraft_model.objects.refresh_flight_counters({aircraft_id for aircraft_id, _, _ in flights})
+        totals_model.objects.refresh({(user_id, date) for _, user_id, date in flights})
+
 
@@ -0,0 +1,104 @@
+import datetime
+from collections import defaultdict
+
+from django.db import connections, models, transaction
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import ExtractYear, TruncMonth
+from .flight import FLIGHT_TOTALS
+
+# Number of users whose flight totals are recomputed by a single query
+REFRESH_CHUNK_SIZE = 500
+
+# Summary group -> expression grouped by, fields are grouped by their value
+SUMMARY_GROUPS = {
+    'aircraft': 'aircraft',
+    'type': KeyTextTransform('Model', 'aircraft__meta'),
+    'year': ExtractYear('month'),
+    'month': 'month',
+}
+
+
+def month_bucket(date):
+    return None if date is None else date.replace(day=1)
+
+
+def next_month(month):
+    return (month + datetime.timedelta(days=31)).replace(day=1)
+
+
+class FlightTotalsQuerySet(models.QuerySet):
+    def for_user(self, user_id):
+        return self.filter(user_id=user_id)
+
+    def between(self, date_from=None, date_to=None):
+        queryset = self
+        if date_from is not None:
+            queryset = queryset.filter(month__gte=month_bucket(date_from))
+        if date_to is not None:
+            queryset = queryset.filter(month__lte=month_bucket(date_to))
+        return queryset
+
+    def summary_expressions(self):
+        return {name: models.Sum(name) for name in ('flights', *FLIGHT_TOTALS)}
+
+    def summary(self):
+        totals = self.aggregate(**self.summary_expressions())
+        return {name: value or 0 for name, value in totals.items()}
+
+    def summary_by(self, *group_by):
+        annotations = {
+            name: SUMMARY_GROUPS[name] for name in group_by if not isinstance(SUMMARY_GROUPS[name], str)
+        }
+        return self.annotate(**annotations).values(*group_by).annotate(
+            **self.summary_expressions()
+        ).order_by(*(models.F(name).asc(nulls_last=True) for name in group_by))
+
+
+class FlightTotalsManager(models.Manager):
+    def get_queryset(self):
+        return FlightTotalsQuerySet(self.model, using=self._db)
+
+    def for_user(self, user_id):
+        return self.get_queryset().for_user(user_id)
+
+    def refresh(self, buckets, chunk_size=REFRESH_CHUNK_SIZE):
+        # Recompute the rollup rows of some (user_id, month) buckets from their
+        # flights, a None month being the flights without a date. Every user
+        # is recomputed from its first to its last changed month, so a chunk
+        # of users costs one delete and one INSERT ... SELECT aggregating the
+        # flights in the database.
+        from ..models.flight import Flight
+
+        months_by_user = defaultdict(set)
+        for user_id, month in buckets:
+            months_by_user[user_id].add(month_bucket(month))
+
+        user_ids = list(months_by_user)
+        for i in range(0, len(user_ids), chunk_size):
+            rollup, period = models.Q(pk__in=[]), models.Q(pk__in=[])
+            for user_id in user_ids[i:i + chunk_size]:
+                months = months_by_user[user_id]
+                if None in months:
+                    rollup |= models.Q(user_id=user_id, month__isnull=True)
+                    period |= models.Q(user_id=user_id, date__isnull=True)
+                dated = [month for month in months if month is not None]
+                if dated:
+                    rollup |= models.Q(user_id=user_id, month__gte=min(dated), month__lte=max(dated))
+                    period |= models.Q(user_id=user_id, date__gte=min(dated), date__lt=next_month(max(dated)))
+
+            rows = Flight.objects.filter(period).annotate(
+                month=TruncMonth('date')
+            ).totals_by('user_id', 'aircraft_id', 'month')
+            select, params = rows.query.sql_with_params()
+            connection = connections[self.db]
+            columns = ', '.join(
+                connection.ops.quote_name(name)
+                for name in ('user_id', 'aircraft_id', 'month', 'flights', *FLIGHT_TOTALS)
+            )
+            with transaction.atomic(using=self.db), connection.cursor() as cursor:
+                self.filter(rollup).delete()
+                cursor.execute(
+                    f'INSERT INTO {connection.ops.quote_name(self.model._meta.db_table)} ({columns}) '
+                    f'SELECT {columns} FROM ({select}) rollup',
+                    params,
+                )
@@ -0,0 +1,34 @@
+from django.db import models, transaction
+from django.db.models import F
+from django.utils import timezone
+
+
+class ImportJobQuerySet(models.QuerySet):
+    def queued(self):
+        return self.filter(status=self.model.QUEUED)
+
+    def stale(self, before):
+        return self.filter(status=self.model.RUNNING, heartbeat_at__lt=before)
+
+
+class ImportJobManager(models.Manager):
+    def get_queryset(self):
+        return ImportJobQuerySet(self.model, using=self._db)
+
+    def claim_next(self, worker):
+        # The conditional UPDATE only succeeds for one of the workers racing
+        # for the same job, without needing SELECT ... FOR UPDATE SKIP LOCKED
+        for pk in self.get_queryset().queued().order_by('created_at', 'pk').values_list('pk', flat=True)[:10]:
+            now = timezone.now()
+            with transaction.atomic(using=self.db):
+                claimed = self.get_queryset().queued().filter(pk=pk).update(
+                    status=self.model.RUNNING, worker=worker, attempts=F('attempts') + 1,
+                    started_at=now, heartbeat_at=now,
+                )
+            if claimed:
+                return self.get(pk=pk)
+        return None
+
+    def requeue_stale(self, before):
+        # Jobs of dead workers resume from their last checkpoint
+        return self.get_queryset().stale(before).update(status=self.model.QUEUED, worker='')
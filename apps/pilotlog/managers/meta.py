@@ -0,0 +1,44 @@
+from django.db import NotSupportedError, connections, models
+
+
+class MetaQuerySet(models.QuerySet):
+    def for_user(self, user_id):
+        # An equality on user_id lets PostgreSQL only read the partition of
+        # the user when the table is partitioned, see migration 0010
+        return self.filter(user_id=user_id)
+
+    def meta_contains(self, **values):
+        # meta @> values is served by the GIN index on meta, databases without
+        # JSON containment (SQLite) compare the keys one by one
+        if connections[self.db].features.supports_json_field_contains:
+            return self.filter(meta__contains=values)
+        return self.filter(**{f'meta__{key}': value for key, value in values.items()})
+
+
+class MetaNumber(models.Func):
+    """
+    Integer stored under a meta key, 0 when the key is missing or is not a
+    number (e.g. an empty string), so it can be summed in SQL. Fractional
+    numbers are truncated toward zero on every database.
+    """
+    output_field = models.BigIntegerField()
+
+    def __init__(self, key, field='meta'):
+        super().__init__(models.F(field))
+        self.key = key
+
+    def as_sql(self, compiler, connection):
+        raise NotSupportedError(f"MetaNumber is not supported on {connection.vendor}")
+
+    def as_postgresql(self, compiler, connection):
+        column, params = compiler.compile(self.source_expressions[0])
+        sql = (f"CASE WHEN jsonb_typeof({column} -> %s) = 'number' "
+               f"THEN trunc(({column} ->> %s)::numeric)::bigint ELSE 0 END")
+        return sql, (*params, self.key, *params, self.key)
+
+    def as_sqlite(self, compiler, connection):
+        column, params = compiler.compile(self.source_expressions[0])
+        path = f'$."{self.key}"'
+        sql = (f"CASE WHEN json_type({column}, %s) IN ('integer', 'real') "
+               f"THEN CAST(json_extract({column}, %s) AS INTEGER) ELSE 0 END")
+        return sql, (*params, path, *params, path)
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:28
+
+from django.core.exceptions import ValidationError
+from django.db import migrations, models
+
+# Hot meta keys of each model at the time of this migration
+HOT_META = {
+    'Aircraft': {'make': 'Make', 'active': 'Active', 'ref_search': 'RefSearch'},
+    'Flight': {'date': 'DateUTC'},
+}
+
+
+def fill_hot_meta_columns(apps, schema_editor):
+    """
+    Copy the hot meta keys of the existing rows into their new columns.
+    """
+    for model_name, hot_meta in HOT_META.items():
+        model_class = apps.get_model('pilotlog', model_name)
+        fields = [model_class._meta.get_field(name) for name in hot_meta]
+        batch = []
+        for obj in model_class.objects.only('guid', 'meta').iterator(chunk_size=2000):
+            for field in fields:
+                try:
+                    value = field.to_python(obj.meta.get(hot_meta[field.name]))
+                except ValidationError:
+                    value = None
+                if value is None or value == '':
+                    value = field.get_default()
+                elif field.max_length and isinstance(value, str):
+                    value = value[:field.max_length]
+                setattr(obj, field.name, value)
+            batch.append(obj)
+            if len(batch) >= 2000:
+                model_class.objects.bulk_update(batch, list(hot_meta))
+                batch = []
+        if batch:
+            model_class.objects.bulk_update(batch, list(hot_meta))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pilotlog', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aircraft',
+            name='active',
+            field=models.BooleanField(db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='aircraft',
+            name='make',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='aircraft',
+            name='ref_search',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='flight',
+            name='date',
+            field=models.DateField(db_index=True, null=True),
+        ),
+        migrations.RunPython(fill_hot_meta_columns, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:29
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class AddPostgresIndex(migrations.AddIndex):
+    """
+    AddIndex skipped on databases other than PostgreSQL, which support neither
+    GIN indexes nor JSON containment.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pilotlog', '0002_hot_meta_columns'),
+    ]
+
+    operations = [
+        AddPostgresIndex(
+            model_name='aircraft',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['meta'], name='aircraft_meta_gin', opclasses=['jsonb_path_ops']),
+        ),
+        AddPostgresIndex(
+            model_name='aircraft',
+            index=models.Index(condition=models.Q(('active', True), ('meta__contains', {'Complex': True, 'HighPerf': True})), fields=['-make'], name='aircraft_hp_complex_make'),
+        ),
+        AddPostgresIndex(
+            model_name='flight',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['meta'], name='flight_meta_gin', opclasses=['jsonb_path_ops']),
+        ),
+    ]
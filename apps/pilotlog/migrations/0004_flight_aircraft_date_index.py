@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pilotlog', '0003_meta_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='flight',
+            name='aircraft',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='flights', to='pilotlog.aircraft'),
+        ),
+        migrations.AddIndex(
+            model_name='flight',
+            index=models.Index(fields=['aircraft', 'date', 'guid'], name='flight_aircraft_date'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pilotlog', '0004_flight_aircraft_date_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='aircraft',
+            index=models.Index(fields=['_modified', 'guid'], name='aircraft_modified'),
+        ),
+        migrations.AddIndex(
+            model_name='flight',
+            index=models.Index(fields=['_modified', 'guid'], name='flight_modified'),
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:40
+
+from collections import Counter, defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Flight totals at the time of this migration: total name -> meta key
+FLIGHT_TOTALS = {
+    'total_minutes': 'minTOTAL',
+    'pic_minutes': 'minPIC',
+    'night_minutes': 'minNIGHT',
+    'xc_minutes': 'minXC',
+    'ifr_minutes': 'minIFR',
+    'day_landings': 'LdgDay',
+    'night_landings': 'LdgNight',
+}
+
+
+def fill_flight_totals(apps, schema_editor):
+    """
+    Roll up the totals of the existing flights by user, aircraft and month.
+    """
+    Flight = apps.get_model('pilotlog', 'Flight')
+    FlightTotals = apps.get_model('pilotlog', 'FlightTotals')
+    totals = defaultdict(Counter)
+    flights = Flight.objects.values_list('user_id', 'aircraft_id', 'date', 'meta')
+    for user_id, aircraft_id, date, meta in flights.iterator(chunk_size=2000):
+        bucket = totals[user_id, aircraft_id, date and date.replace(day=1)]
+        bucket['flights'] += 1
+        for name, key in FLIGHT_TOTALS.items():
+            value = meta.get(key)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                bucket[name] += int(value)
+    FlightTotals.objects.bulk_create([
+        FlightTotals(user_id=user_id, aircraft_id=aircraft_id, month=month, **bucket)
+        for (user_id, aircraft_id, month), bucket in totals.items()
+    ], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pilotlog', '0005_modified_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FlightTotals',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.IntegerField()),
+                ('month', models.DateField(null=True)),
+                ('flights', models.IntegerField(default=0)),
+                ('total_minutes', models.BigIntegerField(default=0)),
+                ('pic_minutes', models.BigIntegerField(default=0)),
+                ('night_minutes', models.BigIntegerField(default=0)),
+                ('xc_minutes', models.BigIntegerField(default=0)),
+                ('ifr_minutes', models.BigIntegerField(default=0)),
+                ('day_landings', models.BigIntegerField(default=0)),
+                ('night_landings', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='flight',
+            index=models.Index(fields=['user_id', 'date'], name='flight_user_date'),
+        ),
+        migrations.AddField(
+            model_name='flighttotals',
+            name='aircraft',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='totals', to='pilotlog.aircraft'),
+        ),
+        migrations.AddIndex(
+            model_name='flighttotals',
+            index=models.Index(fields=['user_id', 'month'], name='flight_totals_user_month'),
+        ),
+        migrations.RunPython(fill_flight_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:44
+
+from django.db import migrations, models
+
+
+class AddFieldInPlace(migrations.AddField):
+    """
+    AddField adding the column with ALTER TABLE on SQLite too, keeping its
+    default in the database. Django would remake the table for a NOT NULL
+    column, which fails on the PostgreSQL-only indexes of the model.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'sqlite':
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        field = model._meta.get_field(self.name)
+        definition, params = schema_editor.column_sql(model, field, include_default=True)
+        schema_editor.execute(
+            f'ALTER TABLE {schema_editor.quote_name(model._meta.db_table)} '
+            f'ADD COLUMN {schema_editor.quote_name(field.column)} {definition}',
+            params or None,
+        )
+
+
+def fill_flight_counters(apps, schema_editor):
+    """
+    Count the existing flights of every aircraft, from the flight totals
+    rolled up by the previous migration.
+    """
+    Aircraft = apps.get_model('pilotlog', 'Aircraft')
+    Flight = apps.get_model('pilotlog', 'Flight')
+    FlightTotals = apps.get_model('pilotlog', 'FlightTotals')
+    counters = {
+        aircraft_id: {'flight_count': flights, 'total_minutes': minutes}
+        for aircraft_id, flights, minutes in FlightTotals.objects.values('aircraft_id').annotate(
+            flights=models.Sum('flights'), minutes=models.Sum('total_minutes'),
+        ).values_list('aircraft_id', 'flights', 'minutes').order_by()
+    }
+    for aircraft_id, last_flown in Flight.objects.values('aircraft_id').annotate(
+            last=models.Max('date')).values_list('aircraft_id', 'last').order_by():
+        counters.setdefault(aircraft_id, {})['last_flown'] = last_flown
+
+    batch = []
+    for aircraft_id, values in counters.items():
+        batch.append(Aircraft(guid=aircraft_id, **values))
+        if len(batch) >= 2000:
+            Aircraft.objects.bulk_update(batch, ['flight_count', 'total_minutes', 'last_flown'])
+            batch = []
+    if batch:
+        Aircraft.objects.bulk_update(batch, ['flight_count', 'total_minutes', 'last_flown'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pilotlog', '0006_flight_totals'),
+    ]
+
+    operations = [
+        AddFieldInPlace(
+            model_name='aircraft',
+            name='flight_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='aircraft',
+            name='last_flown',
+            field=models.DateField(editable=False, null=True),
+        ),
+        AddFieldInPlace(
+            model_name='aircraft',
+            name='total_minutes',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='aircraft',
+            index=models.Index(fields=['flight_count', 'guid'], name='aircraft_flight_count'),
+        ),
+        migrations.AddIndex(
+            model_name='aircraft',
+            index=models.Index(fields=['total_minutes', 'guid'], name='aircraft_total_minutes'),
+        ),
+        migrations.AddIndex(
+            model_name='aircraft',
+            index=models.Index(fields=['last_flown', 'guid'], name='aircraft_last_flown'),
+        ),
+        migrations.RunPython(fill_flight_counters, migrations.RunPython.noop),
+    ]
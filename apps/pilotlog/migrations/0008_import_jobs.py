@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pilotlog', '0007_aircraft_flight_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_path', models.CharField(max_length=1024)),
+                ('size', models.BigIntegerField(default=0)),
+                ('backend', models.CharField(blank=True, default='', max_length=32)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='queued', max_length=16)),
+                ('worker', models.CharField(blank=True, default='', max_length=255)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('offset', models.BigIntegerField(default=0)),
+                ('records', models.BigIntegerField(default=0)),
+                ('tables', models.JSONField(default=dict)),
+                ('errors', models.BigIntegerField(default=0)),
+                ('message', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(null=True)),
+                ('heartbeat_at', models.DateTimeField(null=True)),
+                ('finished_at', models.DateTimeField(null=True)),
+            ],
+        ),
+    ]
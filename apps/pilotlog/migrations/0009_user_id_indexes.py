@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pilotlog', '0008_import_jobs'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='aircraft',
+            index=models.Index(fields=['user_id'], name='aircraft_user_id'),
+        ),
+        migrations.AddIndex(
+            model_name='imagepic',
+            index=models.Index(fields=['user_id'], name='imagepic_user_id'),
+        ),
+        migrations.AddIndex(
+            model_name='limitrules',
+            index=models.Index(fields=['user_id'], name='limitrules_user_id'),
+        ),
+        migrations.AddIndex(
+            model_name='myquery',
+            index=models.Index(fields=['user_id'], name='myquery_user_id'),
+        ),
+        migrations.AddIndex(
+            model_name='myquerybuild',
+            index=models.Index(fields=['user_id'], name='myquerybuild_user_id'),
+        ),
+        migrations.AddIndex(
+            model_name='pilot',
+            index=models.Index(fields=['user_id'], name='pilot_user_id'),
+        ),
+        migrations.AddIndex(
+            model_name='qualification',
+            index=models.Index(fields=['user_id'], name='qualification_user_id'),
+        ),
+        migrations.AddIndex(
+            model_name='settingconfig',
+            index=models.Index(fields=['user_id'], name='settingconfig_user_id'),
+        ),
+    ]
@@ -0,0 +1,155 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:32
+
+from django.db import migrations
+
+# Layout of the partitioned tables on PostgreSQL: number of hash partitions by
+# user_id and models partitioned. Aircraft is referenced by the Flights and
+# flight totals, so it cannot be partitioned. A different layout takes a new
+# migration, so the schema always follows the migration history.
+PARTITIONS = 16
+PARTITIONED_MODELS = ['Flight']
+
+# Models holding the records of a logbook, with a user_id column
+LOGBOOK_MODELS = ['Aircraft', 'Flight', 'ImagePic', 'LimitRules', 'MyQuery', 'MyQueryBuild', 'Pilot',
+                  'Qualification', 'SettingConfig']
+
+
+def is_partitioned(cursor, table):
+    cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass', [table])
+    return cursor.fetchone() is not None
+
+
+def add_key_table(cursor, quote, table, pk):
+    """
+    Keep the pk of a partitioned table unique across users. Its primary key
+    must contain user_id, so the pks are copied to the plain {table}_keys
+    table by triggers, and its primary key rejects a pk of another user.
+    """
+    keys = quote(f'{table}_keys')
+    cursor.execute(f'CREATE TABLE {keys} AS SELECT {quote(pk)} FROM {quote(table)}')
+    cursor.execute(f'ALTER TABLE {keys} ADD PRIMARY KEY ({quote(pk)})')
+    statements = {
+        'INSERT': f'INSERT INTO {keys} SELECT {quote(pk)} FROM new_rows',
+        'DELETE': f'DELETE FROM {keys} WHERE {quote(pk)} IN (SELECT {quote(pk)} FROM old_rows)',
+        'UPDATE': f'DELETE FROM {keys} WHERE {quote(pk)} IN (SELECT {quote(pk)} FROM old_rows '
+                  f'EXCEPT SELECT {quote(pk)} FROM new_rows); '
+                  f'INSERT INTO {keys} SELECT {quote(pk)} FROM new_rows EXCEPT SELECT {quote(pk)} FROM old_rows',
+        'TRUNCATE': f'TRUNCATE {keys}',
+    }
+    transitions = {
+        'INSERT': ' REFERENCING NEW TABLE AS new_rows',
+        'DELETE': ' REFERENCING OLD TABLE AS old_rows',
+        'UPDATE': ' REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows',
+        'TRUNCATE': '',
+    }
+    for event, statement in statements.items():
+        function = quote(f'{table}_keys_{event.lower()}')
+        cursor.execute(f'CREATE FUNCTION {function}() RETURNS trigger LANGUAGE plpgsql '
+                       f'AS $$ BEGIN {statement}; RETURN NULL; END $$')
+        cursor.execute(f'CREATE TRIGGER {function} AFTER {event} ON {quote(table)}{transitions[event]} '
+                       f'FOR EACH STATEMENT EXECUTE FUNCTION {function}()')
+
+
+def drop_key_table(cursor, quote, table):
+    for event in ('INSERT', 'DELETE', 'UPDATE', 'TRUNCATE'):
+        cursor.execute(f'DROP FUNCTION IF EXISTS {quote(f"{table}_keys_{event.lower()}")}() CASCADE')
+    cursor.execute(f'DROP TABLE IF EXISTS {quote(f"{table}_keys")}')
+
+
+def rebuild_table(connection, table, pk, partitions):
+    """
+    Rebuild a table with the same rows, indexes and foreign keys, hash
+    partitioned by user_id into partitions tables, or as a plain table if
+    partitions is 0. The primary key of a partitioned table must contain
+    user_id, so it becomes (pk, user_id) and a key table keeps the pk unique.
+    """
+    quote = connection.ops.quote_name
+    rebuilt = f'{table}_rebuild'
+    with connection.cursor() as cursor:
+        drop_key_table(cursor, quote, table)
+        cursor.execute('SELECT pg_get_indexdef(indexrelid) FROM pg_index '
+                       'WHERE indrelid = %s::regclass AND NOT indisprimary', [table])
+        # The indexes of a partitioned table are created on its partitions too
+        indexes = [definition.replace(' ON ONLY ', ' ON ') for definition, in cursor.fetchall()]
+        cursor.execute("SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+                       "WHERE conrelid = %s::regclass AND contype = 'f'", [table])
+        foreign_keys = cursor.fetchall()
+
+        partition_by = ' PARTITION BY HASH (user_id)' if partitions else ''
+        cursor.execute(f'CREATE TABLE {quote(rebuilt)} (LIKE {quote(table)} INCLUDING DEFAULTS '
+                       f'INCLUDING CONSTRAINTS INCLUDING IDENTITY INCLUDING STORAGE){partition_by}')
+        for remainder in range(partitions):
+            cursor.execute(f'CREATE TABLE {quote(f"{table}_p{remainder}")} PARTITION OF {quote(rebuilt)} '
+                           f'FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})')
+        cursor.execute(f'INSERT INTO {quote(rebuilt)} SELECT * FROM {quote(table)}')
+        cursor.execute(f'DROP TABLE {quote(table)}')
+        cursor.execute(f'ALTER TABLE {quote(rebuilt)} RENAME TO {quote(table)}')
+
+        key = f'{quote(pk)}, user_id' if partitions else quote(pk)
+        cursor.execute(f'ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(f"{table}_pkey")} PRIMARY KEY ({key})')
+        for definition in indexes:
+            cursor.execute(definition)
+        # Name the indexes of the partitions after the index of the table
+        for remainder in range(partitions):
+            partition = f'{table}_p{remainder}'
+            cursor.execute('SELECT index.relname, parent.relname FROM pg_index '
+                           'JOIN pg_class index ON index.oid = pg_index.indexrelid '
+                           'JOIN pg_inherits ON pg_inherits.inhrelid = pg_index.indexrelid '
+                           'JOIN pg_class parent ON parent.oid = pg_inherits.inhparent '
+                           'WHERE pg_index.indrelid = %s::regclass', [partition])
+            for index, parent in cursor.fetchall():
+                cursor.execute(f'ALTER INDEX {quote(index)} RENAME TO {quote(f"{parent}_p{remainder}")}')
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(name)} {definition}')
+        # The identity of an auto primary key restarts with the new table
+        cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [table, pk])
+        sequence, = cursor.fetchone()
+        if sequence:
+            cursor.execute(f'SELECT setval(%s, COALESCE(MAX({quote(pk)}), 0) + 1, false) FROM {quote(table)}',
+                           [sequence])
+        if partitions:
+            add_key_table(cursor, quote, table, pk)
+
+
+def partition_tables(apps, schema_editor):
+    """
+    Partition the PARTITIONED_MODELS tables by user_id into PARTITIONS
+    tables, on PostgreSQL. Tables already partitioned are kept.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    for name in PARTITIONED_MODELS:
+        model = apps.get_model('pilotlog', name)
+        if model._meta.related_objects:
+            raise ValueError(f"{name} is referenced by other tables and cannot be partitioned")
+        with connection.cursor() as cursor:
+            if is_partitioned(cursor, model._meta.db_table):
+                continue
+        rebuild_table(connection, model._meta.db_table, model._meta.pk.column, PARTITIONS)
+
+
+def unpartition_tables(apps, schema_editor):
+    """
+    Turn the partitioned logbook tables back into plain tables.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    for name in LOGBOOK_MODELS:
+        model = apps.get_model('pilotlog', name)
+        with connection.cursor() as cursor:
+            if not is_partitioned(cursor, model._meta.db_table):
+                continue
+        rebuild_table(connection, model._meta.db_table, model._meta.pk.column, 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pilotlog', '0009_user_id_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_tables, unpartition_tables),
+    ]
@@ -1,9 +1,45 @@
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
 from .base_model import BaseModel
 from ..managers.aircraft import AircraftManager
 
 
 class Aircraft(BaseModel):
+    make = models.CharField(max_length=255, blank=True, default='', db_index=True)
+    active = models.BooleanField(null=True, db_index=True)
+    ref_search = models.CharField(max_length=255, blank=True, default='', db_index=True)
+
+    # Counters of the flights of the aircraft, see refresh_flight_counters
+    flight_count = models.IntegerField(default=0, editable=False)
+    total_minutes = models.BigIntegerField(default=0, editable=False)
+    last_flown = models.DateField(null=True, editable=False)
+
+    hot_meta = {
+        'make': 'Make',
+        'active': 'Active',
+        'ref_search': 'RefSearch',
+    }
+
     objects = AircraftManager()
+
+    class Meta:
+        indexes = [
+            # Serves meta__contains (@>) lookups
+            GinIndex(fields=['meta'], opclasses=['jsonb_path_ops'], name='aircraft_meta_gin'),
+            # Serves the keyset pagination of the aircraft
+            models.Index(fields=['_modified', 'guid'], name='aircraft_modified'),
+            # Serves the purge of a logbook, see helpers/purge.py
+            models.Index(fields=['user_id'], name='aircraft_user_id'),
+            # Serve the fleet list sorted by the flight counters, in both directions
+            models.Index(fields=['flight_count', 'guid'], name='aircraft_flight_count'),
+            models.Index(fields=['total_minutes', 'guid'], name='aircraft_total_minutes'),
+            models.Index(fields=['last_flown', 'guid'], name='aircraft_last_flown'),
+            # Serves high_performance_complex, ordered by make
+            models.Index(
+                fields=['-make'], name='aircraft_hp_complex_make',
+                condition=models.Q(meta__contains={'HighPerf': True, 'Complex': True}, active=True),
+            ),
+        ]
+
     def __str__(self):
         return self.meta.get('Make', 'Unknown Aircraft')
@@ -1,3 +1,4 @@
+from django.core.exceptions import ValidationError
 from django.db import models
 
 
@@ -8,5 +9,42 @@ class BaseModel(models.Model):
     _modified = models.BigIntegerField()
     meta = models.JSONField()
 
+    # Hot meta keys stored in their own indexed column: field name -> meta key
+    hot_meta = {}
+
     class Meta:
         abstract = True
+        indexes = [
+            # Serves the purge of a logbook, see helpers/purge.py
+            models.Index(fields=['user_id'], name='%(class)s_user_id'),
+        ]
+
+    @staticmethod
+    def hot_meta_value(field, value):
+        """
+        Convert a hot meta value to the type of its field.
+        Missing or invalid values give the field default.
+        """
+        try:
+            value = field.to_python(value)
+        except ValidationError:
+            value = None
+        if value is None or value == '':
+            return field.get_default()
+        if field.max_length and isinstance(value, str):
+            return value[:field.max_length]
+        return value
+
+    def sync_hot_meta(self):
+        """
+        Copy the hot meta keys into their columns, converted to the field type.
+        """
+        for name, key in self.hot_meta.items():
+            setattr(self, name, self.hot_meta_value(self._meta.get_field(name), self.meta.get(key)))
+
+    def save(self, *args, **kwargs):
+        self.sync_hot_meta()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'meta' in update_fields:
+            kwargs['update_fields'] = {*update_fields, *self.hot_meta}
+        super().save(*args, **kwargs)
@@ -1,3 +1,4 @@
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
 from .base_model import BaseModel
 from .aircraft import Aircraft
@@ -5,9 +6,48 @@ from ..managers.flight import FlightManager
 
 
 class Flight(BaseModel):
+    # Indexed by flight_aircraft_date, which starts with the aircraft
     aircraft = models.ForeignKey(Aircraft, on_delete=models.CASCADE,
-                                 related_name='flights')
+                                 related_name='flights', db_index=False)
+    date = models.DateField(null=True, db_index=True)
+
+    # AircraftCode is already stored as aircraft_id
+    hot_meta = {
+        'date': 'DateUTC',
+    }
 
     objects = FlightManager()
+
+    class Meta:
+        indexes = [
+            # Serves meta__contains (@>) lookups
+            GinIndex(fields=['meta'], opclasses=['jsonb_path_ops'], name='flight_meta_gin'),
+            # Serves the flights of an aircraft by date, see by_airplane
+            models.Index(fields=['aircraft', 'date', 'guid'], name='flight_aircraft_date'),
+            # Serves the keyset pagination of the flights
+            models.Index(fields=['_modified', 'guid'], name='flight_modified'),
+            # Serves the flights of a user by date, see FlightTotalsManager.refresh
+            models.Index(fields=['user_id', 'date'], name='flight_user_date'),
+        ]
+
+    # The flight counters of the aircraft and the flight totals are refreshed
+    # by save and delete, by the deletes of FlightQuerySet and by the import;
+    # the deletes of the purge, which remove the aircraft too, and the
+    # cascades of the deleted aircraft skip them
+    def save(self, *args, **kwargs):
+        stored = []
+        if not self._state.adding:
+            # A flight moved to another aircraft or month changes the
+            # counters and totals of both
+            stored = list(Flight.objects.filter(pk=self.pk).values_list('aircraft_id', 'user_id', 'date'))
+        super().save(*args, **kwargs)
+        Flight.objects.refresh_derived([(self.aircraft_id, self.user_id, self.date), *stored])
+
+    def delete(self, *args, **kwargs):
+        flight = (self.aircraft_id, self.user_id, self.date)
+        result = super().delete(*args, **kwargs)
+        Flight.objects.refresh_derived([flight])
+        return result
+
     def __str__(self):
         return f"Flight {self.guid} on {self.meta.get('DateUTC', 'Unknown Date')}"
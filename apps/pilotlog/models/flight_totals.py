@@ -0,0 +1,33 @@
+from django.db import models
+from .aircraft import Aircraft
+from ..managers.flight_totals import FlightTotalsManager
+
+
+class FlightTotals(models.Model):
+    """
+    Monthly rollup of the flight totals of a user on an aircraft, refreshed
+    for the months changed by the import and by the saves and deletes of the
+    flights (see FlightTotalsManager.refresh).
+    """
+    user_id = models.IntegerField()
+    aircraft = models.ForeignKey(Aircraft, on_delete=models.CASCADE, related_name='totals')
+    # First day of the month, null for the flights without a date
+    month = models.DateField(null=True)
+    flights = models.IntegerField(default=0)
+    total_minutes = models.BigIntegerField(default=0)
+    pic_minutes = models.BigIntegerField(default=0)
+    night_minutes = models.BigIntegerField(default=0)
+    xc_minutes = models.BigIntegerField(default=0)
+    ifr_minutes = models.BigIntegerField(default=0)
+    day_landings = models.BigIntegerField(default=0)
+    night_landings = models.BigIntegerField(default=0)
+
+    objects = FlightTotalsManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user_id', 'month'], name='flight_totals_user_month'),
+        ]
+
+    def __str__(self):
+        return f"Flight totals of {self.user_id} on {self.aircraft_id} in {self.month or 'Unknown Month'}"
@@ -0,0 +1,67 @@
+from django.db import models
+from ..managers.import_job import ImportJobManager
+
+
+class ImportJob(models.Model):
+    """
+    Import of a JSON logbook file run by the import_worker command.
+
+    The job records a checkpoint after every committed chunk of records: the
+    byte offset of the first record not committed yet and the records
+    committed per table. A job whose worker died is queued again and resumes
+    from its checkpoint, see helpers/import_jobs.py.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    file_path = models.CharField(max_length=1024)
+    size = models.BigIntegerField(default=0)
+    backend = models.CharField(max_length=32, blank=True, default='')
+    status = models.CharField(max_length=16, choices=STATUSES, default=QUEUED, db_index=True)
+    worker = models.CharField(max_length=255, blank=True, default='')
+    # Number of times a worker claimed the job, more than one once resumed
+    attempts = models.PositiveIntegerField(default=0)
+
+    # Checkpoint: offset of the first record not committed yet, records
+    # committed, records written or unchanged per table and records that failed
+    offset = models.BigIntegerField(default=0)
+    records = models.BigIntegerField(default=0)
+    tables = models.JSONField(default=dict)
+    errors = models.BigIntegerField(default=0)
+    message = models.TextField(blank=True, default='')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True)
+    heartbeat_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True)
+
+    objects = ImportJobManager()
+
+    @property
+    def progress(self):
+        """
+        Fraction of the file committed, between 0 and 1.
+        """
+        if self.status == self.DONE:
+            return 1.0
+        return min(self.offset / self.size, 1.0) if self.size else 0.0
+
+    @property
+    def reject_path(self):
+        """
+        Path of the NDJSON file the broken records of the file are written to.
+        """
+        return f'{self.file_path}.rejects.ndjson'
+
+    @property
+    def dead_letter_path(self):
+        """
+        Path of the NDJSON file the records that failed to import are written to.
+        """
+        return f'{self.file_path}.dead.ndjson'
+
+    def __str__(self):
+        return f"Import job {self.pk} of {self.file_path} ({self.status})"
@@ -1,3 +1,1101 @@
-from django.test import TestCase
+import csv
+import datetime
+import gzip
+import importlib
+import io
+import json
+import os
+import tempfile
+import unittest
+import uuid
+import warnings
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.paginator import UnorderedObjectListWarning
+from django.db import connection
+from django.db.models import Count
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from apps.pilotlog.benchmarks.suite import bench_api, bench_export, bench_import, compare_results
+from apps.pilotlog.benchmarks.synthetic import PROJECT_ROOT, generate_records
+from apps.pilotlog.helpers.import_export import (ImportPipeline, export_to_csv, import_data, iter_logbook_csv_rows,
+                                                 load_data)
+from apps.pilotlog.helpers.import_jobs import create_import_job, run_import_job
+from apps.pilotlog.helpers.json_stream import RejectFile, iter_offset_records, iter_records
+from apps.pilotlog.helpers.loaders import RowLayout, copy_fields
+from apps.pilotlog.helpers.mappings import get_aircraft_mapping, get_flights_mapping, get_flights_row_converter
+from apps.pilotlog.helpers.parallel_import import ParallelImport
+from apps.pilotlog.helpers.purge import purge_user
+from apps.pilotlog.helpers.utils import (compile_row_converter, convert_types, row_converter, to_date, to_hhmm,
+                                        to_packed_detail)
+from pilotlog.models.aircraft import Aircraft
+from pilotlog.models.flight import Flight
+from pilotlog.models.flight_totals import FlightTotals
+from pilotlog.models.import_job import ImportJob
+from pilotlog.models.pilot import Pilot
+
+
+def aircraft_record(i, user_id=1, modified=0, **meta):
+    return {'table': 'Aircraft', 'guid': str(uuid.UUID(int=i)), 'user_id': user_id, 'platform': 9,
+            '_modified': modified, 'meta': {'Make': 'Cessna', **meta}}
+
+
+def flight_record(i, aircraft, user_id=1, modified=0, date='2020-01-10', minutes=60):
+    return {'table': 'Flight', 'guid': str(uuid.UUID(int=i)), 'user_id': user_id, 'platform': 9,
+            '_modified': modified, 'meta': {'AircraftCode': str(uuid.UUID(int=aircraft)), 'DateUTC': date,
+                                            'minTOTAL': minutes}}
+
+
+class LogbookFileMixin:
+    """
+    Write logbook files for a test, removed with the dead-letter and reject
+    files next to them once the test is over.
+    """
+
+    def write_logbook(self, records):
+        """
+        Write records, or raw JSON text, to a temporary JSON file.
+
+        :param records: a list of records or the text of the file
+        :return: the path of the file
+        """
+        fd, file_path = tempfile.mkstemp(suffix='.json')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            if isinstance(records, str):
+                f.write(records)
+            else:
+                json.dump(records, f)
+        for path in (file_path, f'{file_path}.dead.ndjson', f'{file_path}.rejects.ndjson'):
+            self.addCleanup(lambda path=path: os.path.exists(path) and os.remove(path))
+        return file_path
+
+
+class StreamingImportTests(LogbookFileMixin, TestCase):
+    """
+    Check the streaming reader returns the records of the file whatever the
+    size of the chunks read.
+    """
+
+    def setUp(self):
+        self.records = [aircraft_record(1, Model='{"C150"}\t\\'), aircraft_record(2, Notes='café ]}')]
+        self.records += [flight_record(100 + i, 1) for i in range(5)]
+        self.file_path = self.write_logbook(self.records)
+
+    def test_records_split_across_chunks(self):
+        for chunk_size in (1, 7, 64, 1 << 16):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(list(iter_records(self.file_path, chunk_size=chunk_size)), self.records)
+
+    def test_streamed_import(self):
+        stats = import_data(self.file_path, stream=True)
+        self.assertEqual((stats['records'], stats['failed']), (7, 0))
+        self.assertEqual(Aircraft.objects.get(guid=uuid.UUID(int=1)).meta['Model'], '{"C150"}\t\\')
+        self.assertEqual(Flight.objects.count(), 5)
+
+
+class SinglePassImportTests(TestCase):
+    """
+    Check records are imported in a single pass, Flights waiting for their
+    Aircraft when it comes later.
+    """
+
+    def test_flights_before_their_aircraft(self):
+        records = [flight_record(100 + i, 1) for i in range(5)]
+        records += [aircraft_record(1), flight_record(105, 1)]
+        pipeline = ImportPipeline(batch_size=2).run(iter(records))
+        self.assertEqual(pipeline.dead_letters.count, 0)
+        self.assertEqual(pipeline.table_records, {'Aircraft': 1, 'Flight': 6})
+        self.assertEqual(Flight.objects.filter(aircraft_id=uuid.UUID(int=1)).count(), 6)
+
+    def test_flights_without_aircraft_fail(self):
+        records = [flight_record(100, 2), aircraft_record(1), flight_record(101, 1)]
+        with self.assertLogs('apps.pilotlog.helpers.import_export', 'ERROR'):
+            pipeline = ImportPipeline(batch_size=2).run(records)
+        self.assertEqual(pipeline.dead_letters.counts, {('Flight', 'DoesNotExist'): 1})
+        self.assertEqual(list(Flight.objects.values_list('guid', flat=True)), [uuid.UUID(int=101)])
+
+    def test_waiting_flights_are_bounded(self):
+        records = [aircraft_record(1), flight_record(100, 1)] + [flight_record(101 + i, 2) for i in range(5)]
+        pipeline = ImportPipeline(batch_size=10, pending_limit=3)
+        with self.assertLogs('apps.pilotlog.helpers.import_export', 'ERROR'):
+            for d in records:
+                pipeline.feed(d)
+                self.assertLess(pipeline.pending_count, 3)
+            pipeline.finish()
+        self.assertEqual(pipeline.dead_letters.counts, {('Flight', 'DoesNotExist'): 5})
+        self.assertEqual(list(Flight.objects.values_list('guid', flat=True)), [uuid.UUID(int=100)])
+
+
+class AircraftIndexTests(TestCase):
+    """
+    Check the Aircraft of the imported Flights are looked up in bulk, not once per Flight.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in (1, 2):
+            Aircraft(guid=uuid.UUID(int=i), user_id=1, platform=9, _modified=0, meta={}).save()
+
+    def aircraft_queries(self, records, batch_size):
+        with CaptureQueriesContext(connection) as queries:
+            ImportPipeline(batch_size=batch_size).run(records)
+        # The COPY backend runs composed statements, which are not lookups
+        sqls = [query['sql'] for query in queries if isinstance(query['sql'], str)]
+        return [sql for sql in sqls if sql.startswith('SELECT') and 'FROM "pilotlog_aircraft"' in sql]
+
+    def test_stored_aircraft_are_looked_up_once_per_batch(self):
+        records = [flight_record(100 + i, i % 2 + 1) for i in range(40)]
+        self.assertEqual(len(self.aircraft_queries(records, batch_size=50)), 1)
+        self.assertEqual(Aircraft.objects.get(guid=uuid.UUID(int=1)).flights.count(), 20)
+
+    def test_imported_aircraft_are_not_looked_up(self):
+        records = [aircraft_record(3)] + [flight_record(100 + i, 3) for i in range(40)]
+        self.assertEqual(self.aircraft_queries(records, batch_size=10), [])
+        self.assertEqual(Flight.objects.filter(aircraft_id=uuid.UUID(int=3)).count(), 40)
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'Worker processes cannot share an in-memory test database')
+class ParallelImportTests(LogbookFileMixin, TransactionTestCase):
+    """
+    Check worker processes import the shards of several users and the
+    Flights are only sent once their Aircraft are committed.
+    """
+
+    def test_import_with_workers(self):
+        records = []
+        for user_id in (1, 2, 3):
+            records.append(flight_record(100 * user_id, user_id, user_id=user_id))
+            records.append(aircraft_record(user_id, user_id=user_id))
+            records += [flight_record(100 * user_id + i, user_id, user_id=user_id) for i in range(1, 4)]
+        records.append(flight_record(999, 9, user_id=3))
+        file_path = self.write_logbook(records)
+
+        stats = import_data(file_path, stream=True, workers=2, dead_letter_path=file_path + '.dead.ndjson')
+        self.assertEqual((stats['records'], stats['failed']), (16, 1))
+        self.assertEqual(dict(Flight.objects.values_list('user_id').annotate(Count('guid'))), {1: 4, 2: 4, 3: 4})
+        self.assertEqual(sorted(Aircraft.objects.values_list('flight_count', flat=True)), [4, 4, 4])
+        self.assertEqual(FlightTotals.objects.for_user(2).summary()['total_minutes'], 240)
+
+    def test_batches_of_a_shard_run_in_order(self):
+        # Batches of one record: every version of an Aircraft is in its own batch
+        records = [aircraft_record(user_id, user_id=user_id, modified=modified, Model=f'v{modified}')
+                   for modified in range(20) for user_id in (1, 2)]
+        ParallelImport(workers=4, batch_size=1, incremental=True).run(records)
+        self.assertEqual(sorted(Aircraft.objects.values_list('user_id', '_modified', 'meta__Model')),
+                         [(1, 19, 'v19'), (2, 19, 'v19')])
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'COPY needs PostgreSQL')
+class InsertBackendTests(TestCase):
+    """
+    Check the COPY backend stores the same rows as the ORM backend, whatever
+    characters the records hold.
+    """
+    text = 'tab\there\nnew line\r\\N back\\slash été "quoted"'
+
+    def import_logbook(self, backend, user_id, modified=0, validate=False):
+        records = [aircraft_record(user_id, user_id=user_id, modified=modified, Model=self.text,
+                                   Notes=[None, {'x': self.text}], Active=True)]
+        records += [flight_record(100 * user_id + i, user_id, user_id=user_id, modified=modified) for i in range(3)]
+        ImportPipeline(backend=backend, incremental=bool(modified), validate=validate).run(records)
+
+    def logbook(self, user_id):
+        aircraft = Aircraft.objects.for_user(user_id).values('platform', '_modified', 'meta', 'make', 'active')
+        flights = Flight.objects.for_user(user_id).values_list('_modified', 'date', 'meta__minTOTAL')
+        return list(aircraft), sorted(flights)
+
+    def test_backends_store_the_same_rows(self):
+        self.import_logbook('orm', 1)
+        expected = self.logbook(1)
+        self.assertEqual(expected[0][0]['meta']['Model'], self.text)
+        for user_id, validate in ((2, False), (3, True)):
+            with self.subTest(validate=validate):
+                self.import_logbook('copy', user_id, validate=validate)
+                self.assertEqual(self.logbook(user_id), expected)
+
+    def test_backends_upsert_the_same_rows(self):
+        for user_id, backend in ((1, 'orm'), (2, 'copy')):
+            self.import_logbook(backend, user_id)
+            self.import_logbook(backend, user_id, modified=1)
+        self.assertEqual(self.logbook(2), self.logbook(1))
+        self.assertEqual(Flight.objects.filter(_modified=1).count(), 6)
+
+
+class IncrementalImportTests(LogbookFileMixin, TestCase):
+    """
+    Check an incremental re-import only writes the records with a newer _modified.
+    """
+
+    def setUp(self):
+        records = [aircraft_record(1, modified=10)]
+        records += [flight_record(100 + i, 1, modified=10) for i in range(3)]
+        import_data(self.write_logbook(records))
+
+    def test_reimport_skips_unchanged_records(self):
+        records = [aircraft_record(1, modified=10, Make='Piper')]
+        records += [
+            flight_record(100, 1, modified=10, minutes=1),
+            flight_record(101, 1, modified=11, minutes=90),
+            flight_record(102, 1, modified=9, minutes=1),
+            flight_record(103, 1, modified=0),
+        ]
+        stats = import_data(self.write_logbook(records), stream=True, incremental=True)
+        self.assertEqual((stats['unchanged'], stats['upserted'], stats['failed']), (3, 1, 0))
+
+        self.assertEqual(Aircraft.objects.get().make, 'Cessna')
+        minutes = dict(Flight.objects.values_list('guid', 'meta__minTOTAL'))
+        self.assertEqual(minutes, {uuid.UUID(int=100): 60, uuid.UUID(int=101): 90,
+                                   uuid.UUID(int=102): 60, uuid.UUID(int=103): 60})
+        self.assertEqual(FlightTotals.objects.for_user(1).summary()['total_minutes'], 270)
+
+    def test_duplicated_records_keep_the_most_recent(self):
+        records = [flight_record(100, 1, modified=12, minutes=30), flight_record(100, 1, modified=11, minutes=1)]
+        stats = import_data(self.write_logbook(records), incremental=True)
+        self.assertEqual((stats['unchanged'], stats['upserted']), (1, 1))
+        self.assertEqual(Flight.objects.get(guid=uuid.UUID(int=100)).meta['minTOTAL'], 30)
+
+
+class CsvExportTests(TestCase):
+    """
+    Check the CSV export writes the ForeFlight tables with converted values.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        aircraft = Aircraft(guid=uuid.UUID(int=1), user_id=1, platform=9, _modified=0, meta={
+            'RefSearch': 'N12345', 'EquipmentType': 'aircraft', 'TypeCode': 'C172', 'Record_Modified': 1593604800,
+            'Make': 'Cessna', 'Model': 'C172', 'Category': 'airplane', 'Class': 'airplane_single_engine_land',
+            'Tailwheel': 'fixed_tricycle', 'Power': 'Piston', 'Complex': True, 'HighPerf': False, 'Aerobatic': 1,
+        })
+        aircraft.save()
+        Flight(guid=uuid.UUID(int=100), user_id=1, platform=9, _modified=0, aircraft=aircraft, meta={
+            'AircraftCode': str(aircraft.guid).upper(), 'DateUTC': '2020-01-10', 'DepCode': 'EHAM',
+            'ArrCode': 'EGLL', 'DepTimeUTC': 555, 'LdgTimeUTC': 610, 'ArrTimeUTC': 615, 'TotalTime': 1.5,
+            'minPIC': '90', 'Holding': '2', 'Approach1': [1, None, 'ILS'], 'FlightReview': True,
+            'InstructorName': 'Jane, "JD" Doe',
+        }).save()
+
+    def test_export_to_csv(self):
+        fd, file_path = tempfile.mkstemp(suffix='.csv')
+        os.close(fd)
+        self.addCleanup(os.remove, file_path)
+        export_to_csv(file_path)
+        with open(file_path, newline='') as f:
+            rows = list(csv.reader(f))
+
+        aircraft_heads, aircraft_mapping = get_aircraft_mapping()
+        flights_heads, flights_mapping = get_flights_mapping()
+        flight = dict.fromkeys(flights_mapping, '')
+        flight.update({
+            'Date': '2020-01-10', 'AircraftID': 'N12345', 'From': 'EHAM', 'To': 'EGLL', 'TimeOut': '1015',
+            'TimeOff': '0915', 'TimeOn': '1010', 'TimeIn': '1015', 'TotalTime': '1.5', 'PIC': '90',
+            'Holds': '2', 'Approach1': '1;;ILS', 'FlightReview': 'x', 'InstructorName': 'Jane, "JD" Doe',
+        })
+        self.assertEqual(rows, [
+            ['ForeFlight Logbook Import'], [''],
+            ['Aircraft Table'], aircraft_heads, list(aircraft_mapping),
+            ['N12345', 'aircraft', 'C172', '2020', 'Cessna', 'C172', 'airplane', 'airplane_single_engine_land',
+             'fixed_tricycle', 'Piston', 'x', '', '', 'x'],
+            [''],
+            ['Flights Table'], flights_heads, list(flights_mapping), list(flight.values()),
+        ])
+
+    def test_empty_tables_are_left_out(self):
+        with self.assertLogs('apps.pilotlog.helpers.utils', 'WARNING'):
+            rows = list(iter_logbook_csv_rows(user_id=2))
+        self.assertEqual(rows, [['ForeFlight Logbook Import'], [''], ['Aircraft Table'], [''], ['Flights Table']])
+
+
+class ExportEndpointTests(TestCase):
+    """
+    Check the export endpoint streams the CSV logbook of a user, compressed on demand.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        for user_id in (1, 2):
+            aircraft = Aircraft(guid=uuid.UUID(int=user_id), user_id=user_id, platform=9, _modified=0,
+                                meta={'RefSearch': f'N{user_id}', 'Make': 'Cessna', 'Record_Modified': 1593604800})
+            aircraft.save()
+            for i in range(3):
+                Flight(guid=uuid.UUID(int=100 * user_id + i), user_id=user_id, platform=9, _modified=0,
+                       aircraft=aircraft, meta={'AircraftCode': str(aircraft.guid), 'DateUTC': '2020-01-10'}).save()
+
+    def expected_csv(self, user_id=None):
+        output = io.StringIO()
+        csv.writer(output).writerows(iter_logbook_csv_rows(user_id=user_id))
+        return output.getvalue()
+
+    def test_user_logbook_is_streamed(self):
+        response = self.client.get('/pilotlog/users/1/export.csv')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="logbook-1.csv"')
+        content = b''.join(response.streaming_content).decode()
+        self.assertEqual(content, self.expected_csv(user_id=1))
+        self.assertEqual(content.count('\r\nN1,'), 1)
+        self.assertEqual(content.count('\r\n2020-01-10,N1,'), 3)
+        self.assertNotIn('N2', content)
+
+    def test_logbook_is_compressed_on_demand(self):
+        response = self.client.get('/pilotlog/aircraft/export.csv', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        content = gzip.decompress(b''.join(response.streaming_content)).decode()
+        self.assertEqual(content, self.expected_csv())
+
+
+class ConverterTests(SimpleTestCase):
+    """
+    Check the CSV value converters and the row converters built from them.
+    """
+
+    def test_to_hhmm(self):
+        for value, expected in ((0, '0000'), (605, '1005'), ('75', '0115'), ('', ''), (None, None),
+                                (-5, -5), (True, True), (7.5, 7.5), ('12:30', '12:30')):
+            with self.subTest(value=value):
+                self.assertEqual(to_hhmm(value), expected)
+
+    def test_to_date(self):
+        # Noon UTC, the same day in every time zone of the local clock
+        self.assertEqual(to_date(1578657600), '2020-01-10')
+        for value in ('2020-01-10', '', None, 0, True):
+            with self.subTest(value=value):
+                self.assertEqual(to_date(value), value)
+
+    def test_to_packed_detail(self):
+        self.assertEqual(to_packed_detail([1, None, 'ILS']), '1;;ILS')
+        self.assertEqual(to_packed_detail({'a': 'x', 'b': 2}), 'x;2')
+        self.assertEqual(to_packed_detail('1;;ILS'), '1;;ILS')
+        self.assertEqual(to_packed_detail(''), '')
+
+    def test_rows_match_cell_conversion(self):
+        for build in (compile_row_converter, row_converter):
+            convert_row = build(['Text', 'hhmm', 'Boolean', 'Number', 'Decimal'], 'abcde')
+            self.assertEqual(convert_row({'a': 'x', 'b': 90, 'c': True, 'd': '7', 'e': '1.50'}),
+                             ['x', '0130', 'x', 7, Decimal('1.50')])
+            self.assertEqual(convert_row({}), ['', '', '', '', ''])
+
+        flights_heads, flights_mapping = get_flights_mapping()
+        meta = {'DateUTC': 1578657600, 'DepTimeUTC': 555, 'minPIC': '90', 'Holding': 'two',
+                'Approach1': [1, None], 'FlightReview': 0, 'Route': 'EHAM EGLL'}
+        self.assertEqual(get_flights_row_converter()(meta),
+                         [convert_types(meta.get(field, ''), head)
+                          for head, field in zip(flights_heads, flights_mapping.values())])
+
+
+class BenchSuiteTests(LogbookFileMixin, TestCase):
+    """
+    Check the benchmarks run on a synthetic logbook and compare runs.
+    """
+
+    def test_synthetic_records(self):
+        records = list(generate_records(300, users=3, seed=1))
+        self.assertEqual(records, list(generate_records(300, users=3, seed=1)))
+        self.assertEqual(len({record['user_id'] for record in records}), 3)
+        aircraft = set()
+        for record in records:
+            if record['table'] == 'Aircraft':
+                aircraft.add((record['user_id'], record['guid']))
+            elif record['table'] == 'Flight':
+                self.assertIn((record['user_id'], record['meta']['AircraftCode']), aircraft)
+
+    def test_benchmarks_run(self):
+        file_path = self.write_logbook(list(generate_records(300, users=3)))
+        self.assertEqual(bench_import(file_path)['records'], 300)
+        export = bench_export(file_path + '.csv')
+        self.addCleanup(os.remove, file_path + '.csv')
+        self.assertEqual(export['rows'], Aircraft.objects.count() + Flight.objects.count())
+
+        api = bench_api(requests=2)
+        self.assertIn('flights_cursor_last_page', api)
+        for name, measures in api.items():
+            with self.subTest(endpoint=name):
+                self.assertEqual(measures['requests'], 2)
+
+    def test_compare_results(self):
+        results = {'import': {'records': 20, 'seconds': 2.0, 'rows_per_second': 150}, 'python': '3.12'}
+        baseline = {'import': {'records': 10, 'seconds': 4.0, 'rows_per_second': 200}, 'python': '3.11'}
+        self.assertEqual(list(compare_results(results, baseline)), [
+            ('import.seconds', 4.0, 2.0, -50.0, True),
+            ('import.rows_per_second', 200, 150, -25.0, False),
+        ])
+
+
+class HotMetaTests(TestCase):
+    """
+    Check the hot meta keys are copied into their typed columns.
+    """
+
+    def test_values_are_converted_to_the_field_type(self):
+        aircraft = Aircraft(meta={'Make': 'C' * 300, 'Active': 'maybe', 'RefSearch': 42})
+        aircraft.sync_hot_meta()
+        self.assertEqual((aircraft.make, aircraft.active, aircraft.ref_search), ('C' * 255, None, '42'))
+        for value, expected in (('2020-01-10', datetime.date(2020, 1, 10)), ('2020-13-01', None), ('', None)):
+            with self.subTest(value=value):
+                flight = Flight(meta={'DateUTC': value})
+                flight.sync_hot_meta()
+                self.assertEqual(flight.date, expected)
+
+    def test_saving_the_meta_updates_the_columns(self):
+        aircraft = Aircraft(guid=uuid.UUID(int=1), user_id=1, platform=9, _modified=0, meta={'Make': 'Cessna'})
+        aircraft.save()
+        aircraft.meta = {'Make': 'Piper', 'Active': True}
+        aircraft.save(update_fields=['meta'])
+        self.assertEqual(Aircraft.objects.filter(make='Piper', active=True).count(), 1)
+
+    def test_imported_records_fill_the_columns(self):
+        for validate in (False, True):
+            with self.subTest(validate=validate):
+                ImportPipeline(validate=validate).run([
+                    aircraft_record(int(validate) + 1, Make='Piper', Active=1, RefSearch='PH-ABC'),
+                    flight_record(100 + int(validate), int(validate) + 1, date='2021-06-01'),
+                ])
+        self.assertEqual(list(Aircraft.objects.values_list('make', 'active', 'ref_search')),
+                         [('Piper', True, 'PH-ABC')] * 2)
+        self.assertEqual(list(Flight.objects.values_list('date', flat=True)), [datetime.date(2021, 6, 1)] * 2)
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'GIN and partial indexes need PostgreSQL')
+class IndexUsageTests(TestCase):
+    """
+    EXPLAIN the manager queries and check they are served by their indexes.
+    Sequential scans are disabled, since on a small table the planner would
+    rather scan it than use any index.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        aircraft = []
+        flights = []
+        for i in range(200):
+            guid = uuid.UUID(int=i + 1)
+            aircraft.append(Aircraft(
+                guid=guid, user_id=1, platform=9, _modified=i,
+                meta={'Make': 'Cessna' if i % 2 else 'Piper', 'Active': i % 3 != 0, 'RefSearch': f'PH{i}',
+                      'HighPerf': i % 5 == 0, 'Complex': i % 7 == 0},
+            ))
+            flights.append(Flight(
+                guid=uuid.UUID(int=10 ** 6 + i), user_id=1, platform=9, _modified=i, aircraft_id=guid,
+                meta={'DateUTC': f'2020-01-{i % 28 + 1:02d}', 'AircraftCode': str(guid), 'minTOTAL': i},
+            ))
+        for obj in aircraft + flights:
+            obj.sync_hot_meta()
+        Aircraft.objects.bulk_create(aircraft)
+        Flight.objects.bulk_create(flights)
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+        self.assertNotIn('Seq Scan', plan)
+
+    def assertNoSort(self, plan):
+        # A Merge Append of the partitions of a partitioned table has a Sort
+        # Key but no Sort node
+        self.assertNotIn('Sort  (', plan)
+
+    def test_aircraft_meta_contains_uses_gin_index(self):
+        self.assertUsesIndex(Aircraft.objects.meta_contains(Make='Cessna', HighPerf=True), 'aircraft_meta_gin')
+
+    def test_flight_meta_contains_uses_gin_index(self):
+        self.assertUsesIndex(Flight.objects.meta_contains(minTOTAL=10), 'flight_meta_gin')
+
+    def test_high_performance_complex_uses_partial_index(self):
+        queryset = Aircraft.objects.high_performance_complex_aircraft()
+        self.assertUsesIndex(queryset, 'aircraft_hp_complex_make')
+        self.assertEqual(
+            list(queryset.values_list('guid', flat=True)),
+            list(Aircraft.objects.filter(meta__HighPerf=True, meta__Complex=True, active=True)
+                 .order_by('-make').values_list('guid', flat=True)),
+        )
+
+    def test_by_airplane_scans_aircraft_date_index(self):
+        # Only an index scan in (date, guid) order can avoid the sort
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_sort = off')
+        flights = Flight.objects.flight_by_airplane(uuid.UUID(int=1))
+        next_page = flights.filter(date__gte='2020-01-05').exclude(date='2020-01-05', guid__lte=uuid.UUID(int=1))
+        for queryset in (flights, next_page):
+            plan = queryset[:10].explain()
+            self.assertIn('flight_aircraft_date', plan)
+            self.assertNoSort(plan)
+
+    def test_cursor_pages_scan_modified_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_sort = off')
+        for model_class, index_name in ((Aircraft, 'aircraft_modified'), (Flight, 'flight_modified')):
+            queryset = model_class.objects.order_by('_modified', 'guid')
+            next_page = queryset.filter(_modified__gte=50).exclude(_modified=50, guid__lte=uuid.UUID(int=1))
+            for page in (queryset, next_page):
+                plan = page[:10].explain()
+                self.assertIn(index_name, plan)
+                self.assertNoSort(plan)
+
+    def test_active_and_make_use_column_indexes(self):
+        self.assertNotIn('Seq Scan', Aircraft.objects.active_aircraft().explain())
+        self.assertNotIn('Seq Scan', Aircraft.objects.aircraft_by_make('Cessna').explain())
+
+    def test_fleet_ordering_scans_counter_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_sort = off')
+        plan = Aircraft.objects.order_by('-flight_count', '-pk')[:10].explain()
+        self.assertIn('aircraft_flight_count', plan)
+        self.assertNoSort(plan)
+
+
+class PaginationTests(TestCase):
+    """
+    Check page numbers and cursors both walk the lists in a stable order.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        aircraft = Aircraft(guid=uuid.UUID(int=1), user_id=1, platform=9, _modified=0, meta={})
+        aircraft.save()
+        for i in range(25):
+            Flight(guid=uuid.UUID(int=100 + (i * 7) % 25), user_id=1, platform=9, _modified=i % 4,
+                   aircraft=aircraft, meta={'DateUTC': '2020-01-10'}).save()
+        cls.expected = [str(guid) for guid in Flight.objects.order_by('_modified', 'guid')
+                        .values_list('guid', flat=True)]
+
+    def walk(self, url):
+        guids = []
+        while url:
+            response = self.client.get(url, headers={'Cache-Control': 'no-cache'})
+            guids += [flight['guid'] for flight in response.json()['results']]
+            url = response.json()['next']
+        return guids
+
+    def test_pages_are_ordered_by_modified(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', UnorderedObjectListWarning)
+            self.assertEqual(self.walk('/pilotlog/flights/?page_size=10'), self.expected)
+            self.assertEqual(self.walk('/pilotlog/aircraft/?page_size=10')[0], str(uuid.UUID(int=1)))
+
+    def test_cursor_pages_match_page_numbers(self):
+        self.assertEqual(self.walk('/pilotlog/flights/?page_size=10&pagination=cursor'), self.expected)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ResponseCacheTests(TestCase):
+    """
+    Check the cached list responses are revalidated with their ETag and
+    invalidated by the writes of their user only.
+    """
+    url = '/pilotlog/aircraft/?user_id=1'
+
+    @classmethod
+    def setUpTestData(cls):
+        for user_id in (1, 2):
+            aircraft = Aircraft(guid=uuid.UUID(int=user_id), user_id=user_id, platform=9, _modified=0,
+                                meta={'Make': 'Cessna'})
+            aircraft.save()
+
+    def test_unchanged_list_is_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_write_invalidates_its_user_only(self):
+        etag = self.client.get(self.url)['ETag']
+        other_etag = self.client.get('/pilotlog/aircraft/?user_id=2')['ETag']
+        self.client.patch(f'/pilotlog/aircraft/{uuid.UUID(int=1)}/', {'meta': {'Make': 'Piper'}},
+                          content_type='application/json')
+
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['make'], 'Piper')
+        response = self.client.get('/pilotlog/aircraft/?user_id=2', headers={'If-None-Match': other_etag})
+        self.assertEqual(response.status_code, 304)
+
+
+class FlightTotalsTests(TestCase):
+    """
+    Check the monthly rollup matches the totals computed from the flights.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.aircraft = Aircraft(guid=uuid.UUID(int=1), user_id=1, platform=9, _modified=0,
+                                meta={'Make': 'Cessna', 'Model': 'C150'})
+        cls.aircraft.save()
+        for i in range(30):
+            Flight(guid=uuid.UUID(int=100 + i), user_id=1, platform=9, _modified=0, aircraft=cls.aircraft,
+                   meta={'DateUTC': f'2020-{i % 3 + 1:02d}-10' if i % 10 else '', 'minTOTAL': 60,
+                         'minNIGHT': '' if i % 2 else 30, 'LdgDay': 1}).save()
+
+    def refresh_all(self):
+        FlightTotals.objects.refresh(Flight.objects.values_list('user_id', 'date'))
+
+    def test_summary_matches_flights(self):
+        self.refresh_all()
+        self.assertEqual(FlightTotals.objects.for_user(1).summary(), Flight.objects.totals())
+        months = FlightTotals.objects.for_user(1).summary_by('month')
+        self.assertEqual([row['flights'] for row in months], [9, 9, 9, 3])
+
+    def test_refresh_moves_flight_between_months(self):
+        self.refresh_all()
+        flight = Flight.objects.get(guid=uuid.UUID(int=101))
+        flight.meta['DateUTC'] = '2021-06-01'
+        flight.save()
+        FlightTotals.objects.refresh([(1, datetime.date(2020, 2, 1)), (1, flight.date)])
+
+        months = {row['month']: row['flights'] for row in FlightTotals.objects.for_user(1).summary_by('month')}
+        self.assertEqual(months[datetime.date(2020, 2, 1)], 8)
+        self.assertEqual(months[datetime.date(2021, 6, 1)], 1)
+
+    def test_saves_and_deletes_refresh_totals(self):
+        def months():
+            return {row['month']: row['flights'] for row in FlightTotals.objects.for_user(1).summary_by('month')}
+
+        self.assertEqual(FlightTotals.objects.for_user(1).summary(), Flight.objects.totals())
+        flight = Flight.objects.get(guid=uuid.UUID(int=101))
+        flight.meta['DateUTC'] = '2021-06-01'
+        flight.save()
+        self.assertEqual(months()[datetime.date(2020, 2, 1)], 8)
+        self.assertEqual(months()[datetime.date(2021, 6, 1)], 1)
+
+        flight.delete()
+        self.assertNotIn(datetime.date(2021, 6, 1), months())
+        Flight.objects.filter(date=datetime.date(2020, 1, 10)).delete()
+        self.assertNotIn(datetime.date(2020, 1, 1), months())
+        self.assertEqual(FlightTotals.objects.for_user(1).summary(), Flight.objects.totals())
+
+    def test_fractional_minutes_are_truncated(self):
+        aircraft = Aircraft(guid=uuid.UUID(int=2), user_id=2, platform=9, _modified=0, meta={})
+        aircraft.save()
+        for i, minutes in enumerate([30.9, 10.5, -0.7, '12', None]):
+            Flight(guid=uuid.UUID(int=200 + i), user_id=2, platform=9, _modified=0, aircraft=aircraft,
+                   meta={'DateUTC': '2020-01-10', 'minTOTAL': minutes}).save()
+        self.assertEqual(Flight.objects.for_user(2).totals()['total_minutes'], 40)
+        self.assertEqual(Aircraft.objects.get(guid=aircraft.guid).total_minutes, 40)
+
+    def test_totals_endpoint(self):
+        self.refresh_all()
+        response = self.client.get('/pilotlog/users/1/totals/?group_by=type,year&from=2020-02-01')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['groups'], [{
+            'type': 'C150', 'year': 2020, 'flights': 18, 'total_minutes': 1080, 'pic_minutes': 0,
+            'night_minutes': 240, 'xc_minutes': 0, 'ifr_minutes': 0, 'day_landings': 18, 'night_landings': 0,
+        }])
+        response = self.client.get('/pilotlog/users/1/totals/?group_by=pilot')
+        self.assertEqual(response.status_code, 400)
+
+
+class AircraftCountersTests(TestCase):
+    """
+    Check the flight counters of the aircraft follow their flights.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in (1, 2):
+            Aircraft(guid=uuid.UUID(int=i), user_id=1, platform=9, _modified=0, meta={'Make': 'Cessna'}).save()
+
+    def add_flight(self, i, aircraft, date, minutes):
+        flight = Flight(guid=uuid.UUID(int=100 + i), user_id=1, platform=9, _modified=0,
+                        aircraft_id=uuid.UUID(int=aircraft), meta={'DateUTC': date, 'minTOTAL': minutes})
+        flight.save()
+        return flight
+
+    def test_counters_follow_created_and_deleted_flights(self):
+        self.add_flight(1, 1, '2020-01-10', 60)
+        last = self.add_flight(2, 1, '2021-03-01', 90)
+        aircraft = Aircraft.objects.get(guid=uuid.UUID(int=1))
+        self.assertEqual((aircraft.flight_count, aircraft.total_minutes, aircraft.last_flown),
+                         (2, 150, datetime.date(2021, 3, 1)))
+
+        last.delete()
+        aircraft.refresh_from_db()
+        self.assertEqual((aircraft.flight_count, aircraft.total_minutes, aircraft.last_flown),
+                         (1, 60, datetime.date(2020, 1, 10)))
+
+    def test_moved_flight_refreshes_both_aircraft(self):
+        flight = self.add_flight(1, 1, '2020-01-10', 60)
+        flight.aircraft_id = uuid.UUID(int=2)
+        flight.save()
+        self.assertEqual(dict(Aircraft.objects.values_list('guid', 'flight_count')),
+                         {uuid.UUID(int=1): 0, uuid.UUID(int=2): 1})
+
+    def test_bulk_delete_refreshes_counters(self):
+        for i in range(3):
+            self.add_flight(i, i % 2 + 1, '2020-01-10', 60)
+        Flight.objects.filter(guid__in=[uuid.UUID(int=100), uuid.UUID(int=101)]).delete()
+        self.assertEqual(dict(Aircraft.objects.values_list('guid', 'flight_count')),
+                         {uuid.UUID(int=1): 1, uuid.UUID(int=2): 0})
+
+    def test_counters_survive_incremental_reimport(self):
+        self.add_flight(1, 1, '2020-01-10', 60)
+        backends = ['orm', 'copy', 'bulk_load'] if connection.vendor == 'postgresql' else ['orm']
+        modified = 0
+        for backend in backends:
+            for validate in (False, True):
+                with self.subTest(backend=backend, validate=validate):
+                    modified += 1
+                    pipeline = ImportPipeline(backend=backend, incremental=True, validate=validate)
+                    pipeline.run([aircraft_record(1, modified=modified, Make=f'Piper {modified}')])
+                    self.assertEqual(pipeline.stats['upserted'], 1)
+                    aircraft = Aircraft.objects.get(guid=uuid.UUID(int=1))
+                    self.assertEqual((aircraft.make, aircraft.flight_count, aircraft.total_minutes,
+                                      aircraft.last_flown), (f'Piper {modified}', 1, 60, datetime.date(2020, 1, 10)))
+
+        response = self.client.post('/pilotlog/aircraft/bulk/', [aircraft_record(1, modified=modified + 1)],
+                                    content_type='application/json')
+        self.assertEqual(response.json()['results'][0]['status'], 'updated')
+        self.assertEqual(Aircraft.objects.get(guid=uuid.UUID(int=1)).flight_count, 1)
+
+    def test_fleet_list_is_sorted_by_counters(self):
+        for i in range(3):
+            self.add_flight(i, 2, '2020-01-10', 60)
+        self.add_flight(3, 1, '2020-01-10', 60)
+        response = self.client.get('/pilotlog/aircraft/?ordering=-flight_count')
+        self.assertEqual([row['flight_count'] for row in response.json()['results']], [3, 1])
+
+
+class BulkWriteTests(TestCase):
+    """
+    Check the bulk endpoints create, update and skip records in one request.
+    """
+
+    def test_aircraft_are_created_updated_and_skipped(self):
+        records = [aircraft_record(1), aircraft_record(2)]
+        response = self.client.post('/pilotlog/aircraft/bulk/', records, content_type='application/json')
+        self.assertEqual(response.json()['created'], 2)
+
+        records = [aircraft_record(1, modified=1), aircraft_record(2), {'guid': 'x'}]
+        response = self.client.post('/pilotlog/aircraft/bulk/', records, content_type='application/json')
+        self.assertEqual([result['status'] for result in response.json()['results']],
+                         ['updated', 'unchanged', 'error'])
+        self.assertEqual(Aircraft.objects.get(guid=uuid.UUID(int=1))._modified, 1)
+
+    def test_flights_from_ndjson(self):
+        self.client.post('/pilotlog/aircraft/bulk/', [aircraft_record(1)], content_type='application/json')
+        records = [flight_record(100 + i, 1) for i in range(3)] + [flight_record(103, 99)]
+        response = self.client.post('/pilotlog/flights/bulk/', '\n'.join(json.dumps(r) for r in records),
+                                    content_type='application/x-ndjson')
+        self.assertEqual([result['status'] for result in response.json()['results']],
+                         ['created', 'created', 'created', 'error'])
+        self.assertEqual(Aircraft.objects.get(guid=uuid.UUID(int=1)).flight_count, 3)
+        self.assertEqual(FlightTotals.objects.for_user(1).summary()['total_minutes'], 180)
+
+    def test_records_are_matched_by_user_and_guid(self):
+        self.client.post('/pilotlog/aircraft/bulk/', [aircraft_record(1)], content_type='application/json')
+        records = [flight_record(101, 1), {**flight_record(101, 99), 'user_id': 2}]
+        response = self.client.post('/pilotlog/flights/bulk/', records, content_type='application/json')
+        self.assertEqual([result['status'] for result in response.json()['results']], ['created', 'error'])
+
+    def test_errors_of_failed_records(self):
+        records = [flight_record(101, 99), {**flight_record(102, 99), 'platform': 'nine'}]
+        with self.assertLogs('apps.pilotlog.helpers.import_export', 'ERROR'):
+            response = self.client.post('/pilotlog/flights/bulk/', records, content_type='application/json')
+        self.assertEqual([(result['error_type'], result['error']) for result in response.json()['results']], [
+            ('DoesNotExist', f"Aircraft not found: {uuid.UUID(int=99)}"),
+            ('ValidationError', "user_id, platform and _modified must be integers."),
+        ])
+
+
+class ImportJobTests(LogbookFileMixin, TestCase):
+    """
+    Check import jobs checkpoint their progress and resume idempotently.
+    """
+
+    def setUp(self):
+        records = [aircraft_record(1)]
+        records += [flight_record(100 + i, 1, date=f'2020-{i % 3 + 1:02d}-10') for i in range(10)]
+        self.file_path = self.write_logbook(records)
+
+    def run_next(self):
+        return run_import_job(ImportJob.objects.claim_next('test'), chunk_size=4)
+
+    def test_job_runs_to_the_end(self):
+        job = create_import_job(self.file_path)
+        job = self.run_next()
+        self.assertEqual((job.status, job.records, job.offset, job.progress), (ImportJob.DONE, 11, job.size, 1.0))
+        self.assertEqual(job.tables, {'Aircraft': 1, 'Flight': 10})
+        self.assertEqual(FlightTotals.objects.for_user(1).summary()['flights'], 10)
+
+    def test_resume_refreshes_records_written_after_the_checkpoint(self):
+        job = create_import_job(self.file_path)
+        self.run_next()
+        # A worker that died after writing the records but before its checkpoint
+        ImportJob.objects.filter(pk=job.pk).update(status=ImportJob.QUEUED, offset=0, records=0, tables={})
+        FlightTotals.objects.all().delete()
+        Aircraft.objects.update(flight_count=0)
+
+        job = self.run_next()
+        self.assertEqual((job.status, job.attempts, job.records), (ImportJob.DONE, 2, 11))
+        self.assertEqual(Flight.objects.count(), 10)
+        self.assertEqual(FlightTotals.objects.for_user(1).summary(), Flight.objects.totals())
+        self.assertEqual(Aircraft.objects.get().flight_count, 10)
+
+    def test_queue_rejects_options_of_direct_imports(self):
+        with self.assertRaisesMessage(CommandError, '--queue cannot be combined with --workers, --replace'):
+            call_command('import', self.file_path, '--queue', '--workers', '2', '--replace')
+        call_command('import', self.file_path, '--queue', '--backend', 'orm', stdout=io.StringIO())
+        self.assertEqual(ImportJob.objects.get().backend, 'orm')
+
+    def test_upload_queues_a_job(self):
+        with open(self.file_path, 'rb') as f:
+            response = self.client.post('/pilotlog/imports/', {'file': f})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['status'], ImportJob.QUEUED)
+        os.remove(ImportJob.objects.get().file_path)
+
+
+class JsonRecoveryTests(LogbookFileMixin, SimpleTestCase):
+    """
+    Check broken records are skipped one at a time and rejected with their byte offsets.
+    """
+    content = '\n'.join([
+        '[',
+        '  {"guid": "1", "meta": {"x": [1, 2]}},',
+        '  {"guid": "2", "meta": {"x": 1,',
+        '  {"guid": "3", "meta": {"y": "\u00e9t\u00e9"}},',
+        '  {"guid": "4", "meta": {"x": tru}},',
+        '  garbage,',
+        '  {"guid": "5", "meta": {"q": "say \\"hi\\""}},',
+        '  {"guid": "6", "meta": {"x": 1',
+    ])
+
+    def setUp(self):
+        self.file_path = self.write_logbook(self.content)
+
+    def test_reader_resynchronizes_after_broken_records(self):
+        reject_path = self.file_path + '.rejects.ndjson'
+        with RejectFile(reject_path) as rejects:
+            guids = [record['guid'] for _, record in iter_offset_records(self.file_path, chunk_size=16,
+                                                                         on_reject=rejects)]
+        self.assertEqual(guids, ['1', '3', '5'])
+
+        with open(self.file_path, 'rb') as f:
+            data = f.read()
+        with open(reject_path, encoding='utf-8') as f:
+            rejected = [json.loads(line) for line in f]
+        self.assertEqual(len(rejected), 4)
+        for reject in rejected:
+            fragment = data[reject['offset']:reject['offset'] + reject['size']]
+            self.assertEqual(fragment.decode('utf-8'), reject['fragment'])
+
+    def test_oversized_record_is_rejected(self):
+        rejected = []
+        records = list(iter_offset_records(self.file_path, chunk_size=16, max_record_size=40,
+                                           on_reject=lambda *reject: rejected.append(reject)))
+        self.assertEqual([record['guid'] for _, record in records], ['1', '3', '5'])
+        self.assertIn('record larger than 40 characters', [error for _, _, error in rejected])
+
+    def test_load_data_recovers_records(self):
+        with mock.patch('builtins.open', wraps=open) as opened:
+            self.assertEqual([record['guid'] for record in load_data(self.file_path)], ['1', '3', '5'])
+        self.assertEqual([call.args[0] for call in opened.call_args_list], [self.file_path])
+
+    def test_stray_closing_bracket_is_rejected(self):
+        file_path = self.write_logbook('[{"guid": "1"}, ],\n {"guid": "2"}\n]\n\n')
+        rejected = []
+        with self.assertLogs('apps.pilotlog.helpers.json_stream', 'ERROR'):
+            records = list(iter_records(file_path, chunk_size=4, on_reject=lambda *reject: rejected.append(reject)))
+        self.assertEqual([record['guid'] for record in records], ['1', '2'])
+        self.assertEqual(rejected, [(16, '],\n ', 'unexpected data')])
+
+
+class DeadLetterTests(LogbookFileMixin, TestCase):
+    """
+    Check failed records are counted, written to the dead-letter file and can be replayed.
+    """
+
+    def setUp(self):
+        records = [flight_record(100 + i, 1) for i in range(3)]
+        records.append({'table': 'Pilot', 'guid': str(uuid.UUID(int=200)), 'user_id': 1, 'bogus': True})
+        self.file_path = self.write_logbook(records)
+        self.dead_letter_path = self.file_path + '.dead.ndjson'
+        self.addCleanup(lambda: os.path.exists(self.dead_letter_path + '.dead.ndjson')
+                        and os.remove(self.dead_letter_path + '.dead.ndjson'))
+
+    def test_failed_records_are_replayed(self):
+        stats = import_data(self.file_path, dead_letter_path=self.dead_letter_path)
+        self.assertEqual(stats['failed'], 4)
+        with open(self.dead_letter_path) as f:
+            entries = [json.loads(line) for line in f]
+        self.assertEqual(sorted((entry['table'], entry['error_type']) for entry in entries),
+                         [('Flight', 'DoesNotExist')] * 3 + [('Pilot', 'TypeError')])
+
+        Aircraft(guid=uuid.UUID(int=1), user_id=1, platform=9, _modified=0, meta={}).save()
+        stats = import_data(self.dead_letter_path, replay=True,
+                            dead_letter_path=self.dead_letter_path + '.dead.ndjson')
+        self.assertEqual((stats['records'], stats['failed']), (4, 1))
+        self.assertEqual(Flight.objects.count(), 3)
+
+    def test_refresh_failure_does_not_mask_import_error(self):
+        with mock.patch.object(ImportPipeline, 'run', side_effect=ValueError('import failed')), \
+                mock.patch('apps.pilotlog.helpers.import_export.refresh_imported_data',
+                           side_effect=RuntimeError('refresh failed')), \
+                self.assertLogs('apps.pilotlog.helpers.import_export', 'ERROR'):
+            with self.assertRaisesMessage(ValueError, 'import failed'):
+                import_data(self.file_path, dead_letter_path=self.dead_letter_path)
+
+    def test_failed_batch_dead_letters_only_failing_records(self):
+        ImportPipeline(backend='orm').run([aircraft_record(2)])
+        records = [aircraft_record(i) for i in range(1, 5)] + [flight_record(100 + i, i) for i in range(1, 5)]
+        with self.assertLogs('apps.pilotlog.helpers.import_export', 'WARNING'):
+            pipeline = ImportPipeline(backend='orm', batch_size=3).run(records)
+        self.assertEqual(dict(pipeline.dead_letters.counts), {('Aircraft', 'IntegrityError'): 1})
+        self.assertEqual(Aircraft.objects.count(), 4)
+        self.assertEqual(Flight.objects.count(), 4)
+        self.assertEqual(pipeline.table_records['Aircraft'], 3)
+
+    def test_reimport_of_sample_file_does_not_fail(self):
+        sample_file = os.path.join(PROJECT_ROOT, 'Data', 'data.json')
+        import_data(sample_file, dead_letter_path=self.dead_letter_path)
+        flights = Flight.objects.count()
+        with self.assertLogs('apps.pilotlog.helpers.import_export', 'WARNING'):
+            stats = import_data(sample_file, dead_letter_path=self.dead_letter_path)
+        self.assertEqual(stats['failed'], Aircraft.objects.count())
+        self.assertEqual(Flight.objects.count(), flights)
+
+
+class RowLayoutTests(TestCase):
+    """
+    Check raw rows hold the same values as the model instances they replace.
+    """
+    record = {'guid': str(uuid.UUID(int=1)), 'user_id': 1, 'platform': 9, '_modified': 5,
+              'meta': {'Make': 'Cessna', 'Active': 'yes', 'RefSearch': 'PHALI' * 60}}
+
+    def test_row_matches_instance(self):
+        layout = RowLayout(Aircraft)
+        aircraft = Aircraft(**self.record)
+        aircraft.sync_hot_meta()
+        expected = [field.get_db_prep_save(field.pre_save(aircraft, True), connection)
+                    for field in copy_fields(Aircraft._meta)]
+        row = list(layout.row(dict(self.record)))
+        meta = layout.index['meta']
+        self.assertEqual(json.loads(row.pop(meta)), self.record['meta'])
+        expected.pop(meta)
+        self.assertEqual(row, expected)
+        self.assertEqual(layout.value(tuple(layout.row(self.record)), 'guid'), uuid.UUID(int=1))
+
+    def test_invalid_record_fails_alone(self):
+        with self.assertRaises(TypeError):
+            RowLayout(Aircraft).row({**self.record, 'bogus': 1})
+        for validate in (False, True):
+            records = [{**self.record, 'table': 'Aircraft', 'guid': str(uuid.UUID(int=i))} for i in (1, 2)]
+            records[1]['platform'] = 'nine'
+            pipeline = ImportPipeline(backend='orm', validate=validate).run(records)
+            self.assertEqual(pipeline.dead_letters.count, 1)
+            self.assertEqual(Aircraft.objects.count(), 1)
+            Aircraft.objects.all().delete()
+
+
+class PurgeTests(LogbookFileMixin, TestCase):
+    """
+    Check a logbook is purged from every table and replaced atomically by an import.
+    """
+
+    def logbook(self, user_id, guid_base, flights=3):
+        records = [aircraft_record(guid_base, user_id),
+                   {'table': 'Pilot', 'guid': str(uuid.UUID(int=guid_base + 1)), 'user_id': user_id,
+                    'platform': 9, '_modified': 0, 'meta': {}}]
+        records += [flight_record(guid_base + 10 + i, guid_base, user_id, date=f'2020-0{i + 1}-10')
+                    for i in range(flights)]
+        return self.write_logbook(records)
+
+    def setUp(self):
+        import_data(self.logbook(1, 1000))
+        import_data(self.logbook(2, 2000))
+
+    def counts(self, user_id):
+        return [model.objects.filter(user_id=user_id).count() for model in (Aircraft, Flight, FlightTotals, Pilot)]
+
+    def test_purge_user(self):
+        deleted = purge_user(1, batch_size=2)
+        self.assertEqual((deleted['Aircraft'], deleted['Flight'], deleted['FlightTotals'], deleted['Pilot']),
+                         (1, 3, 3, 1))
+        self.assertEqual(self.counts(1), [0, 0, 0, 0])
+        self.assertEqual(self.counts(2), [1, 3, 3, 1])
+
+    def test_purge_only_loads_primary_keys(self):
+        with CaptureQueriesContext(connection) as queries:
+            purge_user(1, batch_size=2)
+        selects = [query['sql'] for query in queries if query['sql'].startswith('SELECT')]
+        self.assertTrue(selects)
+        self.assertFalse([sql for sql in selects if '"meta"' in sql or '"date"' in sql])
+
+    def test_replace_logbook(self):
+        stats = import_data(self.logbook(1, 3000, flights=2), replace=True)
+        self.assertEqual(stats['failed'], 0)
+        self.assertEqual(self.counts(1), [1, 2, 2, 1])
+        self.assertEqual(Aircraft.objects.get(user_id=1).flight_count, 2)
+        self.assertFalse(Aircraft.objects.filter(guid=uuid.UUID(int=1000)).exists())
+        self.assertEqual(self.counts(2), [1, 3, 3, 1])
+
+    def test_failed_replace_keeps_logbook(self):
+        with mock.patch.object(ImportPipeline, 'run', side_effect=RuntimeError), self.assertRaises(RuntimeError):
+            import_data(self.logbook(1, 3000), replace=True)
+        self.assertEqual(self.counts(1), [1, 3, 3, 1])
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'Declarative partitioning needs PostgreSQL')
+class PartitionTests(LogbookFileMixin, TestCase):
+    """
+    Check the Flight table is hash partitioned by user_id, the per-user
+    queries only read the partition of the user and a guid stays unique
+    across users.
+    """
+    logbook = PurgeTests.logbook
+
+    def setUp(self):
+        import_data(self.logbook(1, 1000))
+        import_data(self.logbook(2, 2000))
+
+    def test_layout_is_recorded_in_migration(self):
+        migration = importlib.import_module('pilotlog.migrations.0010_partition_by_user')
+        table = Flight._meta.db_table
+        with connection.cursor() as cursor:
+            self.assertTrue(migration.is_partitioned(cursor, table))
+            cursor.execute('SELECT count(*) FROM pg_inherits WHERE inhparent = %s::regclass', [table])
+            self.assertEqual(cursor.fetchone()[0], migration.PARTITIONS)
+        self.assertEqual(migration.PARTITIONED_MODELS, ['Flight'])
+
+    def test_guid_of_another_user_is_rejected(self):
+        with self.assertLogs('apps.pilotlog.helpers.import_export', 'WARNING'):
+            pipeline = ImportPipeline(batch_size=2).run([flight_record(1010, 2000, user_id=2),
+                                                         flight_record(2100, 2000, user_id=2)])
+        self.assertEqual(dict(pipeline.dead_letters.counts), {('Flight', 'IntegrityError'): 1})
+        self.assertEqual(Flight.objects.get(guid=uuid.UUID(int=1010)).user_id, 1)
+        self.assertTrue(Flight.objects.filter(guid=uuid.UUID(int=2100), user_id=2).exists())
+
+    def test_guid_is_reused_after_delete(self):
+        flight = Flight.objects.get(guid=uuid.UUID(int=1010))
+        flight.delete()
+        flight.guid, flight.user_id, flight.aircraft_id = uuid.UUID(int=1010), 2, uuid.UUID(int=2000)
+        flight.save()
+        self.assertEqual(Flight.objects.filter(guid=uuid.UUID(int=1010)).get().user_id, 2)
+
+    def test_save_only_updates_its_row(self):
+        flight = Flight.objects.get(guid=uuid.UUID(int=1010))
+        flight.meta['minTOTAL'] = 90
+        flight.save()
+        self.assertEqual(Flight.objects.filter(meta__minTOTAL=90).count(), 1)
+        self.assertEqual(FlightTotals.objects.for_user(2).summary()['total_minutes'], 180)
+
+    def test_per_user_queries_read_one_partition(self):
+        for queryset in (Flight.objects.for_user(1), Flight.objects.for_user(1).filter(guid=uuid.UUID(int=1010))):
+            self.assertEqual(queryset.explain().count(f' on {Flight._meta.db_table}_p'), 1)
+
+    def test_incremental_import_and_export(self):
+        file_path = self.logbook(1, 1000)
+        with open(file_path) as f:
+            records = json.load(f)
+        records[-1]['_modified'] = 1
+        records[-1]['meta']['minTOTAL'] = 90
+        with open(file_path, 'w') as f:
+            json.dump(records, f)
+        stats = import_data(file_path, incremental=True)
+        self.assertEqual(stats['upserted'], 1)
+        self.assertEqual(FlightTotals.objects.for_user(1).summary()['total_minutes'], 210)
+        rows = list(iter_logbook_csv_rows(user_id=1))
+        self.assertEqual(len(rows), 13)